@@ -1,26 +1,21 @@
+import os
 import streamlit as st
 from app_pages.multipage import MultiPage
+from app_pages.db import pool_status
+from app_pages.login import restore_session
 
 # Set page configuration here
 st.set_page_config(page_title="MetaData Retrieval", page_icon=":star:", layout="wide")
 
-# load pages scripts
-from app_pages.page_summary import page_summary_body
-from app_pages.page_register import registration_page
-from app_pages.page_LLM import *
-from app_pages.history import *
-from app_pages.page_json_viewer import *
-#from app_pages.graph import graph_visualizer_page
-
 app = MultiPage(app_name="MetaData Retrieval")  # Create an instance of the app
 
-# Add your app pages here using .add_page()
-app.add_page("Project Overview", page_summary_body)
-app.add_page("User Registration", registration_page)
-app.add_page("Explore Ollama Models", LLM_models)
-app.add_page("Chat History Overview", display_conversation_history)
-app.add_page("JSON File Viewer", json_viewer)
-#app.add_page("Graph Visualizer", graph_visualizer_page)
+# Add your app pages here using .add_page(); each page module is imported when the page is first opened
+app.add_page("Project Overview", "app_pages.page_summary:page_summary_body")
+app.add_page("User Registration", "app_pages.page_register:registration_page")
+app.add_page("Explore Ollama Models", "app_pages.page_LLM:LLM_models")
+app.add_page("Chat History Overview", "app_pages.history:display_conversation_history")
+app.add_page("JSON File Viewer", "app_pages.page_json_viewer:json_viewer")
+#app.add_page("Graph Visualizer", "app_pages.graph:graph_visualizer_page")
 
 page_bg_img = '''
 <style>
@@ -33,4 +28,17 @@ background-size: cover;
 st.markdown(page_bg_img, unsafe_allow_html=True)
 
 
-app.run()  # Run the app
\ No newline at end of file
+# Log in from the session token cookie before any page checks the login state
+restore_session()
+
+app.run()  # Run the app
+
+# Connection pool usage of this process, for monitoring
+if os.getenv('SHOW_DB_POOL_STATUS', 'false').lower() in ('1', 'true', 'yes'):
+    with st.sidebar.expander("Database connections"):
+        st.json(pool_status())
+
+# Import time of the pages opened so far in this process
+if os.getenv('SHOW_PAGE_IMPORT_TIMES', 'false').lower() in ('1', 'true', 'yes'):
+    with st.sidebar.expander("Page import times"):
+        st.table(app.import_report())
\ No newline at end of file
@@ -0,0 +1,219 @@
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from argon2 import PasswordHasher, Type, extract_parameters
+from argon2.exceptions import VerificationError, InvalidHashError
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Number of password hashes computed at the same time, and how many more may wait for a worker
+AUTH_WORKERS = int(os.getenv('AUTH_WORKERS', 2))
+AUTH_QUEUE_SIZE = int(os.getenv('AUTH_QUEUE_SIZE', 8))
+
+# Seconds a login waits for its hash before giving up
+AUTH_TIMEOUT = float(os.getenv('AUTH_TIMEOUT', 10))
+
+# Argon2 cost parameters; unset parameters are calibrated on first use so that one hash
+# takes about ARGON2_TARGET_MS milliseconds. Pin them with the output of calibrate_argon2.py.
+ARGON2_TIME_COST = os.getenv('ARGON2_TIME_COST')
+ARGON2_MEMORY_COST = os.getenv('ARGON2_MEMORY_COST')
+ARGON2_PARALLELISM = os.getenv('ARGON2_PARALLELISM')
+ARGON2_TARGET_MS = float(os.getenv('ARGON2_TARGET_MS', 250))
+
+# Calibration never goes below the OWASP minimum for Argon2id: 19 MiB of memory and 2 iterations
+MIN_MEMORY_COST = 19 * 1024
+MIN_TIME_COST = 2
+
+_hasher = None
+_executor = None
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(AUTH_WORKERS + AUTH_QUEUE_SIZE)
+
+
+class AuthBusyError(Exception):
+    """
+    Raised when too many password checks are already queued, or one did not finish in time.
+    """
+
+
+def calibrate_parameters(target_ms=ARGON2_TARGET_MS):
+    """
+    Chooses Argon2 cost parameters for this server.
+
+    Starts from the argon2-cffi defaults (RFC 9106 low-memory profile) and halves the memory
+    cost, then lowers the iterations, until one hash takes at most `target_ms`, without going
+    below the OWASP minimum. Parallelism is limited so that AUTH_WORKERS concurrent hashes do
+    not use more threads than there are CPUs. Parameters set in the environment are kept.
+
+    Args:
+        target_ms (float, optional): The target duration of one hash in milliseconds.
+
+    Returns:
+        dict: time_cost, memory_cost (KiB) and parallelism.
+    """
+
+    default = PasswordHasher()
+    parameters = {
+        "time_cost": int(ARGON2_TIME_COST or default.time_cost),
+        "memory_cost": int(ARGON2_MEMORY_COST or default.memory_cost),
+        "parallelism": int(ARGON2_PARALLELISM or min(default.parallelism, max(1, (os.cpu_count() or 1) // AUTH_WORKERS))),
+    }
+
+    while True:
+        start = time.perf_counter()
+        PasswordHasher(**parameters).hash("calibration")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms <= target_ms:
+            break
+        if not ARGON2_MEMORY_COST and parameters["memory_cost"] > MIN_MEMORY_COST:
+            parameters["memory_cost"] = max(MIN_MEMORY_COST, parameters["memory_cost"] // 2)
+        elif not ARGON2_TIME_COST and parameters["time_cost"] > MIN_TIME_COST:
+            parameters["time_cost"] -= 1
+        else:
+            break
+    print(f"Argon2 parameters: {parameters} ({elapsed_ms:.0f} ms per hash)")
+    return parameters
+
+
+def get_hasher():
+    """
+    Returns the process-wide password hasher, calibrating it on first use.
+
+    Returns:
+        PasswordHasher: The shared hasher.
+    """
+
+    global _hasher
+    if _hasher is None:
+        with _lock:
+            if _hasher is None:
+                _hasher = PasswordHasher(**calibrate_parameters())
+    return _hasher
+
+
+def get_executor():
+    """
+    Returns the thread pool that computes password hashes, creating it on first use.
+
+    Returns:
+        ThreadPoolExecutor: The shared pool of AUTH_WORKERS threads.
+    """
+
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+                atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+    return _executor
+
+
+def _run(function, *args):
+    """
+    Runs a hashing function on the auth pool and waits for its result.
+
+    Argon2 releases the GIL while hashing, so a waiting script thread does not keep
+    other sessions from running; the pool bounds the CPU and memory used by hashing.
+
+    Raises:
+        AuthBusyError: If AUTH_WORKERS + AUTH_QUEUE_SIZE checks are already pending,
+            or the result is not ready within AUTH_TIMEOUT seconds.
+    """
+
+    if not _slots.acquire(blocking=False):
+        raise AuthBusyError("Too many logins in progress.")
+    try:
+        future = get_executor().submit(function, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=AUTH_TIMEOUT)
+    except TimeoutError:
+        raise AuthBusyError("The password check did not finish in time.")
+
+
+def needs_upgrade(stored_hash, hasher):
+    """
+    Tells whether a stored hash is weaker than the hasher's parameters.
+
+    Only weaker hashes are replaced: calibration can choose different parameters in each
+    process (and parallelism follows the CPU count), so replacing every hash that merely
+    differs would rehash the same password back and forth.
+
+    Args:
+        stored_hash (str): The encoded hash from the database.
+        hasher (PasswordHasher): The current hasher.
+
+    Returns:
+        bool: True if the hash is not Argon2id or uses fewer iterations, less memory,
+            or a shorter salt or hash.
+    """
+
+    try:
+        stored = extract_parameters(stored_hash)
+    except InvalidHashError:
+        return True
+    return (
+        stored.type != Type.ID
+        or stored.time_cost < hasher.time_cost
+        or stored.memory_cost < hasher.memory_cost
+        or stored.salt_len < hasher.salt_len
+        or stored.hash_len < hasher.hash_len
+    )
+
+
+def _verify(stored_hash, password):
+    """
+    Verifies a password and rehashes it if the stored hash is weaker than the current parameters.
+    """
+
+    hasher = get_hasher()
+    try:
+        hasher.verify(stored_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False, None
+    if needs_upgrade(stored_hash, hasher):
+        return True, hasher.hash(password)
+    return True, None
+
+
+def hash_password(password):
+    """
+    Hashes a password for storage with the calibrated parameters.
+
+    Args:
+        password (str): The plaintext password.
+
+    Returns:
+        str: The encoded Argon2 hash.
+
+    Raises:
+        AuthBusyError: If the auth pool is saturated.
+    """
+
+    return _run(lambda: get_hasher().hash(password))
+
+
+def verify_password(stored_hash, password):
+    """
+    Checks a password against its stored hash.
+
+    Args:
+        stored_hash (str): The encoded hash from the database.
+        password (str): The plaintext password.
+
+    Returns:
+        tuple: (valid, new_hash). new_hash is set when the password is valid but the stored hash
+            is weaker than the current parameters and should be replaced.
+
+    Raises:
+        AuthBusyError: If the auth pool is saturated.
+    """
+
+    return _run(_verify, stored_hash, password)
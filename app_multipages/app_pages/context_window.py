@@ -0,0 +1,203 @@
+import hashlib
+import os
+from dotenv import load_dotenv
+from .tokens import count_message_tokens, model_family, truncate_tokens
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Context window (in tokens) assumed for each model family, unless CONTEXT_TOKEN_BUDGET overrides it
+MODEL_CONTEXT_TOKENS = {
+    "llama3": 8192,
+    "mixtral": 32768,
+    "mistral": 32768,
+    "nemotron": 4096,
+}
+DEFAULT_CONTEXT_TOKENS = 4096
+CONTEXT_TOKEN_BUDGET = os.getenv('CONTEXT_TOKEN_BUDGET')
+
+# Tokens of the window always left for the prompt, however large "Max Tokens" is set
+MIN_PROMPT_TOKENS = int(os.getenv('MIN_PROMPT_TOKENS', 1024))
+
+# Number of most recent messages always sent verbatim
+KEEP_RECENT_MESSAGES = int(os.getenv('KEEP_RECENT_MESSAGES', 4))
+
+# Largest share of the prompt budget given to the summary of older messages
+SUMMARY_BUDGET_RATIO = 0.25
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def context_tokens(model):
+    """
+    Returns the context window, in tokens, used for a model.
+
+    Args:
+        model (str): The model name.
+
+    Returns:
+        int: The number of tokens the prompt and the answer may use together.
+    """
+
+    if CONTEXT_TOKEN_BUDGET:
+        return int(CONTEXT_TOKEN_BUDGET)
+    return MODEL_CONTEXT_TOKENS.get(model_family(model), DEFAULT_CONTEXT_TOKENS)
+
+
+def answer_tokens(model, max_tokens):
+    """
+    Limits the tokens reserved for the answer so that the prompt keeps a minimum budget.
+
+    At least MIN_PROMPT_TOKENS (or half the window, if that is smaller) are left for the
+    prompt, so a "Max Tokens" setting close to or above the model's window does not
+    truncate the question away.
+
+    Args:
+        model (str): The model name.
+        max_tokens (int): The requested maximum number of tokens in the answer.
+
+    Returns:
+        int: The number of tokens to request for the answer, at most `max_tokens`.
+    """
+
+    window = context_tokens(model)
+    return max(min(max_tokens, window - min(MIN_PROMPT_TOKENS, window // 2)), 1)
+
+
+def deduplicate_files(messages):
+    """
+    Keeps the uploaded file body only on the latest message that refers to each file.
+
+    Earlier messages about the same file keep their question but lose the file
+    reference, so the file is sent to the model at most once.
+
+    Args:
+        messages (list): Session messages, optionally with a 'file_hash'.
+
+    Returns:
+        list: Copies of the messages with duplicated file references removed.
+    """
+
+    seen = set()
+    deduplicated = []
+    for msg in reversed(messages):
+        msg = dict(msg)
+        file_hash = msg.get('file_hash')
+        if file_hash:
+            if file_hash in seen:
+                msg.pop('file_hash')
+                msg['content'] = f"(About the uploaded file shown later.)\n{msg['content']}"
+            seen.add(file_hash)
+        deduplicated.append(msg)
+    return list(reversed(deduplicated))
+
+
+def _prefix_digests(messages):
+    """
+    Computes a digest of every prefix of a message list, each chained on the previous one.
+    """
+
+    digests = []
+    digest = b""
+    for msg in messages:
+        digest = hashlib.sha256(digest + msg['role'].encode('utf-8') + b"\0" + msg['content'].encode('utf-8')).digest()
+        digests.append(digest.hex())
+    return digests
+
+
+def summarize_older(messages, model, summary_tokens, summarize, cache):
+    """
+    Summarizes older messages incrementally, reusing cached summaries of their prefixes.
+
+    If a summary of the first k messages is cached, only that summary and the messages
+    after it are summarized again. A summary is only returned (and cached) if the system
+    message carrying it fits `summary_tokens`.
+
+    Args:
+        messages (list): The older messages, already expanded.
+        model (str): The model name.
+        summary_tokens (int): The token budget of the summary.
+        summarize (callable): `summarize(text, max_tokens)` returning the summary, or None on error.
+        cache (dict): Summaries keyed by prefix digest, kept between calls (e.g. in session state).
+
+    Returns:
+        str: The summary, or None if summarization failed or the summary does not fit.
+    """
+
+    def fits(summary):
+        return count_message_tokens(f"{SUMMARY_PREFIX}{summary}", model) <= summary_tokens
+
+    digests = _prefix_digests(messages)
+    if digests[-1] in cache and fits(cache[digests[-1]]):
+        return cache[digests[-1]]
+
+    start, previous = 0, None
+    for i in range(len(digests) - 1, -1, -1):
+        if digests[i] in cache:
+            start, previous = i + 1, cache[digests[i]]
+            break
+
+    parts = [f"{SUMMARY_PREFIX}{previous}"] if previous else []
+    parts += [f"{msg['role'].capitalize()}: {msg['content']}" for msg in messages[start:]]
+    # The prefix and the message overhead come out of the summary's budget
+    max_tokens = summary_tokens - count_message_tokens(SUMMARY_PREFIX, model)
+    if max_tokens <= 0:
+        return None
+    summary = summarize("\n\n".join(parts), max_tokens)
+    if not summary or not fits(summary):
+        return None
+    cache[digests[-1]] = summary
+    return summary
+
+
+def build_context(messages, model, max_tokens, expand, summarize, cache, keep_recent=KEEP_RECENT_MESSAGES):
+    """
+    Builds the messages sent to a model so that they fit its context window.
+
+    Duplicated file bodies are removed, the most recent messages are kept verbatim,
+    and older messages are replaced by a cached, incrementally updated summary when
+    the conversation no longer fits. If no summary fits, the older messages are dropped,
+    and a last message that alone exceeds the budget is truncated, so the result always
+    fits the window.
+
+    Args:
+        messages (list): Session messages, optionally with a 'file_hash'.
+        model (str): The model name.
+        max_tokens (int): Tokens reserved for the answer, limited by `answer_tokens`.
+        expand (callable): Turns a session message into an API message (inlining its file).
+        summarize (callable): `summarize(text, max_tokens)` returning the summary, or None on error.
+        cache (dict): Summaries keyed by prefix digest, kept between calls (e.g. in session state).
+        keep_recent (int, optional): Number of most recent messages always sent verbatim.
+
+    Returns:
+        list: The API messages to send.
+    """
+
+    api_messages = [expand(msg) for msg in deduplicate_files(messages)]
+    budget = context_tokens(model) - answer_tokens(model, max_tokens)
+    counts = [count_message_tokens(msg['content'], model) for msg in api_messages]
+
+    if sum(counts) <= budget:
+        return api_messages
+
+    split = max(len(api_messages) - keep_recent, 0)
+    older, recent, recent_counts = api_messages[:split], api_messages[split:], counts[split:]
+
+    # Drop the oldest of the recent messages if even those do not fit, but always keep the last one
+    while len(recent) > 1 and sum(recent_counts) > budget:
+        older.append(recent.pop(0))
+        recent_counts.pop(0)
+    if recent_counts[0] > budget:
+        last = dict(recent[0])
+        last['content'] = truncate_tokens(last['content'], max(budget - count_message_tokens("", model), 0), model)
+        recent, recent_counts = [last], [count_message_tokens(last['content'], model)]
+
+    context = []
+    remaining = budget - sum(recent_counts)
+    summary_tokens = min(int(budget * SUMMARY_BUDGET_RATIO), remaining)
+    if older and summary_tokens > 0:
+        summary = summarize_older(older, model, summary_tokens, summarize, cache)
+        if summary:
+            context.append({"role": "system", "content": f"{SUMMARY_PREFIX}{summary}"})
+
+    return context + recent
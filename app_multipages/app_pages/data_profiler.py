@@ -0,0 +1,313 @@
+import hashlib
+import io
+import os
+import re
+from collections import Counter
+import pandas as pd
+
+# Files smaller than this (in characters) are sent to the model as they are instead of profiled
+PROFILE_MIN_CHARS = int(os.getenv('PROFILE_MIN_CHARS', 20000))
+
+# Number of leading lines inspected to find the header and the start of the data table
+HEAD_LINES = 200
+
+# Minimum number of consecutive numeric rows that make a data table
+MIN_TABLE_ROWS = 3
+
+# Share of a column's values that must be numbers for it to be read as numeric;
+# the few that are not (footers, stray text) become NaN
+NUMERIC_COLUMN_RATIO = 0.8
+
+# Candidate delimiters, from the most to the least specific
+DELIMITERS = ["\t", ";", ",", "|", " "]
+DELIMITER_NAMES = {"\t": "tab", ";": "semicolon", ",": "comma", "|": "pipe", " ": "whitespace"}
+
+# Units written in the column name, e.g. "Force [kN]" or "Strain (%)"
+_UNIT_IN_NAME = re.compile(r'^(.*?)\s*[\[(]([^\])]+)[\])]\s*$')
+_NUMBER = re.compile(r'^[+-]?(\d+([.,]\d*)?|[.,]\d+)([eE][+-]?\d+)?$')
+
+# Separators between the key and the value of a header line, e.g. "Operator: AB"
+_HEADER_KEY = re.compile(r'^([^:=\t;]*)[:=\t;]')
+
+
+def _split(line, delimiter):
+    """
+    Splits one line on a delimiter, treating runs of whitespace as one separator.
+    """
+
+    if delimiter == " ":
+        return line.split()
+    return [field.strip() for field in line.split(delimiter)]
+
+
+def _is_numeric_row(fields):
+    """
+    Tells whether most fields of a row are numbers (with a decimal point or comma).
+    """
+
+    numeric = sum(1 for field in fields if _NUMBER.match(field))
+    return numeric >= max(1, len(fields) - 1) and numeric > 0
+
+
+def detect_table(head, delimiter):
+    """
+    Finds the first run of numeric rows with a consistent number of fields.
+
+    Args:
+        head (list): The leading lines of the file.
+        delimiter (str): The delimiter to split on.
+
+    Returns:
+        tuple: (start, width) of the table, or (None, 0) if none was found.
+    """
+
+    start, width, run = None, 0, 0
+    for index, line in enumerate(head):
+        fields = _split(line, delimiter)
+        if len(fields) >= 2 and _is_numeric_row(fields) and (run == 0 or len(fields) == width):
+            if run == 0:
+                start, width = index, len(fields)
+            run += 1
+            if run >= MIN_TABLE_ROWS:
+                return start, width
+        else:
+            start, width, run = None, 0, 0
+            if len(fields) >= 2 and _is_numeric_row(fields):
+                start, width, run = index, len(fields), 1
+    return None, 0
+
+
+def detect_delimiter(head):
+    """
+    Picks the delimiter that yields the earliest and widest numeric table.
+
+    Args:
+        head (list): The leading lines of the file.
+
+    Returns:
+        tuple: (delimiter, start, width), or (None, None, 0) if no table was found.
+    """
+
+    best = (None, None, 0)
+    for delimiter in DELIMITERS:
+        start, width = detect_table(head, delimiter)
+        if start is not None and width > best[2]:
+            best = (delimiter, start, width)
+    return best
+
+
+def _decimal_separator(rows):
+    """
+    Returns ',' if the numbers in the sample rows use decimal commas, '.' otherwise.
+    """
+
+    counts = Counter()
+    for fields in rows:
+        for field in fields:
+            if _NUMBER.match(field):
+                if ',' in field:
+                    counts[','] += 1
+                elif '.' in field:
+                    counts['.'] += 1
+    return ',' if counts[','] > counts['.'] else '.'
+
+
+def _unique_names(names):
+    """
+    Renames repeated column names the way pandas does ("Force", "Force.1", ...), since
+    read_csv refuses duplicate names.
+    """
+
+    seen = set()
+    unique = []
+    for name in names:
+        candidate, suffix = name, 0
+        while candidate in seen:
+            suffix += 1
+            candidate = f"{name}.{suffix}"
+        seen.add(candidate)
+        unique.append(candidate)
+    return unique
+
+
+def parse_header(head, start, width, delimiter):
+    """
+    Extracts the column names, units and free-form header lines above the data table.
+
+    Units are read from a row directly below the column names, or from brackets in the
+    column names themselves. Repeated names get a ".1", ".2", ... suffix.
+
+    Args:
+        head (list): The leading lines of the file.
+        start (int): Index of the first data row.
+        width (int): Number of columns of the table.
+        delimiter (str): The table delimiter.
+
+    Returns:
+        tuple: (names, units, header_lines).
+    """
+
+    above = [(index, _split(line, delimiter)) for index, line in enumerate(head[:start]) if line.strip()]
+    labelled = [(index, fields) for index, fields in above if len(fields) == width and not _is_numeric_row(fields)]
+
+    names, units, header_end = None, [None] * width, start
+    if labelled:
+        if len(labelled) >= 2 and labelled[-2][0] == labelled[-1][0] - 1:
+            # Two label rows right above the data: names, then units
+            header_end = labelled[-2][0]
+            names = labelled[-2][1]
+            units = [unit.strip('[]()') or None for unit in labelled[-1][1]]
+        else:
+            header_end = labelled[-1][0]
+            names = labelled[-1][1]
+
+    if names is None:
+        names = [f"column_{i + 1}" for i in range(width)]
+    else:
+        for i, name in enumerate(names):
+            match = _UNIT_IN_NAME.match(name)
+            if match and not units[i]:
+                names[i], units[i] = match.group(1), match.group(2)
+        names = _unique_names(names)
+
+    header_lines = [line.strip() for line in head[:header_end] if line.strip()]
+    return names, units, header_lines
+
+
+def read_table(text, skiprows, names, delimiter, decimal):
+    """
+    Reads the data table of a file into a DataFrame.
+
+    Mostly numeric columns are numeric, with their few non-numeric values as NaN; other
+    columns keep their text.
+
+    Args:
+        text (str): The full file content.
+        skiprows (int): Number of lines before the first data row.
+        names (list): The column names.
+        delimiter (str): The table delimiter.
+        decimal (str): The decimal separator.
+
+    Returns:
+        pandas.DataFrame: The table.
+    """
+
+    options = dict(skiprows=skiprows, header=None, names=names, decimal=decimal, skip_blank_lines=True)
+    if delimiter == " ":
+        df = pd.read_csv(io.StringIO(text), sep=r"\s+", engine="c", on_bad_lines="skip", **options)
+    else:
+        try:
+            df = pd.read_csv(io.StringIO(text), sep=delimiter, engine="pyarrow", **options)
+        except Exception:
+            df = pd.read_csv(io.StringIO(text), sep=delimiter, engine="c", on_bad_lines="skip", **options)
+
+    # Footers or stray text rows become NaN instead of turning numeric columns into strings;
+    # columns that are mostly text (e.g. a "Note" column) are kept as text
+    for column in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            values = df[column].astype(str).str.replace(',', '.', regex=False) if decimal == ',' else df[column]
+            numbers = pd.to_numeric(values, errors="coerce")
+            present = df[column].notna().sum()
+            if present and numbers.notna().sum() >= NUMERIC_COLUMN_RATIO * present:
+                df[column] = numbers
+    return df.dropna(how="all")
+
+
+def profile_text(text, sample_rows=5, max_header_lines=30):
+    """
+    Builds a compact, prompt-ready profile of a tabular machine data file.
+
+    The header lines above the table are kept as they are, and the table itself is
+    reduced to per-column dtype, unit, min/max/mean, null count and a few sample rows.
+
+    Args:
+        text (str): The full file content.
+        sample_rows (int, optional): Number of leading data rows to include.
+        max_header_lines (int, optional): Maximum number of header lines to include.
+
+    Returns:
+        str: The profile, or None if no data table was found.
+    """
+
+    head = text.split('\n', HEAD_LINES)[:HEAD_LINES]
+    head = [line.rstrip('\r') for line in head]
+    delimiter, start, width = detect_delimiter(head)
+    if delimiter is None:
+        return None
+
+    decimal = _decimal_separator([_split(line, delimiter) for line in head[start:start + 20]])
+    if delimiter == ',' and decimal == ',':
+        decimal = '.'
+    names, units, header_lines = parse_header(head, start, width, delimiter)
+    df = read_table(text, start, names, delimiter, decimal)
+
+    numeric = df.select_dtypes("number")
+    stats = numeric.agg(["min", "max", "mean"]) if not numeric.empty else None
+    nulls = df.isna().sum()
+
+    lines = [
+        "Profile of the uploaded data file (the raw data table is summarized, not included).",
+        f"Rows: {len(df)}, Columns: {width}, Delimiter: {DELIMITER_NAMES[delimiter]}, Decimal separator: '{decimal}'"
+    ]
+    if header_lines:
+        lines.append("Header lines:")
+        lines += [f"  {line}" for line in header_lines[:max_header_lines]]
+        if len(header_lines) > max_header_lines:
+            lines.append(f"  ... ({len(header_lines) - max_header_lines} more header lines)")
+
+    lines.append("Columns:")
+    for i, column in enumerate(df.columns):
+        unit = f", unit: {units[i]}" if units[i] else ""
+        if column in numeric.columns:
+            lines.append(
+                f"  - {column}{unit}, dtype: {df[column].dtype}, min: {stats.at['min', column]:.6g}, "
+                f"max: {stats.at['max', column]:.6g}, mean: {stats.at['mean', column]:.6g}, nulls: {nulls[column]}"
+            )
+        else:
+            lines.append(f"  - {column}{unit}, dtype: {df[column].dtype}, distinct values: {df[column].nunique()}, nulls: {nulls[column]}")
+
+    lines.append(f"First {min(sample_rows, len(df))} data rows:")
+    lines.append(df.head(sample_rows).to_csv(index=False, sep=';').strip())
+    return '\n'.join(lines)
+
+
+def _header_key(line):
+    """
+    Reduces a header line to the part shared by all files of the same format.
+
+    For "key: value" lines only the key is kept; otherwise digits are masked.
+    """
+
+    match = _HEADER_KEY.match(line)
+    key = match.group(1) if match and match.group(1).strip() else line
+    return re.sub(r'\d+', '#', ' '.join(key.lower().split()))
+
+
+def structure_fingerprint(text):
+    """
+    Computes a fingerprint of the layout of a tabular machine data file.
+
+    Files exported by the same instrument share the fingerprint even when their values
+    differ: it covers the header keys, column names, units and delimiter, but no data.
+
+    Args:
+        text (str): The full file content.
+
+    Returns:
+        str: The SHA-256 hex digest of the layout, or None if no data table was found.
+    """
+
+    head = text.split('\n', HEAD_LINES)[:HEAD_LINES]
+    head = [line.rstrip('\r') for line in head]
+    delimiter, start, width = detect_delimiter(head)
+    if delimiter is None:
+        return None
+
+    names, units, header_lines = parse_header(head, start, width, delimiter)
+    layout = {
+        "delimiter": delimiter,
+        "header": [_header_key(line) for line in header_lines],
+        "columns": [name.lower() for name in names],
+        "units": [unit.lower() if unit else None for unit in units]
+    }
+    return hashlib.sha256(repr(sorted(layout.items())).encode('utf-8')).hexdigest()
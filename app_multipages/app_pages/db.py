@@ -0,0 +1,337 @@
+import os
+import threading
+from datetime import datetime, timezone
+import pytz
+from sqlalchemy import create_engine, make_url, Column, Integer, String, Text, DateTime, Float, LargeBinary, Index
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Databases of the conversations and of the user accounts
+POSTGRESQL_URL = os.getenv('POSTGRESQL_URL')
+USERS_DATABASE_URL = os.getenv('POSTGRESQL_Pass_URL')
+
+# Connection pool of each engine: persistent connections, extra connections under load,
+# liveness check before use, connection lifetime and wait for a free connection (seconds)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+
+_engines = {}
+_session_factories = {}
+_lock = threading.Lock()
+
+Base = declarative_base()
+
+
+# Define the Conversation model
+class Conversation(Base):
+    """
+    Represents a conversation message stored in the database.
+
+    Attributes:
+        id (int): Primary key, autoincremented.
+        role (str): Role of the speaker (e.g., user or assistant).
+        content (str): The message content, or an empty string if it is stored compressed.
+        model_name (str): Name of the model used to generate the response.
+        token_usage (int): Number of tokens used in the response.
+        elapsed_time (float): Time taken to generate the response.
+        timestamp (datetime): Timestamp of when the message was created.
+        username (str): Username of the user who initiated the conversation.
+        conversation_id (str): UUID shared by a user message and its response (native UUID on PostgreSQL).
+        file_hash (str): Content hash of the uploaded file the message refers to, if any.
+        content_compressed (bytes): The zlib-compressed message, if it is stored compressed (see `message_codec`), else None.
+        compression_dictionary_id (int): ID of the preset dictionary the message was compressed with, 0 for none.
+        preview (str): Start of the message if it is stored compressed, else None.
+        content_length (int): Length of the message in characters, so listing it never reads the full content.
+    """
+
+    __tablename__ = 'conversations'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    model_name = Column(String, nullable=True)
+    token_usage = Column(Integer, nullable=True)
+    elapsed_time = Column(Float, nullable=True)
+    timestamp = Column(DateTime, default=lambda: datetime.now(pytz.utc).astimezone(pytz.timezone('Europe/Berlin')).replace(microsecond=0))
+    username = Column(String, nullable=False)
+    conversation_id = Column(String().with_variant(postgresql.UUID(as_uuid=False), "postgresql"), nullable=False)
+    file_hash = Column(String(64), nullable=True)
+    content_compressed = Column(LargeBinary, nullable=True)
+    compression_dictionary_id = Column(Integer, nullable=True)
+    preview = Column(Text, nullable=True)
+    content_length = Column(Integer, nullable=True)
+
+
+# History pages list a user's messages newest first; deletions look up both messages of a conversation
+Index('ix_conversations_username_timestamp', Conversation.username, Conversation.timestamp.desc())
+Index('ix_conversations_conversation_id_role', Conversation.conversation_id, Conversation.role)
+
+
+# Define the User model
+class User(Base):
+    """
+    Represents a user account.
+
+    Attributes:
+        id (int): Primary key, autoincremented.
+        username (str): The unique username of the user.
+        password (str): The hashed password of the user.
+        email (str): The unique email address of the user.
+    """
+
+    __tablename__ = 'users'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    username = Column(String, unique=True, nullable=False)
+    password = Column(String, nullable=False)
+    email = Column(String, unique=True, nullable=False)
+
+
+# Define the UserSession model
+class UserSession(Base):
+    """
+    Represents a login session, identified by the signed token given to the browser.
+
+    Attributes:
+        session_id (str): Primary key, the random ID embedded in the token.
+        username (str): The user the session belongs to.
+        created_at (datetime): When the user logged in.
+        expires_at (datetime): When the token stops being accepted.
+        revoked_at (datetime): When the session was ended by logging out, if it was.
+    """
+
+    __tablename__ = 'user_sessions'
+
+    session_id = Column(String(32), primary_key=True)
+    username = Column(String, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+
+
+# Define the UploadedFile model
+class UploadedFile(Base):
+    """
+    Represents an uploaded file stored once, addressed by the hash of its content.
+
+    Attributes:
+        content_hash (str): Primary key, SHA-256 hex digest of the raw file bytes.
+        filename (str): Name of the file when it was first stored.
+        content_type (str): MIME type reported by the browser.
+        size (int): Size of the raw file in bytes.
+        compressed_size (int): Size of the stored, zlib-compressed bytes.
+        data (bytes): The zlib-compressed file bytes.
+        created_at (datetime): When the file was first stored.
+    """
+
+    __tablename__ = 'uploaded_files'
+
+    content_hash = Column(String(64), primary_key=True)
+    filename = Column(String, nullable=True)
+    content_type = Column(String, nullable=True)
+    size = Column(Integer, nullable=False)
+    compressed_size = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(microsecond=0))
+
+
+# Define the CachedResponse model
+class CachedResponse(Base):
+    """
+    Represents a cached LLM response in the persistent cache tier.
+
+    Attributes:
+        key (str): Primary key, the canonical hash of the request.
+        value (str): The cached result, encoded as JSON.
+        created_at (datetime): When the response was cached.
+        expires_at (datetime): When the response stops being served.
+    """
+
+    __tablename__ = 'llm_response_cache'
+
+    key = Column(String(64), primary_key=True)
+    value = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# Define the CachedSchema model
+class CachedSchema(Base):
+    """
+    Represents a metadata schema generated for one instrument file format.
+
+    Attributes:
+        fingerprint (str): Structural fingerprint of the data files (see `data_profiler.structure_fingerprint`).
+        model_name (str): The model that generated the schema.
+        language (str): The language of the answer.
+        schema (str): The model answer containing the schema.
+        created_at (datetime): When the schema was generated.
+        hits (int): How many times the schema was served from the cache.
+    """
+
+    __tablename__ = 'schema_cache'
+
+    fingerprint = Column(String(64), primary_key=True)
+    model_name = Column(String, primary_key=True)
+    language = Column(String, primary_key=True)
+    schema = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(microsecond=0))
+    hits = Column(Integer, nullable=False, default=0)
+
+
+# Define the CompressionDictionary model
+class CompressionDictionary(Base):
+    """
+    Represents a preset dictionary used to compress conversation messages.
+
+    Attributes:
+        id (int): Primary key, referenced by every message compressed with the dictionary.
+        data (bytes): The dictionary (at most 32 KiB, the zlib window).
+        samples (int): Number of messages the dictionary was built from.
+        created_at (datetime): When the dictionary was built.
+    """
+
+    __tablename__ = 'compression_dictionaries'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    data = Column(LargeBinary, nullable=False)
+    samples = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(microsecond=0))
+
+
+def normalize_url(url):
+    """
+    Rewrites the legacy "postgres://" scheme (still used by Heroku) to "postgresql://".
+    """
+
+    if url and url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def get_engine(url=None):
+    """
+    Returns the engine of a database, creating it on first use.
+
+    All modules share one engine, and therefore one connection pool, per database URL.
+
+    Args:
+        url (str, optional): The database URL. Defaults to POSTGRESQL_URL.
+
+    Returns:
+        Engine: The shared engine.
+    """
+
+    url = normalize_url(url or POSTGRESQL_URL)
+    engine = _engines.get(url)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(url)
+            if engine is None:
+                options = {}
+                # SQLite (used for local development) has no server connection to pool
+                if make_url(url).get_backend_name() != "sqlite":
+                    options = dict(
+                        pool_size=DB_POOL_SIZE,
+                        max_overflow=DB_MAX_OVERFLOW,
+                        pool_pre_ping=DB_POOL_PRE_PING,
+                        pool_recycle=DB_POOL_RECYCLE,
+                        pool_timeout=DB_POOL_TIMEOUT
+                    )
+                engine = create_engine(url, **options)
+                _engines[url] = engine
+    return engine
+
+
+def get_sessionmaker(url=None):
+    """
+    Returns the session factory bound to the shared engine of a database.
+
+    Args:
+        url (str, optional): The database URL. Defaults to POSTGRESQL_URL.
+
+    Returns:
+        sessionmaker: The session factory.
+    """
+
+    url = normalize_url(url or POSTGRESQL_URL)
+    factory = _session_factories.get(url)
+    if factory is None:
+        # Resolved before taking the lock, which get_engine acquires as well
+        engine = get_engine(url)
+        with _lock:
+            factory = _session_factories.get(url)
+            if factory is None:
+                factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                _session_factories[url] = factory
+    return factory
+
+
+def lazy_sessionmaker(url=None, *models):
+    """
+    Returns a session factory that only creates the engine of a database when the first session is opened.
+
+    Pages and caches keep one of these at module or instance level: the shared engine
+    (see `get_engine`) and its sessionmaker are looked up on each call, so importing a
+    page does not touch the database, and every factory of a URL uses the same pool.
+
+    Args:
+        url (str, optional): The database URL. Defaults to POSTGRESQL_URL.
+        *models: Model classes whose tables are created, if missing, before the first session.
+
+    Returns:
+        callable: Called like a sessionmaker, returns a new Session.
+    """
+
+    tables_created = threading.Event()
+    tables_lock = threading.Lock()
+
+    def factory(**kwargs):
+        if models and not tables_created.is_set():
+            with tables_lock:
+                if not tables_created.is_set():
+                    create_tables(url, *models)
+                    tables_created.set()
+        return get_sessionmaker(url)(**kwargs)
+
+    return factory
+
+
+def create_tables(url, *models):
+    """
+    Creates the tables of the given models in a database if they do not exist.
+
+    Args:
+        url (str): The database URL.
+        *models: The model classes whose tables should exist.
+    """
+
+    Base.metadata.create_all(get_engine(url), tables=[model.__table__ for model in models])
+
+
+def pool_status():
+    """
+    Reports the connection pool usage of every engine created so far.
+
+    Returns:
+        dict: Per database URL (without password): pool size, connections checked in
+            and out, current overflow and the pool's own status line.
+    """
+
+    status = {}
+    for url, engine in list(_engines.items()):
+        pool = engine.pool
+        stats = {"status": pool.status()}
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+        status[make_url(url).render_as_string(hide_password=True)] = stats
+    return status
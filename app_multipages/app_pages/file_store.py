@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from sqlalchemy.exc import IntegrityError
+from dotenv import load_dotenv
+from .db import lazy_sessionmaker, UploadedFile, POSTGRESQL_URL
+
+# Load environment variables from .env file
+load_dotenv()
+
+SessionFactory = lazy_sessionmaker(POSTGRESQL_URL)
+
+# Total size (in characters) of the decompressed files kept in memory
+FILE_CACHE_MAX_CHARS = int(os.getenv('FILE_CACHE_MAX_CHARS', 32 * 1024 * 1024))
+
+_text_cache = OrderedDict()
+_text_cache_size = 0
+_text_cache_lock = threading.Lock()
+
+
+def store_file(data, filename=None, content_type=None):
+    """
+    Stores an uploaded file unless a file with the same content is already stored.
+
+    Args:
+        data (bytes): The raw file bytes.
+        filename (str, optional): The name of the uploaded file.
+        content_type (str, optional): The MIME type of the uploaded file.
+
+    Returns:
+        str: The content hash referencing the stored file.
+    """
+
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    session = SessionFactory()
+    try:
+        if session.get(UploadedFile, content_hash) is None:
+            compressed = zlib.compress(data, 6)
+            session.add(UploadedFile(
+                content_hash=content_hash,
+                filename=filename,
+                content_type=content_type,
+                size=len(data),
+                compressed_size=len(compressed),
+                data=compressed
+            ))
+            session.commit()
+    except IntegrityError:
+        # Another session stored the same file in the meantime
+        session.rollback()
+    finally:
+        session.close()
+
+    return content_hash
+
+
+def load_file_text(content_hash):
+    """
+    Loads and decompresses a stored file as text.
+
+    Recently used files are kept in memory, up to FILE_CACHE_MAX_CHARS characters in total;
+    a file larger than that is never kept.
+
+    Args:
+        content_hash (str): The content hash returned by `store_file`.
+
+    Returns:
+        str: The decoded file content, or None if no such file is stored.
+    """
+
+    global _text_cache_size
+    with _text_cache_lock:
+        if content_hash in _text_cache:
+            _text_cache.move_to_end(content_hash)
+            return _text_cache[content_hash]
+
+    session = SessionFactory()
+    try:
+        stored = session.get(UploadedFile, content_hash)
+        if stored is None:
+            return None
+        text = zlib.decompress(stored.data).decode("utf-8")
+    finally:
+        session.close()
+
+    if len(text) <= FILE_CACHE_MAX_CHARS:
+        with _text_cache_lock:
+            if content_hash not in _text_cache:
+                _text_cache[content_hash] = text
+                _text_cache_size += len(text)
+                while _text_cache_size > FILE_CACHE_MAX_CHARS:
+                    _, evicted = _text_cache.popitem(last=False)
+                    _text_cache_size -= len(evicted)
+    return text
+
+
+@lru_cache(maxsize=256)
+def get_file_info(content_hash):
+    """
+    Retrieves the metadata of a stored file without loading its content.
+
+    Args:
+        content_hash (str): The content hash returned by `store_file`.
+
+    Returns:
+        dict: The filename, content type, size and compressed size, or None if no such file is stored.
+    """
+
+    session = SessionFactory()
+    try:
+        row = session.query(
+            UploadedFile.filename, UploadedFile.content_type, UploadedFile.size, UploadedFile.compressed_size
+        ).filter(UploadedFile.content_hash == content_hash).first()
+        if row is None:
+            return None
+        return {"filename": row.filename, "content_type": row.content_type, "size": row.size, "compressed_size": row.compressed_size}
+    finally:
+        session.close()
+
+
+def describe_file(content_hash):
+    """
+    Builds a short, human-readable reference to a stored file.
+
+    Args:
+        content_hash (str): The content hash returned by `store_file`.
+
+    Returns:
+        str: For example "📎 data.dat (12.3 KB)".
+    """
+
+    info = get_file_info(content_hash)
+    if info is None:
+        return f"📎 Missing file {content_hash[:12]}"
+    return f"📎 {info['filename'] or content_hash[:12]} ({info['size'] / 1024:.1f} KB)"
@@ -1,67 +1,109 @@
 import streamlit as st
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
-from datetime import datetime, timezone
+from sqlalchemy import and_, or_, func, select, delete
+from sqlalchemy.orm import scoped_session, aliased
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
-import time  # Import time module
+from .file_store import describe_file
+from .db import lazy_sessionmaker, Conversation, POSTGRESQL_URL
+from .search import search_conversations, highlight
+from .message_codec import decode_content
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Get the PostgreSQL URL from the environment variables
-POSTGRESQL_URL = os.getenv('POSTGRESQL_URL')
-
 # Debugging: Check if POSTGRESQL_URL is loaded
 if POSTGRESQL_URL is None:
     raise ValueError("Error: POSTGRESQL_URL is missing or empty in the environment variables.")
 
-# Define the database engine using the PostgreSQL URL
-engine = create_engine(POSTGRESQL_URL)
-Base = declarative_base()
+# Number of messages loaded at once on the history page
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 50))
 
-# Define the Conversation model
-class Conversation(Base):
-    """
-    ORM model representing the 'conversations' table in the PostgreSQL database.
-    """
-    __tablename__ = 'conversations'
+# Number of characters of each message shown in the history list; the rest is loaded on request
+HISTORY_PREVIEW_CHARS = int(os.getenv('HISTORY_PREVIEW_CHARS', 500))
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    role = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
-    model_name = Column(String, nullable=True)
-    token_usage = Column(Integer, nullable=True)
-    elapsed_time = Column(Float, nullable=True)
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(microsecond=0))
-    username = Column(String, nullable=False)  # Track conversations by user
-    conversation_id = Column(String, nullable=False)
+Session = scoped_session(lazy_sessionmaker(POSTGRESQL_URL))
+
+def message_length(message):
+    """
+    Returns the SQL expression of a message's length for the history list.
 
-# Create the table if it doesn't exist, with error handling
-try:
-    Base.metadata.create_all(engine)
-except Exception as e:
-    st.error(f"Error creating the table: {e}")
+    content_length is set on every message (migration 7 filled it in for older ones). A
+    message saved without it by an older app version falls back to the length of its
+    first HISTORY_PREVIEW_CHARS + 1 characters: enough to tell whether it is truncated,
+    without reading (and on PostgreSQL decompressing) the whole content.
 
-# Create a session factory
-Session = scoped_session(sessionmaker(bind=engine))
+    Parameters:
+    - message: The Conversation model or an alias of it.
 
-# Initialize session state for login status
-if "logged_in" not in st.session_state:
-    st.session_state.logged_in = False
+    Returns:
+    - ColumnElement: The length expression.
+    """
+    return func.coalesce(message.content_length, func.length(func.substr(message.content, 1, HISTORY_PREVIEW_CHARS + 1)))
 
 # Function to get conversation history
-def get_conversation_history():
+def get_conversation_history(before=None, after=None, limit=None):
     """
-    Retrieves the conversation history for the currently logged-in user from the PostgreSQL database.
+    Retrieves one page of the conversation history of the logged-in user, newest first.
+
+    Each row is one conversation: the user message joined with the assistant message of the
+    same conversation_id (the first one, if several were saved). Pages are addressed by
+    keyset on the (timestamp, id) of the user message, so fetching a page costs the same
+    however far back it is. Only the metadata and the first HISTORY_PREVIEW_CHARS characters
+    of each message are fetched; see `get_message_content` for the full text.
+
+    Parameters:
+    - before (tuple, optional): (timestamp, id) of the oldest user message already loaded; only older conversations are returned.
+    - after (tuple, optional): (timestamp, id) of the newest user message already loaded; only newer conversations are returned.
+    - limit (int, optional): Maximum number of conversations to return. No limit if None.
+
+    Returns:
+    - list: One row per conversation with the user and assistant previews and metadata, newest first.
     """
     session = Session()
     try:
-        history = session.query(Conversation).filter(
-            Conversation.username == st.session_state.username
-        ).order_by(Conversation.timestamp.desc()).all()
-        return history
+        user = aliased(Conversation)
+        assistant = aliased(Conversation)
+        first_answer = select(func.min(Conversation.id)).where(
+            Conversation.conversation_id == user.conversation_id,
+            Conversation.role == 'assistant',
+            Conversation.username == user.username
+        ).scalar_subquery()
+
+        query = select(
+            user.conversation_id,
+            user.id.label("user_id"),
+            user.timestamp,
+            user.file_hash,
+            func.substr(func.coalesce(user.preview, user.content), 1, HISTORY_PREVIEW_CHARS).label("user_preview"),
+            message_length(user).label("user_length"),
+            assistant.id.label("assistant_id"),
+            assistant.timestamp.label("assistant_timestamp"),
+            assistant.model_name,
+            assistant.token_usage,
+            assistant.elapsed_time,
+            func.substr(func.coalesce(assistant.preview, assistant.content), 1, HISTORY_PREVIEW_CHARS).label("assistant_preview"),
+            message_length(assistant).label("assistant_length")
+        ).outerjoin(
+            assistant, assistant.id == first_answer
+        ).where(
+            user.username == st.session_state.username,
+            user.role == 'user'
+        )
+        if before is not None:
+            query = query.where(or_(
+                user.timestamp < before[0],
+                and_(user.timestamp == before[0], user.id < before[1])
+            ))
+        if after is not None:
+            query = query.where(or_(
+                user.timestamp > after[0],
+                and_(user.timestamp == after[0], user.id > after[1])
+            ))
+        query = query.order_by(user.timestamp.desc(), user.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return session.execute(query).all()
     except Exception as e:
         session.rollback()
         st.error(f"An error occurred: {e}")
@@ -69,59 +111,216 @@ def get_conversation_history():
     finally:
         session.close()
 
-# Function to delete a conversation
-def delete_conversation(conversation_id):
+def get_message_content(message_id):
+    """
+    Retrieves the full text of one message of the logged-in user, caching it in the session state.
+
+    Parameters:
+    - message_id (int): The ID of the message.
+
+    Returns:
+    - str: The message content, or None if it was not found.
+    """
+    full_contents = st.session_state.history.setdefault("full", {})
+    if message_id not in full_contents:
+        session = Session()
+        try:
+            row = session.execute(
+                select(Conversation.content, Conversation.content_compressed, Conversation.compression_dictionary_id).where(
+                    Conversation.id == message_id,
+                    Conversation.username == st.session_state.username  # Ensure ownership
+                )
+            ).first()
+            full_contents[message_id] = decode_content(*row) if row else None
+        except Exception as e:
+            session.rollback()
+            st.error(f"An error occurred: {e}")
+            return None
+        finally:
+            session.close()
+    return full_contents[message_id]
+
+def show_full_message(column, message_id, content_length):
+    """
+    Shows a toggle that loads and displays the full text of a truncated message.
+
+    Parameters:
+    - column: The Streamlit column the message is displayed in.
+    - message_id (int): The ID of the message.
+    - content_length (int): The length of the full message in characters.
+    """
+    if content_length > HISTORY_PREVIEW_CHARS:
+        if column.toggle(f"Show full message ({content_length} characters)", key=f"full_{message_id}"):
+            column.markdown(get_message_content(message_id))
+
+def load_history_page():
+    """
+    Loads the next (older) page of the history into the session state.
+
+    Behavior:
+    - Appends up to HISTORY_PAGE_SIZE conversations older than the ones already loaded.
+    - Marks the history as complete when fewer conversations than a full page are returned.
+    """
+    history = st.session_state.history
+    cursor = None
+    if history["rows"]:
+        oldest = history["rows"][-1]
+        cursor = (oldest.timestamp, oldest.user_id)
+    rows = get_conversation_history(before=cursor, limit=HISTORY_PAGE_SIZE)
+    history["rows"].extend(rows)
+    history["complete"] = len(rows) < HISTORY_PAGE_SIZE
+
+def refresh_history():
+    """
+    Prepares the loaded history of the logged-in user for display.
+
+    Behavior:
+    - Starts with the first page when nothing (or another user's history) is loaded.
+    - Otherwise only fetches the conversations saved since the last visit and puts them on top.
     """
-    Deletes a user conversation and the corresponding assistant response from the database.
+    history = st.session_state.get("history")
+    if history is None or history["username"] != st.session_state.username:
+        st.session_state.history = {"username": st.session_state.username, "rows": [], "complete": False}
+        load_history_page()
+    elif not history["rows"]:
+        # Nothing loaded (or everything deleted): start again from the newest conversations
+        load_history_page()
+    else:
+        newest = history["rows"][0]
+        history["rows"][:0] = get_conversation_history(after=(newest.timestamp, newest.user_id))
+
+# Function to delete conversations
+def delete_conversations(conversation_ids=None, before=None):
+    """
+    Deletes conversations of the logged-in user (user messages and responses) with one statement.
+
+    Meant to be used as a button callback: deleted conversations are removed from the loaded
+    history in the session state, so the page does not need to be reloaded from the database.
 
     Parameters:
-    - conversation_id (int): The unique ID of the user message to be deleted.
+    - conversation_ids (list, optional): The conversation IDs to delete.
+    - before (datetime, optional): Delete every conversation with messages older than this instead.
 
     Behavior:
-    - Deletes both the user message and the next assistant message if present.
-    - Ensures only the owner of the conversation (based on the username) can delete messages.
+    - Ensures only the owner of the conversations (based on the username) can delete them.
+    - Leaves a success or error notice for the next render of the history page.
+    """
+    history = st.session_state.history
+    statement = delete(Conversation).where(Conversation.username == st.session_state.username)  # Ensure ownership
+    if before is not None:
+        statement = statement.where(Conversation.timestamp < before)
+    else:
+        statement = statement.where(Conversation.conversation_id.in_(list(conversation_ids)))
+
+    session = Session()
+    try:
+        deleted = session.execute(statement).rowcount
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        history["notice"] = ("error", f"An error occurred: {e}")
+        return
+    finally:
+        session.close()
+
+    if before is not None:
+        history["rows"] = [row for row in history["rows"] if row.timestamp >= before]
+    else:
+        removed = set(conversation_ids)
+        history["rows"] = [row for row in history["rows"] if row.conversation_id not in removed]
+    if deleted:
+        history["notice"] = ("success", f"{deleted} messages deleted successfully.")
+    else:
+        history["notice"] = ("error", "Message not found or you do not have permission to delete this message.")
+
+def delete_selected_conversations():
     """
+    Deletes the conversations whose selection checkbox is ticked on the history page.
+    """
+    selected = [row.conversation_id for row in st.session_state.history["rows"] if st.session_state.get(f"sel_{row.user_id}")]
+    if selected:
+        delete_conversations(selected)
+
+
+def get_model_names():
+    """
+    Returns the names of the models that answered the logged-in user, cached in the session state.
+    """
+    history = st.session_state.history
+    if "models" not in history:
+        session = Session()
+        try:
+            history["models"] = session.execute(
+                select(Conversation.model_name).where(
+                    Conversation.username == st.session_state.username,
+                    Conversation.role == 'assistant',
+                    Conversation.model_name.is_not(None)
+                ).distinct().order_by(Conversation.model_name)
+            ).scalars().all()
+        except Exception as e:
+            session.rollback()
+            st.error(f"An error occurred: {e}")
+            return []
+        finally:
+            session.close()
+    return history["models"]
+
+def search_history(query, models, dates):
+    """
+    Runs a full-text search over the messages of the logged-in user.
+
+    Parameters:
+    - query (str): The words to search for.
+    - models (list): Only conversations answered by one of these models (all if empty).
+    - dates (tuple): The selected date range; a single date searches that day only.
+
+    Returns:
+    - list: The matching messages, best matches first.
+    """
+    start = end = None
+    if dates:
+        start = datetime.combine(dates[0], datetime.min.time())
+        end = datetime.combine(dates[-1], datetime.min.time()) + timedelta(days=1)
     session = Session()
     try:
-        # Find the user message by ID and ensure it belongs to the logged-in user
-        user_message = session.query(Conversation).filter(
-            Conversation.id == conversation_id,
-            Conversation.username == st.session_state.username  # Ensure ownership
-        ).first()
-
-        if user_message:
-            # Delete the user message
-            session.delete(user_message)
-
-            # # Find and delete the next assistant message (response) after the user's message
-            # assistant_message = session.query(Conversation).filter(
-            #     Conversation.timestamp > user_message.timestamp,  # Must be after the user message
-            #     Conversation.role == 'assistant',                 # Must be an assistant's message
-            #     Conversation.username == st.session_state.username  # Ensure ownership
-            # ).order_by(Conversation.timestamp.asc()).first()  # Get the next message chronologically
-
-            # Find and delete the next assistant message (response) after the user's message
-            assistant_message = session.query(Conversation).filter(
-                Conversation.conversation_id == user_message.conversation_id,  # Same conversation
-                Conversation.role == 'assistant',  # Must be an assistant's message
-                Conversation.username == st.session_state.username  # Ensure ownership
-            ).first()  # Get the assistant message  # Get the next message chronologically  # Get the next message chronologically
-
-
-            if assistant_message:
-                session.delete(assistant_message)
-            session.delete(user_message)
-
-            session.commit()
-            st.success("Message and response deleted successfully.")
-        else:
-            st.error("Message not found or you do not have permission to delete this message.")
+        return search_conversations(session, st.session_state.username, query, models=models, start=start, end=end)
     except Exception as e:
         session.rollback()
         st.error(f"An error occurred: {e}")
+        return []
     finally:
         session.close()
-        st.rerun()  # Refresh the page after deletion
+
+def display_search_results(results, query):
+    """
+    Displays search results with the matched words highlighted.
+
+    Parameters:
+    - results (list): The rows returned by `search_history`.
+    - query (str): The search query, for highlighting.
+    """
+    if not results:
+        st.info("No messages match your search.")
+        return
+    st.caption(f"{len(results)} best matching messages")
+    for result in results:
+        color = "#ad6a5a" if result.role == 'user' else "#5aad78"
+        model = f" · Model: {result.model_name}" if result.model_name else ""
+        st.markdown(f"""
+            <div style="background-color: {color}; padding: 10px; border-radius: 10px; margin-bottom: 10px;">
+                <strong>{result.role.capitalize()}:</strong> {highlight(decode_content(result.content, result.content_compressed, result.compression_dictionary_id), query)} <br>
+                <small>Date and Time in UTC: {result.timestamp}{model}</small>
+            </div>
+            """, unsafe_allow_html=True)
+
+
+def preview_text(preview, content_length):
+    """
+    Returns the preview of a message, with an ellipsis if the message is longer.
+    """
+    if content_length > HISTORY_PREVIEW_CHARS:
+        return f"{preview}…"
+    return preview
 
 
 # Function to display conversation history
@@ -131,17 +330,15 @@ def display_conversation_history():
     """
 
     # Ensure that session state variables are initialized
+    if 'logged_in' not in st.session_state:
+        st.session_state.logged_in = False
+    if 'username' not in st.session_state:
+        st.session_state.username = None
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'file_content' not in st.session_state:
-        st.session_state.file_content = None
     if 'warning_shown' not in st.session_state:
         st.session_state.warning_shown = False
 
-    # Add loading spinner using Streamlit's built-in spinner
-    with st.spinner("History is loading. Please wait a moment..."):
-        time.sleep(2)  # Simulate loading time
-
     # Load the rest of the page content
     page_bg_img = '''
     <style>
@@ -161,44 +358,63 @@ def display_conversation_history():
         return
 
     st.write("### Conversation History")
-    history = get_conversation_history()
+    with st.spinner("History is loading. Please wait a moment..."):
+        refresh_history()
+    notice = st.session_state.history.pop("notice", None)
+    if notice:
+        getattr(st, notice[0])(notice[1])
+
+    # Full-text search replaces the list while a query is entered
+    query = st.text_input("🔍 Search your conversations", key="history_query")
+    with st.expander("Search filters"):
+        models = st.multiselect("Models", get_model_names(), key="history_models")
+        dates = st.date_input("Dates", value=[], key="history_dates")
+    if query.strip():
+        display_search_results(search_history(query, models, dates), query)
+        return
+
+    # Bulk clean-up of the history
+    with st.expander("🗑️ Delete older conversations"):
+        cutoff = st.date_input("Delete all conversations before:", value=None, key="history_cutoff")
+        st.button(
+            "Delete older than this date",
+            disabled=cutoff is None,
+            on_click=lambda: delete_conversations(before=datetime.combine(st.session_state.history_cutoff, datetime.min.time()))
+        )
+
+    history = st.session_state.history["rows"]
     if not history:
         st.info("No conversation history found.")
     else:
-        messages = {"user": [], "assistant": []}
+        st.button("Delete selected", key="history_delete_selected", on_click=delete_selected_conversations)
 
         for conv in history:
-            role = "user" if conv.role == "user" else "assistant"
-            if role == "user":
-                messages["user"].append((conv.id, conv.content, conv.timestamp))
-            else:
-                messages["assistant"].append((conv.content, conv.timestamp, conv.model_name, conv.token_usage, conv.elapsed_time))
-
-        max_len = max(len(messages["user"]), len(messages["assistant"]))
-
-        for i in range(max_len):
             cols = st.columns([4, 4, 2])  # Add extra column for the delete button
-            user_message = messages["user"][i] if i < len(messages["user"]) else (None, None, None)
-            assistant_message = messages["assistant"][i] if i < len(messages["assistant"]) else (None, None, None, None, None)
 
-            if user_message[1]:
-                cols[0].markdown(f"""
-                    <div style="background-color: #ad6a5a; padding: 10px; border-radius: 10px; margin-bottom: 10px;">
-                        <strong>User:</strong> {user_message[1]} <br> <small>Date and Time in UTC: {user_message[2]}</small>
-                    </div>
-                    """, unsafe_allow_html=True)
+            attachment = f"{describe_file(conv.file_hash)}<br>" if conv.file_hash else ""
+            cols[0].markdown(f"""
+                <div style="background-color: #ad6a5a; padding: 10px; border-radius: 10px; margin-bottom: 10px;">
+                    <strong>User:</strong> {attachment}{preview_text(conv.user_preview, conv.user_length)} <br> <small>Date and Time in UTC: {conv.timestamp}</small>
+                </div>
+                """, unsafe_allow_html=True)
+            show_full_message(cols[0], conv.user_id, conv.user_length)
 
-                if st.session_state.logged_in:  # Only show delete button if logged in
-                    if cols[2].button(f"Delete", key=f"del_{user_message[0]}"):
-                        delete_conversation(user_message[0])
+            if st.session_state.logged_in:  # Only show delete controls if logged in
+                cols[2].button("Delete", key=f"del_{conv.user_id}", on_click=delete_conversations, args=([conv.conversation_id],))
+                cols[2].checkbox("Select", key=f"sel_{conv.user_id}")
 
-            if assistant_message[0]:
+            if conv.assistant_id is not None:
                 cols[1].markdown(f"""
                     <div style="background-color: #5aad78; padding: 10px; border-radius: 10px; margin-bottom: 10px;">
-                        <strong>Assistant:</strong> {assistant_message[0]} <br> 
-                        <small>Date and Time in UTC: {assistant_message[1]}</small><br>
-                        <small>Model: {assistant_message[2] if assistant_message[2] else 'Unknown'}</small><br>
-                        <small>Token_usage: {assistant_message[3] if assistant_message[3] else 'Unknown'} </small> ---
-                        <small>Elapsed Time: {assistant_message[4] if assistant_message[4] else 'Unknown'} </small>
+                        <strong>Assistant:</strong> {preview_text(conv.assistant_preview, conv.assistant_length)} <br>
+                        <small>Date and Time in UTC: {conv.assistant_timestamp}</small><br>
+                        <small>Model: {conv.model_name if conv.model_name else 'Unknown'}</small><br>
+                        <small>Token_usage: {conv.token_usage if conv.token_usage else 'Unknown'} </small> ---
+                        <small>Elapsed Time: {conv.elapsed_time if conv.elapsed_time else 'Unknown'} </small>
                     </div>
                     """, unsafe_allow_html=True)
+                show_full_message(cols[1], conv.assistant_id, conv.assistant_length)
+
+        # Older messages are only fetched on request
+        if not st.session_state.history["complete"]:
+            st.button("Load more", key="history_load_more", on_click=load_history_page)
@@ -0,0 +1,296 @@
+import json
+import os
+import time
+import httpx
+from dotenv import load_dotenv
+from .llm_client import post_json, stream_lines
+from .response_cache import response_cache, make_cache_key
+from .tokens import count_tokens, count_messages_tokens, usage_from_response
+from .summarizer import map_reduce_summarize
+
+# Load environment variables from .env file
+load_dotenv()
+
+def compress_response(content, model, target_token_count):
+    """
+    Compresses a response to fit within the target token count while keeping coherence.
+
+    The response is summarized with a parallel map-reduce (see `summarizer.map_reduce_summarize`),
+    so an over-long answer costs roughly one extra round of concurrent calls instead of
+    several serial ones.
+
+    Args:
+        content (str): The original response content.
+        model (str): The model used for generating responses.
+        target_token_count (int): The desired number of tokens.
+
+    Returns:
+        str: The compressed response, or None if it could not be brought within `target_token_count`.
+    """
+
+    def complete(prompt, max_tokens):
+        response = query_api(messages=[{"role": "user", "content": prompt}], model=model, max_tokens=max_tokens, compress=False)
+        if 'error' in response:
+            return None
+        return response['content']
+
+    return map_reduce_summarize(content, complete, target_token_count, model)
+
+def query_api(messages, model, temperature=0.7, max_tokens=600, top_k=40, top_p=0.9, use_cache=True, compress=True):
+    """
+    Queries an external API to get a response based on provided messages and model.
+
+    Args:
+        messages (list): List of message dictionaries.
+        model (str): The model to be used.
+        temperature (float, optional): The randomness in the response.
+        max_tokens (int, optional): Maximum number of tokens in the response.
+        top_k (int, optional): Limits the sampling pool to the top-k tokens.
+        top_p (float, optional): Nucleus sampling for choosing from the top tokens.
+        use_cache (bool, optional): Whether to serve and store the response in the response cache.
+        compress (bool, optional): Whether to compress a response longer than `max_tokens`.
+
+    Returns:
+        dict: API response data, including content, token usage, cache status, and errors (if any).
+    """
+
+    start_time = time.time()
+    cache_key = make_cache_key(model, messages, temperature, max_tokens, top_k, top_p)
+    if use_cache:
+        cached, tier = response_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, elapsed_time=time.time() - start_time, cache=tier)
+
+    url = os.getenv('API_URL')
+    headers = {"Authorization": f"Bearer {'API_KEY'}"}
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_k": top_k,
+        "top_p": top_p
+    }
+
+    response = post_json(url, payload, headers=headers)
+    elapsed_time = time.time() - start_time
+
+    if response.status_code == 200:
+        try:
+            response_json = response.json()
+        except ValueError:
+            return {
+                "error": "API response is not valid JSON",
+                "elapsed_time": elapsed_time,
+                "prompt_tokens": 0,
+                "response_tokens": 0,
+                "total_tokens": 0
+            }
+        if 'choices' in response_json and len(response_json['choices']) > 0:
+            choice = response_json['choices'][0]
+            if 'message' in choice and 'content' in choice['message']:
+                result = build_result(choice['message']['content'], messages, model, max_tokens, elapsed_time, response_json=response_json, compress=compress)
+                result["cache"] = "miss"
+                if use_cache:
+                    response_cache.set(cache_key, result)
+                return result
+            else:
+                return {
+                    "error": "API response missing 'message' or 'content' key",
+                    "elapsed_time": elapsed_time,
+                    "prompt_tokens": 0,
+                    "response_tokens": 0,
+                    "total_tokens": 0
+                }
+        else:
+            return {
+                "error": "API response missing 'choices' key or empty 'choices'",
+                "elapsed_time": elapsed_time,
+                "prompt_tokens": 0,
+                "response_tokens": 0,
+                "total_tokens": 0
+            }
+    else:
+        return {
+            "error": f"Failed with status code {response.status_code}",
+            "elapsed_time": elapsed_time,
+            "prompt_tokens": 0,
+            "response_tokens": 0,
+            "total_tokens": 0
+        }
+
+def build_result(response_content, messages, model, max_tokens, elapsed_time, response_json=None, usage=None, compress=True):
+    """
+    Builds the result dictionary returned for a successful completion.
+
+    The response is compressed when it exceeds `max_tokens`, and the prompt and
+    response token counts are attached. Counts reported by the backend are used when
+    available; otherwise they are computed with the model's tokenizer.
+
+    Args:
+        response_content (str): The text generated by the model.
+        messages (list): The messages sent to the model.
+        model (str): The model used.
+        max_tokens (int): Maximum number of tokens in the response.
+        elapsed_time (float): Time taken to generate the response.
+        response_json (dict, optional): The raw API response, if available.
+        usage (dict, optional): Token usage reported by the backend, as returned by `usage_from_response`.
+        compress (bool, optional): Whether to compress a response longer than `max_tokens`.
+
+    Returns:
+        dict: Response data, including content and token usage.
+    """
+
+    if usage is None:
+        usage = usage_from_response(response_json) or {}
+
+    response_tokens = usage.get('response_tokens')
+    if response_tokens is None:
+        response_tokens = count_tokens(response_content, model)
+
+    if compress and response_tokens > max_tokens:
+        # Keep the full answer if it cannot be compressed to the limit
+        response_content = compress_response(response_content, model, max_tokens) or response_content
+
+    prompt_tokens = usage.get('prompt_tokens')
+    if prompt_tokens is None:
+        prompt_tokens = count_messages_tokens(messages, model)
+    total_tokens = prompt_tokens + response_tokens
+
+    return {
+        "response": response_json,
+        "elapsed_time": elapsed_time,
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "total_tokens": total_tokens,
+        "content": response_content
+    }
+
+def parse_stream_line(line):
+    """
+    Extracts the text delta from one line of a streamed completion.
+
+    Both OpenAI-compatible server-sent events (`data: {...}` lines ending with
+    `data: [DONE]`) and Ollama's newline-delimited JSON chunks are understood.
+
+    Args:
+        line (str): One line of the streamed response body.
+
+    Returns:
+        tuple: (text, done, usage), where `text` is the new text (possibly empty),
+        `done` tells whether the stream has finished and `usage` holds the token
+        usage reported by the backend in this chunk, if any.
+    """
+
+    if line.startswith(':'):
+        return "", False, None  # SSE comment / keep-alive
+    if line.startswith('data:'):
+        line = line[len('data:'):].strip()
+        if line == '[DONE]':
+            return "", True, None
+    chunk = json.loads(line)
+    usage = usage_from_response(chunk)
+
+    if 'choices' in chunk:
+        if not chunk['choices']:
+            return "", False, usage  # Final usage-only chunk
+        choice = chunk['choices'][0]
+        delta = choice.get('delta') or choice.get('message') or {}
+        return delta.get('content') or "", False, usage
+    if 'message' in chunk:
+        return chunk['message'].get('content') or "", chunk.get('done', False), usage
+    return "", chunk.get('done', False), usage
+
+def stream_api(messages, model, temperature=0.7, max_tokens=600, top_k=40, top_p=0.9, result=None, use_cache=True):
+    """
+    Queries the external API with streaming enabled and yields the answer as it is generated.
+
+    Once the stream ends, `result` is filled with the same keys `query_api` returns
+    (content, elapsed time, token counts, or an error), plus the time to the first token.
+
+    Args:
+        messages (list): List of message dictionaries.
+        model (str): The model to be used.
+        temperature (float, optional): The randomness in the response.
+        max_tokens (int, optional): Maximum number of tokens in the response.
+        top_k (int, optional): Limits the sampling pool to the top-k tokens.
+        top_p (float, optional): Nucleus sampling for choosing from the top tokens.
+        result (dict, optional): Dictionary filled with the final response data.
+        use_cache (bool, optional): Whether to serve and store the response in the response cache.
+
+    Yields:
+        str: Pieces of the response text, in order.
+    """
+
+    if result is None:
+        result = {}
+
+    start_time = time.time()
+    cache_key = make_cache_key(model, messages, temperature, max_tokens, top_k, top_p)
+    if use_cache:
+        cached, tier = response_cache.get(cache_key)
+        if cached is not None:
+            elapsed_time = time.time() - start_time
+            result.update(dict(cached, elapsed_time=elapsed_time, time_to_first_token=elapsed_time, cache=tier))
+            yield cached['content']
+            return
+
+    url = os.getenv('API_URL')
+    headers = {"Authorization": f"Bearer {'API_KEY'}"}
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_k": top_k,
+        "top_p": top_p,
+        "stream": True,
+        "stream_options": {"include_usage": True}
+    }
+
+    time_to_first_token = None
+    usage = None
+    pieces = []
+    try:
+        for line in stream_lines(url, payload, headers=headers):
+            text, done, chunk_usage = parse_stream_line(line)
+            usage = chunk_usage or usage
+            if text:
+                if time_to_first_token is None:
+                    time_to_first_token = time.time() - start_time
+                pieces.append(text)
+                yield text
+            if done:
+                break
+    except httpx.HTTPStatusError as e:
+        result.update({
+            "error": f"Failed with status code {e.response.status_code}",
+            "elapsed_time": time.time() - start_time,
+            "prompt_tokens": 0,
+            "response_tokens": 0,
+            "total_tokens": 0
+        })
+        return
+    except ValueError:
+        result.update({
+            "error": "API stream contained a line that is not valid JSON",
+            "elapsed_time": time.time() - start_time,
+            "prompt_tokens": 0,
+            "response_tokens": 0,
+            "total_tokens": 0
+        })
+        return
+    elapsed_time = time.time() - start_time
+
+    result.update(build_result(''.join(pieces), messages, model, max_tokens, elapsed_time, usage=usage))
+    result["time_to_first_token"] = time_to_first_token
+    result["cache"] = "miss"
+    if use_cache:
+        response_cache.set(cache_key, result)
+
+
+# Metadata schema prompt shared by the upload form and batch_schema.py, so both send (and cache) the same request
+predefined_prompt = (
+    "Create a non-populated metadata schema for a tensile test using the uploaded raw data. "
+    "The metadata schema should follow JSON schema standards, as documented in https://json-schema.org/"
+)
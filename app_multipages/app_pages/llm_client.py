@@ -0,0 +1,193 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Deadlines (in seconds) for calls to the LLM backend
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 10))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 120))
+LLM_TOTAL_TIMEOUT = float(os.getenv('LLM_TOTAL_TIMEOUT', 300))
+
+# Connection pool settings shared by every Streamlit session in this process
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 20))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', 10))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', 60))
+LLM_HTTP2 = os.getenv('LLM_HTTP2', 'true').lower() in ('1', 'true', 'yes')
+
+# Maximum number of in-flight requests per backend host
+LLM_MAX_CONCURRENCY_PER_BACKEND = int(os.getenv('LLM_MAX_CONCURRENCY_PER_BACKEND', 4))
+
+_client = None
+_client_lock = threading.Lock()
+_backend_slots = {}
+_backend_slots_lock = threading.Lock()
+
+
+class TotalTimeout(httpx.TimeoutException):
+    """
+    Raised when a request to the LLM backend runs past its total deadline.
+    """
+
+
+def _http2_available():
+    """
+    Checks whether the optional `h2` package needed by httpx for HTTP/2 is installed.
+
+    Returns:
+        bool: True if HTTP/2 can be negotiated, False otherwise.
+    """
+
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_client():
+    """
+    Returns the process-wide pooled HTTP client used for all LLM requests.
+
+    The client is created on first use and keeps connections alive between requests,
+    negotiating HTTP/2 when the backend and the installed packages allow it.
+
+    Returns:
+        httpx.Client: The shared HTTP client.
+    """
+
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    http2=LLM_HTTP2 and _http2_available(),
+                    timeout=httpx.Timeout(
+                        connect=LLM_CONNECT_TIMEOUT,
+                        read=LLM_READ_TIMEOUT,
+                        write=LLM_READ_TIMEOUT,
+                        pool=LLM_CONNECT_TIMEOUT
+                    ),
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                    )
+                )
+    return _client
+
+
+def close_client():
+    """
+    Closes the shared HTTP client and its pooled connections, if one was created.
+    """
+
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_client)
+
+
+@contextmanager
+def backend_slot(url):
+    """
+    Holds one of the limited request slots of the backend serving `url`.
+
+    Requests to the same host share a semaphore of size LLM_MAX_CONCURRENCY_PER_BACKEND,
+    so fan-out from several sessions cannot flood a single GPU backend.
+
+    Args:
+        url (str): The URL of the request about to be sent.
+    """
+
+    host = httpx.URL(url).host
+    with _backend_slots_lock:
+        slot = _backend_slots.get(host)
+        if slot is None:
+            slot = _backend_slots[host] = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY_PER_BACKEND)
+    with slot:
+        yield
+
+
+def post_json(url, payload, headers=None, total_timeout=None):
+    """
+    Sends a JSON POST request through the shared client, enforcing a total deadline.
+
+    The connect and read timeouts of the client bound each individual network
+    operation, while the total deadline bounds the whole request so that a backend
+    trickling bytes cannot hold the calling thread forever.
+
+    Args:
+        url (str): The endpoint to call.
+        payload (dict): The JSON body of the request.
+        headers (dict, optional): Extra request headers.
+        total_timeout (float, optional): Total deadline in seconds. Defaults to LLM_TOTAL_TIMEOUT.
+
+    Returns:
+        httpx.Response: The fully read response.
+
+    Raises:
+        TotalTimeout: If the response is not complete before the deadline.
+        httpx.TransportError: On connection errors or connect/read timeouts.
+    """
+
+    with backend_slot(url):
+        deadline = time.monotonic() + (total_timeout or LLM_TOTAL_TIMEOUT)
+        with get_client().stream("POST", url, json=payload, headers=headers) as response:
+            chunks = []
+            for chunk in response.iter_raw():
+                if time.monotonic() > deadline:
+                    raise TotalTimeout("LLM request exceeded its total deadline", request=response.request)
+                chunks.append(chunk)
+
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        content=b"".join(chunks),
+        request=response.request
+    )
+
+
+def stream_lines(url, payload, headers=None, total_timeout=None):
+    """
+    Sends a JSON POST request through the shared client and yields the response line by line.
+
+    This is used for streamed completions (server-sent events or newline-delimited JSON),
+    so callers can render tokens as they arrive. The same total deadline as `post_json`
+    applies to the whole stream.
+
+    Args:
+        url (str): The endpoint to call.
+        payload (dict): The JSON body of the request.
+        headers (dict, optional): Extra request headers.
+        total_timeout (float, optional): Total deadline in seconds. Defaults to LLM_TOTAL_TIMEOUT.
+
+    Yields:
+        str: Each non-empty line of the response body.
+
+    Raises:
+        TotalTimeout: If the stream is not complete before the deadline.
+        httpx.HTTPStatusError: If the backend answers with an error status.
+        httpx.TransportError: On connection errors or connect/read timeouts.
+    """
+
+    with backend_slot(url):
+        deadline = time.monotonic() + (total_timeout or LLM_TOTAL_TIMEOUT)
+        with get_client().stream("POST", url, json=payload, headers=headers) as response:
+            if response.status_code != 200:
+                response.read()
+                response.raise_for_status()
+            for line in response.iter_lines():
+                if time.monotonic() > deadline:
+                    raise TotalTimeout("LLM stream exceeded its total deadline", request=response.request)
+                if line.strip():
+                    yield line
@@ -1,46 +1,21 @@
 import streamlit as st
+import streamlit.components.v1 as components
 from dotenv import load_dotenv
-import os
 # import hashlib
-from argon2 import PasswordHasher
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String
+from .db import lazy_sessionmaker, User, USERS_DATABASE_URL
+from .auth import verify_password, AuthBusyError
+from .session_tokens import issue_token, validate_token, revoke_token, SESSION_TTL
 
 # Load environment variables
 load_dotenv()
 
-# Define the database URL
-DATABASE_URL = os.getenv('POSTGRESQL_Pass_URL')
+SessionLocal = lazy_sessionmaker(USERS_DATABASE_URL)
 
-# Create a new SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Browser cookie holding the signed session token
+SESSION_COOKIE = "session"
 
-# Create a base class for the models
-Base = declarative_base()
-
-# Define the User model
-class User(Base):
-    """
-    ORM model representing the 'users' table in the PostgreSQL database.
-
-    Columns:
-    - id (Integer, primary key): Unique identifier for each user.
-    - username (String, unique, non-nullable): The username of the user (must be unique).
-    - password (String, non-nullable): The hashed password of the user.
-    - email (String, unique, non-nullable): The email address of the user (must be unique).
-    """
-
-    __tablename__ = 'users'
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    username = Column(String, unique=True, nullable=False)
-    password = Column(String, nullable=False)
-    email = Column(String, unique=True, nullable=False)
-
-# Create a new session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# URL query parameter that held the token in earlier versions; it is removed from the URL on sight
+SESSION_QUERY_PARAM = "session"
 
 def get_db():
     """
@@ -70,28 +45,128 @@ def check_credentials(username, password):
     - bool: True if the username and password combination is correct, False otherwise.
 
     Hashing:
-    - The password is hashed using SHA-256 before comparison with the stored hashed password in the database.
+    - The password is verified against the stored Argon2 hash on the shared auth pool (see `auth.verify_password`).
+    - If the stored hash was made with outdated parameters, it is replaced by a new hash of the password.
+
+    Raises:
+    - AuthBusyError: If too many logins are being checked at the same time.
     """
 
-    """Check if the provided username and password are correct."""
-    # hashed_password = hashlib.sha256(password.encode()).hexdigest()
-     # Get a database session
+    # Get a database session
     db = next(get_db())
-    
-    # Retrieve the user from the database by username
-    user = db.query(User).filter(User.username == username).first()
-    
-    # If user exists, verify the password
-    if user:
-        ph = PasswordHasher()
+    try:
+        # Retrieve the user from the database by username
+        user = db.query(User).filter(User.username == username).first()
+        if not user:
+            return False
+
+        # Verify the password against the stored hash
+        valid, new_hash = verify_password(user.password, password)
+        if new_hash:
+            user.password = new_hash
+            db.commit()
+        return valid
+    finally:
+        db.close()
+
+def write_session_cookie(token):
+    """
+    Stores the session token in a browser cookie, or deletes the cookie if the token is None.
+
+    Streamlit cannot set cookies from Python, so a hidden component sets it with JavaScript.
+    The browser sends the cookie when it opens a new connection, where `st.context.cookies`
+    reads it. Unlike a URL, it does not end up in the browser history or in proxy logs.
+
+    Parameters:
+    - token (str): The session token, or None to delete the cookie.
+    """
+    value, max_age = (token, SESSION_TTL) if token else ("", 0)
+    components.html(
+        f"""<script>
+        window.parent.document.cookie = "{SESSION_COOKIE}={value}; Max-Age={max_age}; Path=/; SameSite=Strict"
+            + (window.parent.location.protocol === "https:" ? "; Secure" : "");
+        </script>""",
+        height=0
+    )
+
+def sync_session_cookie():
+    """
+    Writes the token of the current session to the cookie if it changed since the last write.
+
+    Session State:
+    - `cookie_token`: The token last written to the cookie.
+    """
+    token = st.session_state.get("session_token")
+    if st.session_state.get("cookie_token") != token:
+        write_session_cookie(token)
+        st.session_state.cookie_token = token
+
+def restore_session():
+    """
+    Logs the user in from the session token cookie, so a reload or a new tab skips the password check.
+
+    Behavior:
+    - Accepts the token if its signature is valid, it has not expired and it was not revoked
+      (see `session_tokens.validate_token`; revocations are looked up at most once a minute).
+    - Logs out a user whose token has been revoked since, e.g. by logging out in another tab.
+    - Deletes invalid tokens from the cookie.
+    - Moves a token still in the URL (`?session=...`, as in earlier versions) to the cookie.
+
+    Session State:
+    - `logged_in`, `username`: Set from the token.
+    - `session_token`: The token of the current session.
+    """
+    if "cookie_token" not in st.session_state:
+        st.session_state.cookie_token = st.context.cookies.get(SESSION_COOKIE)
+    url_token = st.query_params.pop(SESSION_QUERY_PARAM, None)
+    token = st.session_state.get("session_token") or url_token or st.session_state.cookie_token
+    if not token:
+        return
+    try:
+        username = validate_token(token)
+    except Exception as e:
+        # Keep the current state if the sessions table cannot be reached
+        print(f"Could not validate session token: {e}")
+        return
+    if username:
+        st.session_state.logged_in = True
+        st.session_state.username = username
+        st.session_state.session_token = token
+    elif st.session_state.get("session_token") == token:
+        st.session_state.logged_in = False
+        st.session_state.username = None
+        st.session_state.session_token = None
+    sync_session_cookie()
+
+def start_session(username):
+    """
+    Marks the user as logged in and starts a session, whose token is stored in a cookie
+    on the next run (see `sync_session_cookie`).
+
+    Parameters:
+    - username (str): The user who just entered a valid password.
+    """
+    st.session_state.logged_in = True
+    st.session_state.username = username  # Store the username in session state
+    try:
+        st.session_state.session_token = issue_token(username)
+    except Exception as e:
+        # The user stays logged in for this browser session only
+        print(f"Could not create session token: {e}")
+
+def end_session():
+    """
+    Logs the user out and revokes the session token; the cookie is deleted on the next run.
+    """
+    token = st.session_state.get("session_token")
+    if token:
         try:
-            # Verify the password against the stored hash
-            ph.verify(user.password, password)
-            return True
+            revoke_token(token)
         except Exception as e:
-            return False
-    
-    return False
+            print(f"Could not revoke session token: {e}")
+    st.session_state.logged_in = False
+    st.session_state.username = None
+    st.session_state.session_token = None
 
 def login():
     """
@@ -113,6 +188,7 @@ def login():
     Session State:
     - `logged_in`: Tracks whether the user is logged in (True or False).
     - `username`: Stores the logged-in user's username.
+    - `session_token`: The signed token kept in a cookie (see `restore_session`).
     """
 
     # Initialize session state for login status if not already present
@@ -128,8 +204,7 @@ def login():
         
         # Display logout button
         if st.button("Logout"):
-            st.session_state.logged_in = False
-            st.session_state.username = None
+            end_session()
             st.success("You have been logged out.")
             # Rerun the app to reflect the updated state
             st.rerun()
@@ -147,9 +222,13 @@ def login():
         submit_button = st.form_submit_button("Login")
 
         if submit_button:
-            if check_credentials(username, password):
-                st.session_state.logged_in = True
-                st.session_state.username = username  # Store the username in session state
+            try:
+                valid = check_credentials(username, password)
+            except AuthBusyError:
+                st.error("Too many people are logging in right now. Please try again in a moment.")
+                return False
+            if valid:
+                start_session(username)
                 title_placeholder.empty()  # Clear the title on successful login
                 st.success("Login successful!")
                 # Rerun the app to apply the change
@@ -0,0 +1,248 @@
+import os
+import zlib
+from collections import Counter
+from functools import lru_cache
+from sqlalchemy import select, update, bindparam
+from dotenv import load_dotenv
+from .db import get_engine, Conversation, CompressionDictionary, POSTGRESQL_URL
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Compress new messages that are at least this many characters long
+MESSAGE_COMPRESSION = os.getenv('MESSAGE_COMPRESSION', 'false').lower() in ('1', 'true', 'yes')
+MESSAGE_COMPRESSION_THRESHOLD = int(os.getenv('MESSAGE_COMPRESSION_THRESHOLD', 2048))
+
+# Characters of a compressed message kept readable for the history list (see history.HISTORY_PREVIEW_CHARS)
+MESSAGE_PREVIEW_CHARS = int(os.getenv('HISTORY_PREVIEW_CHARS', 500))
+
+# Maximum size of a preset dictionary: zlib can only refer back 32 KiB
+DICTIONARY_SIZE = 32 * 1024
+
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(dictionary_id):
+    """
+    Loads a preset dictionary by ID. Dictionaries never change, so they are cached for the process lifetime.
+
+    Args:
+        dictionary_id (int): The ID of the dictionary, 0 for none.
+
+    Returns:
+        bytes: The dictionary, empty for ID 0.
+    """
+
+    if dictionary_id == 0:
+        return b""
+    with get_engine(POSTGRESQL_URL).connect() as connection:
+        return connection.execute(select(CompressionDictionary.data).where(CompressionDictionary.id == dictionary_id)).scalar_one()
+
+
+@lru_cache(maxsize=1)
+def current_dictionary():
+    """
+    Returns the newest preset dictionary, used to compress new messages.
+
+    Returns:
+        tuple: (dictionary_id, data), or (0, b"") if no dictionary was built yet.
+    """
+
+    with get_engine(POSTGRESQL_URL).connect() as connection:
+        row = connection.execute(
+            select(CompressionDictionary.id, CompressionDictionary.data).order_by(CompressionDictionary.id.desc()).limit(1)
+        ).first()
+    return (row.id, row.data) if row else (0, b"")
+
+
+def compress_content(content):
+    """
+    Compresses a message with the newest dictionary.
+
+    The zlib stream is stored as is in the binary content_compressed column, and the content
+    column is left empty.
+
+    Args:
+        content (str): The message text.
+
+    Returns:
+        dict: The values of the content, content_compressed, compression_dictionary_id, preview
+            and content_length columns. The message is stored as is (with no preview) if
+            compressing it does not make it smaller.
+    """
+
+    dictionary_id, dictionary = current_dictionary()
+    compressor = zlib.compressobj(9, zdict=dictionary) if dictionary else zlib.compressobj(9)
+    encoded = content.encode("utf-8")
+    data = compressor.compress(encoded) + compressor.flush()
+    if len(data) >= len(encoded):
+        return plain_content(content)
+    return {
+        "content": "",
+        "content_compressed": data,
+        "compression_dictionary_id": dictionary_id,
+        "preview": content[:MESSAGE_PREVIEW_CHARS],
+        "content_length": len(content)
+    }
+
+
+def plain_content(content):
+    """
+    Returns the column values of a message stored uncompressed.
+    """
+
+    return {"content": content, "content_compressed": None, "compression_dictionary_id": None, "preview": None, "content_length": len(content)}
+
+
+def encode_content(content):
+    """
+    Prepares a message for storage, compressing it if compression is enabled and it is long enough.
+
+    Args:
+        content (str): The message text.
+
+    Returns:
+        dict: The column values of the message (see `compress_content`).
+    """
+
+    if MESSAGE_COMPRESSION and len(content) >= MESSAGE_COMPRESSION_THRESHOLD:
+        return compress_content(content)
+    return plain_content(content)
+
+
+def decode_content(content, compressed=None, dictionary_id=None):
+    """
+    Returns the text of a stored message, decompressing it if needed.
+
+    Args:
+        content (str): The value of the content column.
+        compressed (bytes, optional): The value of the content_compressed column.
+        dictionary_id (int, optional): The value of the compression_dictionary_id column.
+
+    Returns:
+        str: The message text.
+    """
+
+    if compressed is None:
+        return content
+    dictionary = load_dictionary(dictionary_id or 0)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return (decompressor.decompress(compressed) + decompressor.flush()).decode("utf-8")
+
+
+def build_dictionary(samples, size=DICTIONARY_SIZE):
+    """
+    Builds a preset dictionary from the lines that recur across sample messages.
+
+    Schemas generated by the models repeat the same keys and fragments ("type": "string", "description": ...).
+    Lines found in at least two samples are kept, the most common ones last, because zlib
+    encodes references to the end of the dictionary most cheaply.
+
+    Args:
+        samples (list): Message texts.
+        size (int, optional): Maximum size of the dictionary in bytes.
+
+    Returns:
+        bytes: The dictionary, empty if the samples have nothing in common.
+    """
+
+    counts = Counter()
+    for sample in samples:
+        counts.update({line.strip() for line in sample.splitlines() if len(line.strip()) >= 8})
+
+    lines = []
+    used = 0
+    for line, count in counts.most_common():
+        if count < 2 or used >= size:
+            break
+        lines.append(line)
+        used += len(line.encode("utf-8")) + 1
+    return "\n".join(reversed(lines)).encode("utf-8")[-size:]
+
+
+def train_dictionary(samples=500):
+    """
+    Builds a dictionary from the newest assistant answers and makes it the one used for new messages.
+
+    Args:
+        samples (int, optional): Number of answers to learn from.
+
+    Returns:
+        tuple: (dictionary_id, size in bytes), or (None, 0) if there is nothing to learn from.
+    """
+
+    with get_engine(POSTGRESQL_URL).connect() as connection:
+        answers = connection.execute(
+            select(Conversation.content, Conversation.content_compressed, Conversation.compression_dictionary_id).where(
+                Conversation.role == 'assistant'
+            ).order_by(Conversation.id.desc()).limit(samples)
+        ).all()
+    texts = [decode_content(*answer) for answer in answers]
+    data = build_dictionary(texts)
+    if not data:
+        return None, 0
+
+    with get_engine(POSTGRESQL_URL).begin() as connection:
+        dictionary_id = connection.execute(
+            CompressionDictionary.__table__.insert().values(data=data, samples=len(texts)).returning(CompressionDictionary.id)
+        ).scalar_one()
+    current_dictionary.cache_clear()
+    return dictionary_id, len(data)
+
+
+def compress_existing(batch_size=500, threshold=MESSAGE_COMPRESSION_THRESHOLD):
+    """
+    Compresses the stored messages that are not compressed yet, in batches of one transaction each.
+
+    Args:
+        batch_size (int, optional): Number of messages read and updated per transaction.
+        threshold (int, optional): Minimum length of the messages to compress.
+
+    Returns:
+        tuple: (messages compressed, bytes before, bytes after).
+    """
+
+    table = Conversation.__table__
+    statement = update(table).where(table.c.id == bindparam('message_id')).values(
+        content=bindparam('new_content'),
+        content_compressed=bindparam('new_compressed'),
+        compression_dictionary_id=bindparam('new_dictionary_id'),
+        preview=bindparam('new_preview'),
+        content_length=bindparam('new_length')
+    )
+    compressed = before = after = 0
+    last_id = 0
+    # Loaded up front rather than while a batch transaction is open
+    current_dictionary()
+    while True:
+        with get_engine(POSTGRESQL_URL).begin() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.content).where(
+                    table.c.id > last_id,
+                    table.c.content_compressed.is_(None),
+                    table.c.content_length >= threshold
+                ).order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                values = compress_content(row.content)
+                if values["content_compressed"] is None:
+                    continue
+                updates.append({
+                    "message_id": row.id,
+                    "new_content": values["content"],
+                    "new_compressed": values["content_compressed"],
+                    "new_dictionary_id": values["compression_dictionary_id"],
+                    "new_preview": values["preview"],
+                    "new_length": values["content_length"]
+                })
+                before += len(row.content.encode("utf-8"))
+                after += len(values["content_compressed"])
+            if updates:
+                connection.execute(statement, updates)
+            compressed += len(updates)
+    return compressed, before, after
@@ -0,0 +1,169 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Queue conversation rows to a background writer instead of writing them on the script thread
+DB_WRITE_BEHIND = os.getenv('DB_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+
+# The background writer flushes when this many rows are queued, or after this many seconds
+DB_FLUSH_ROWS = int(os.getenv('DB_FLUSH_ROWS', 100))
+DB_FLUSH_INTERVAL = float(os.getenv('DB_FLUSH_INTERVAL', 1.0))
+
+# Maximum number of queued writes; beyond it messages are written synchronously
+DB_WRITE_QUEUE_SIZE = int(os.getenv('DB_WRITE_QUEUE_SIZE', 1000))
+
+# Maximum number of rows kept for a retry while the database is unavailable
+DB_PENDING_MAX_ROWS = int(os.getenv('DB_PENDING_MAX_ROWS', 10000))
+
+
+class MessageWriter:
+    """
+    Persists groups of conversation rows, either directly or through a background writer.
+
+    Each call to `write` stores its rows in one transaction. In write-behind mode the
+    groups are queued and a daemon thread inserts everything queued so far with a single
+    executemany once `flush_rows` rows are waiting or `flush_interval` seconds have
+    passed. The queue is flushed when the process exits.
+
+    Rows whose insert failed are retried, but at most `pending_max_rows` are kept. While
+    that many are waiting, the writer stops taking groups from the queue, so once the
+    queue is full new writes are made synchronously again.
+
+    Attributes:
+        engine (Engine): The database engine.
+        insert (callable): Inserts a list of rows on an open connection, e.g. `search.insert_conversations`.
+        write_behind (bool): Whether rows are written by the background writer.
+    """
+
+    def __init__(self, engine, insert, write_behind=DB_WRITE_BEHIND, flush_rows=DB_FLUSH_ROWS,
+                 flush_interval=DB_FLUSH_INTERVAL, queue_size=DB_WRITE_QUEUE_SIZE, pending_max_rows=DB_PENDING_MAX_ROWS) -> None:
+        self.engine = engine
+        self.insert = insert
+        self.write_behind = write_behind
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.pending_max_rows = pending_max_rows
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = []
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _insert(self, rows):
+        """
+        Inserts rows in one transaction.
+        """
+
+        with self.engine.begin() as connection:
+            self.insert(connection, rows)
+
+    def write(self, rows):
+        """
+        Stores a group of rows (e.g. a user message and its answer) atomically.
+
+        Args:
+            rows (list): Column values of each row, as dicts.
+
+        Raises:
+            SQLAlchemyError: If the rows are written synchronously and the insert fails.
+        """
+
+        if not self.write_behind:
+            self._insert(rows)
+            return
+
+        self._start()
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            # The writer is falling behind; apply back-pressure on the caller instead of growing the queue
+            self._insert(rows)
+
+    def _start(self):
+        """
+        Starts the background writer on first use.
+        """
+
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _drain(self):
+        """
+        Moves the queued groups to the pending rows, up to pending_max_rows.
+        """
+
+        while len(self._pending) < self.pending_max_rows:
+            try:
+                self._pending.extend(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def flush(self):
+        """
+        Writes every queued row now.
+
+        Returns:
+            int: The number of rows written.
+        """
+
+        with self._flush_lock:
+            self._drain()
+            if not self._pending:
+                return 0
+            rows, self._pending = self._pending, []
+            try:
+                self._insert(rows)
+            except Exception as e:
+                # Keep the rows for the next flush rather than losing them, within pending_max_rows
+                self._pending = rows + self._pending
+                print(f"Background write of {len(rows)} messages failed: {e}")
+                dropped = len(self._pending) - self.pending_max_rows
+                if dropped > 0:
+                    del self._pending[self.pending_max_rows:]
+                    print(f"Dropped {dropped} unwritten messages over the limit of {self.pending_max_rows}.")
+                return 0
+            return len(rows)
+
+    def _run(self):
+        """
+        Flushes on a size or time threshold until the writer is closed.
+        """
+
+        last_flush = time.monotonic()
+        while not self._stopped.is_set():
+            if len(self._pending) >= self.pending_max_rows:
+                # The database is failing; leave new groups in the queue until the retry succeeds
+                self._stopped.wait(self.flush_interval)
+            else:
+                try:
+                    group = self._queue.get(timeout=self.flush_interval)
+                    with self._flush_lock:
+                        self._pending.extend(group)
+                except queue.Empty:
+                    pass
+            if len(self._pending) >= self.flush_rows or time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Stops the background writer and writes the rows still queued.
+        """
+
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        # Each flush takes at most pending_max_rows, so repeat until the queue is empty or a write fails
+        while self.flush() and not self._queue.empty():
+            pass
@@ -0,0 +1,232 @@
+import base64
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text, bindparam, Table, Column, Integer, String, DateTime, LargeBinary, MetaData
+from .db import get_engine, Base, Conversation, User, UserSession, UploadedFile, CompressionDictionary, POSTGRESQL_URL, USERS_DATABASE_URL
+from .search import SEARCH_TEXT_CONFIG, SEARCH_MAX_CHARS
+
+# Record of the migrations applied to a database, per component (a database may hold several)
+migration_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('component', String(32), primary_key=True),
+    Column('version', Integer, primary_key=True),
+    Column('description', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+
+def _create_conversation_tables(connection):
+    """
+    Creates the conversations and uploaded files tables of a new database.
+    """
+
+    Base.metadata.create_all(connection, tables=[Conversation.__table__, UploadedFile.__table__])
+
+
+def _add_file_hash(connection):
+    """
+    Adds the file reference column to conversations tables created before it existed.
+    """
+
+    if 'file_hash' not in {column['name'] for column in inspect(connection).get_columns('conversations')}:
+        connection.execute(text("ALTER TABLE conversations ADD COLUMN file_hash VARCHAR(64)"))
+
+
+def _index_conversations(connection):
+    """
+    Indexes the history lookups: a user's messages by time, and the messages of a conversation.
+    """
+
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_conversations_username_timestamp ON conversations (username, timestamp DESC)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_conversations_conversation_id_role ON conversations (conversation_id, role)"))
+
+
+def _uuid_conversation_id(connection):
+    """
+    Stores conversation_id as a native UUID on PostgreSQL (16 bytes instead of a 36-character string).
+
+    IDs that are not valid UUIDs are mapped to the UUID of their MD5 hash, so messages
+    of one conversation keep sharing the same ID.
+    """
+
+    if connection.dialect.name != "postgresql":
+        return
+    column = next(column for column in inspect(connection).get_columns('conversations') if column['name'] == 'conversation_id')
+    if isinstance(column['type'], String):
+        connection.execute(text(
+            "ALTER TABLE conversations ALTER COLUMN conversation_id TYPE uuid USING "
+            "CASE WHEN conversation_id ~* '^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$' "
+            "THEN conversation_id::uuid ELSE md5(conversation_id)::uuid END"
+        ))
+
+
+def _index_conversation_text(connection):
+    """
+    Adds the full-text index of the message contents and fills it for the existing messages.
+
+    PostgreSQL gets a tsvector column with a GIN index, SQLite an FTS5 table keyed by the
+    message id. Only the first SEARCH_MAX_CHARS characters of a message are indexed, which keeps
+    very long messages under the tsvector size limit. New messages are indexed when they are
+    inserted (see `search.insert_conversations`).
+    """
+
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("ALTER TABLE conversations ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+        connection.execute(text(
+            f"UPDATE conversations SET search_vector = to_tsvector('{SEARCH_TEXT_CONFIG}', left(content, :max_chars)) "
+            "WHERE search_vector IS NULL"
+        ), {"max_chars": SEARCH_MAX_CHARS})
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_conversations_search ON conversations USING GIN (search_vector)"))
+    elif connection.dialect.name == "sqlite":
+        connection.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(content)"))
+        connection.execute(
+            text("INSERT INTO conversations_fts (rowid, content) SELECT id, substr(content, 1, :max_chars) FROM conversations"),
+            {"max_chars": SEARCH_MAX_CHARS}
+        )
+        # Deleted messages leave the index with them
+        connection.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations "
+            "BEGIN DELETE FROM conversations_fts WHERE rowid = old.id; END"
+        ))
+
+
+def _add_compression(connection):
+    """
+    Adds the compression dictionaries and the columns that keep compressed messages listable.
+    """
+
+    Base.metadata.create_all(connection, tables=[CompressionDictionary.__table__])
+    columns = {column['name'] for column in inspect(connection).get_columns('conversations')}
+    if 'preview' not in columns:
+        connection.execute(text("ALTER TABLE conversations ADD COLUMN preview TEXT"))
+    if 'content_length' not in columns:
+        connection.execute(text("ALTER TABLE conversations ADD COLUMN content_length INTEGER"))
+
+
+def _backfill_content_length(connection):
+    """
+    Stores the length of every message written before content_length was always set.
+
+    The history list reads this column instead of computing length(content), which on
+    PostgreSQL would decompress every TOASTed message it lists.
+    """
+
+    connection.execute(text("UPDATE conversations SET content_length = length(content) WHERE content_length IS NULL"))
+
+
+def _store_compressed_content_as_binary(connection):
+    """
+    Moves compressed messages from base85 text in the content column to a binary column.
+
+    Messages compressed so far are stored as "\x1bz<dictionary id>:<base85 of the zlib stream>",
+    5 characters per 4 bytes. They are decoded into content_compressed and their content emptied.
+    """
+
+    columns = {column['name'] for column in inspect(connection).get_columns('conversations')}
+    if 'content_compressed' not in columns:
+        binary = LargeBinary().compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE conversations ADD COLUMN content_compressed {binary}"))
+    if 'compression_dictionary_id' not in columns:
+        connection.execute(text("ALTER TABLE conversations ADD COLUMN compression_dictionary_id INTEGER"))
+
+    marker = "\x1bz"
+    rows = connection.execute(
+        text("SELECT id, content FROM conversations WHERE substr(content, 1, 2) = :marker"), {"marker": marker}
+    ).all()
+    updates = []
+    for row in rows:
+        dictionary_id, data = row.content[len(marker):].split(":", 1)
+        updates.append({"id": row.id, "data": base64.b85decode(data), "dictionary_id": int(dictionary_id)})
+    if updates:
+        connection.execute(
+            text("UPDATE conversations SET content = '', content_compressed = :data, compression_dictionary_id = :dictionary_id WHERE id = :id")
+            .bindparams(bindparam("data", type_=LargeBinary)),
+            updates
+        )
+
+
+def _create_users_table(connection):
+    """
+    Creates the users table of a new database.
+    """
+
+    Base.metadata.create_all(connection, tables=[User.__table__])
+
+
+def _create_user_sessions_table(connection):
+    """
+    Creates the table of login sessions, used to revoke session tokens.
+    """
+
+    Base.metadata.create_all(connection, tables=[UserSession.__table__])
+
+
+# Migrations of each component as (version, description, function), in order
+MIGRATIONS = {
+    "conversations": [
+        (1, "create conversations and uploaded_files tables", _create_conversation_tables),
+        (2, "add conversations.file_hash", _add_file_hash),
+        (3, "index conversations by (username, timestamp) and (conversation_id, role)", _index_conversations),
+        (4, "store conversations.conversation_id as a native uuid", _uuid_conversation_id),
+        (5, "full-text index of conversations.content", _index_conversation_text),
+        (6, "add compression_dictionaries and conversations.preview, content_length", _add_compression),
+        (7, "backfill conversations.content_length", _backfill_content_length),
+        (8, "store compressed messages in conversations.content_compressed", _store_compressed_content_as_binary),
+    ],
+    "users": [
+        (1, "create users table", _create_users_table),
+        (2, "create user_sessions table", _create_user_sessions_table),
+    ],
+}
+
+# Database URL of each component
+DATABASE_URLS = {
+    "conversations": POSTGRESQL_URL,
+    "users": USERS_DATABASE_URL,
+}
+
+
+def applied_versions(connection, component):
+    """
+    Returns the migration versions already applied to a component.
+    """
+
+    rows = connection.execute(
+        schema_migrations.select().with_only_columns(schema_migrations.c.version).where(schema_migrations.c.component == component)
+    )
+    return {row.version for row in rows}
+
+
+def migrate(component, url=None, dry_run=False):
+    """
+    Applies the pending migrations of a component, each in its own transaction.
+
+    Args:
+        component (str): The component to migrate, a key of MIGRATIONS.
+        url (str, optional): The database URL. Defaults to the URL of the component.
+        dry_run (bool, optional): Only list the pending migrations.
+
+    Returns:
+        list: (version, description) of the migrations applied, or pending if dry_run is set.
+    """
+
+    engine = get_engine(url or DATABASE_URLS[component])
+    migration_metadata.create_all(engine)
+    with engine.connect() as connection:
+        applied = applied_versions(connection, component)
+
+    done = []
+    for version, description, upgrade in MIGRATIONS[component]:
+        if version in applied:
+            continue
+        if not dry_run:
+            with engine.begin() as connection:
+                upgrade(connection)
+                connection.execute(schema_migrations.insert().values(
+                    component=component,
+                    version=version,
+                    description=description,
+                    applied_at=datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+                ))
+        done.append((version, description))
+    return done
@@ -1,5 +1,11 @@
+import importlib
+import sys
+import time
 import streamlit as st
 
+# Seconds taken to import each lazily loaded page, by title, for the lifetime of the process
+page_import_times = {}
+
 
 # Class to generate multiple Streamlit pages using an object oriented approach
 class MultiPage:
@@ -34,10 +40,47 @@ class MultiPage:
 
         Args:
             title (str): The title of the page to be added.
-            func (callable): The function that renders the content of the page.
+            func (callable or str): The function that renders the content of the page, or its
+                import path as "package.module:function". A path is only imported when the page
+                is first selected, which keeps the start of the app fast.
         """
         self.pages.append({"title": title, "function": func})
 
+    def load_page(self, page):
+        """
+        Returns the render function of a page, importing its module on first use.
+
+        The import time of each page module is recorded in `page_import_times` when the
+        module is first imported; modules shared with pages loaded earlier are not counted.
+
+        Args:
+            page (dict): The page, as added with `add_page`.
+
+        Returns:
+            callable: The function that renders the page.
+        """
+        if not isinstance(page['function'], str):
+            return page['function']
+        module_name, function_name = page['function'].split(":")
+        if module_name not in sys.modules:
+            start = time.perf_counter()
+            importlib.import_module(module_name)
+            page_import_times[page['title']] = time.perf_counter() - start
+            print(f"Loaded page {page['title']!r} in {page_import_times[page['title']] * 1000:.0f} ms")
+        return getattr(sys.modules[module_name], function_name)
+
+    def import_report(self):
+        """
+        Lists the import time of each page loaded so far in this process, slowest first.
+
+        Returns:
+            list: One dict per page with its title and import time in milliseconds.
+        """
+        return [
+            {"page": title, "import_ms": round(seconds * 1000)}
+            for title, seconds in sorted(page_import_times.items(), key=lambda item: item[1], reverse=True)
+        ]
+
     def run(self):
         """
         Runs the application, displaying the selected page based on user input.
@@ -47,4 +90,4 @@ class MultiPage:
         """
         st.title(self.app_name)
         page = st.sidebar.radio('Menu', self.pages, format_func=lambda page: page['title'])
-        page['function']()
\ No newline at end of file
+        self.load_page(page)()
@@ -1,236 +1,209 @@
 import streamlit as st
-import requests
+import httpx
 import logging
-from streamlit_extras.streaming_write import write
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
 import time
 from .login import login
+from .db import get_engine, POSTGRESQL_URL
+from .llm_api import query_api, stream_api, compress_response, predefined_prompt
+from .file_store import store_file, load_file_text, describe_file
+from .tokens import count_tokens
+from .context_window import build_context, answer_tokens
+from .data_profiler import profile_text, structure_fingerprint, PROFILE_MIN_CHARS
+from .schema_cache import schema_cache
+from .schema_validation import validate_and_repair, format_errors
+from .message_store import MessageWriter
+from .search import insert_conversations
+from functools import lru_cache
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pytz import timezone
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Get the PostgreSQL URL from the environment variables
-POSTGRESQL_URL = os.getenv('POSTGRESQL_URL')
-
-# Define the database engine using the PostgreSQL URL
-engine = create_engine(POSTGRESQL_URL)
-Base = declarative_base()
-
-# Define the Conversation model
-class Conversation(Base):
-    """
-    Represents a conversation message stored in the database.
-
-    Attributes:
-        id (int): Primary key, autoincremented.
-        role (str): Role of the speaker (e.g., user or assistant).
-        content (str): The message content.
-        model_name (str): Name of the model used to generate the response.
-        token_usage (int): Number of tokens used in the response.
-        elapsed_time (float): Time taken to generate the response.
-        timestamp (datetime): Timestamp of when the message was created.
-        username (str): Username of the user who initiated the conversation.
+@lru_cache(maxsize=1)
+def get_message_writer():
     """
+    Returns the writer that saves each question and its answer in one transaction, optionally
+    in the background. It is created on first use, so importing this page does not touch the database.
 
-    __tablename__ = 'conversations'
-
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    role = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
-    model_name = Column(String, nullable=True)
-    token_usage = Column(Integer, nullable=True)
-    elapsed_time = Column(Float, nullable=True)
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone('UTC')).astimezone(timezone('Europe/Berlin')).replace(microsecond=0))
-    username = Column(String, nullable=False)  
-    conversation_id = Column(String, nullable=False)
-
-# Create the table if it doesn't exist
-Base.metadata.create_all(engine)
+    Returns:
+        MessageWriter: The writer on the shared engine of the conversations database.
+    """
 
-# Create a session factory
-SessionFactory = sessionmaker(bind=engine)
+    return MessageWriter(get_engine(POSTGRESQL_URL), insert_conversations)
 
-def save_message_to_db(role, content, model_name=None, elapsed_time=None, token_usage=None,conversation_id=None):
+def save_exchange_to_db(question, response, model_name=None, elapsed_time=None, token_usage=None, conversation_id=None, file_hash=None):
     """
-    Saves a message to the database.
+    Saves a user question and the model response to the database together.
+
+    Both rows are written in one transaction, or queued to the background writer
+    when DB_WRITE_BEHIND is enabled.
 
     Args:
-        role (str): The role of the speaker (e.g., user or assistant).
-        content (str): The content of the message.
+        question (str): The content of the user message.
+        response (str): The content of the response.
         model_name (str, optional): The name of the model used for the response.
         elapsed_time (float, optional): Time taken to generate the response.
         token_usage (int, optional): Number of tokens used in the response.
+        conversation_id (str, optional): ID shared by the user message and its response.
+        file_hash (str, optional): Content hash of the uploaded file the question refers to.
     """
 
-    session = SessionFactory()
+    # Resolved here because the background writer has no access to the session state
+    username = st.session_state.username
+    timestamp = datetime.now(timezone('UTC')).astimezone(timezone('Europe/Berlin')).replace(microsecond=0)
+    rows = [
+        dict(role="user", content=question, model_name=None, elapsed_time=None, token_usage=None,
+             username=username, conversation_id=conversation_id, file_hash=file_hash, timestamp=timestamp),
+        dict(role="assistant", content=response, model_name=model_name, elapsed_time=elapsed_time, token_usage=token_usage,
+             username=username, conversation_id=conversation_id, file_hash=None, timestamp=timestamp)
+    ]
     try:
-        conversation = Conversation(
-            role=role, 
-            content=content, 
-            model_name=model_name, 
-            elapsed_time=elapsed_time, 
-            token_usage=token_usage,
-            username=st.session_state.username,
-            conversation_id=conversation_id
-        )
-        session.add(conversation)
-        session.commit()
+        get_message_writer().write(rows)
     except Exception as e:
-        session.rollback()
         st.error(f"An error occurred while saving to the database: {e}")
-    finally:
-        session.close()
 
-# Initialize session state for messages and file content if not already present
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-if 'file_content' not in st.session_state:
-    st.session_state.file_content = None
+# Maximum number of models queried at the same time in comparison mode
+COMPARE_MAX_WORKERS = int(os.getenv('COMPARE_MAX_WORKERS', 4))
 
 # Predefined list of colors for alternating boxes
 colors = ["#fc9642", "#5aad78", "#416a96", "#8f894a", "#9e3c72", "#7e5dc2", "#8c1416"]
 
 
-def count_tokens(text):
+@lru_cache(maxsize=16)
+def file_profile(file_hash):
     """
-    Counts the number of tokens in a text based on whitespace.
+    Profiles a stored data file once per process.
 
     Args:
-        text (str): The input text.
+        file_hash (str): The content hash of the stored file.
 
     Returns:
-        int: Number of tokens in the text.
+        str: The compact profile built by `data_profiler.profile_text`, or None if the file has no data table.
     """
 
-    """Simple function to count tokens based on whitespace."""
-    return len(text.split())
+    try:
+        return profile_text(load_file_text(file_hash))
+    except Exception as e:
+        print(f"Could not profile file {file_hash}: {e}")
+        return None
 
-def compress_response(content, model, target_token_count):
+@lru_cache(maxsize=64)
+def file_fingerprint(file_hash):
     """
-    Compresses a response to fit within the target token count while keeping coherence.
+    Computes the structural fingerprint of a stored data file once per process.
 
     Args:
-        content (str): The original response content.
-        model (str): The model used for generating responses.
-        target_token_count (int): The desired number of tokens.
+        file_hash (str): The content hash of the stored file.
 
     Returns:
-        str: The compressed response.
+        str: The fingerprint built by `data_profiler.structure_fingerprint`, or None if the file has no data table.
     """
 
-    """Compresses the response to fit within the target token count while trying to maintain coherence."""
-    def split_content(content, chunk_size):
-        """Splits content into chunks of specified size."""
-        return [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
-
-    chunk_size = min(target_token_count * 2, len(content.split()))
-    chunks = split_content(content, chunk_size)
-    compressed_content = ""
-    
-    for chunk in chunks:
-        summary_prompt = f"Summarize the following text to approximately {target_token_count} tokens or less, making sure to keep the response coherent and complete:\n\n{chunk}"
-        response = query_api(messages=[{"role": "user", "content": summary_prompt}], model=model, max_tokens=target_token_count)
-        
-        if 'error' in response:
-            return content  # Return the current content if there's an error
-        
-        compressed_content += response['content'] + " "
-        if count_tokens(compressed_content) >= target_token_count:
-            break
-    
-    # Ensure the response ends with a coherent conclusion if necessary
-    if count_tokens(compressed_content) < target_token_count:
-        final_summary_prompt = f"Please provide a final, coherent summary of the following text to complete the response:\n\n{compressed_content}"
-        final_summary = query_api(messages=[{"role": "user", "content": final_summary_prompt}], model=model, max_tokens=target_token_count - count_tokens(compressed_content))
-        compressed_content += final_summary.get('content', '')
-
-    return compressed_content.strip()
-
-def query_api(messages, model, temperature=0.7, max_tokens=600, top_k=40, top_p=0.9):
+    try:
+        return structure_fingerprint(load_file_text(file_hash))
+    except Exception as e:
+        print(f"Could not fingerprint file {file_hash}: {e}")
+        return None
+
+def file_prompt(file_hash, use_profile=False):
     """
-    Queries an external API to get a response based on provided messages and model.
+    Builds the part of a prompt that presents an uploaded file to the model.
+
+    Large tabular files are replaced by their compact profile when `use_profile` is set.
 
     Args:
-        messages (list): List of message dictionaries.
-        model (str): The model to be used.
-        temperature (float, optional): The randomness in the response.
-        max_tokens (int, optional): Maximum number of tokens in the response.
-        top_k (int, optional): Limits the sampling pool to the top-k tokens.
-        top_p (float, optional): Nucleus sampling for choosing from the top tokens.
+        file_hash (str): The content hash of the stored file.
+        use_profile (bool, optional): Whether large data files may be sent as a profile.
 
     Returns:
-        dict: API response data, including content, token usage, and errors (if any).
+        str: "File profile: ..." or "File content: ...".
     """
 
-    url = os.getenv('API_URL')
-    headers = {"Authorization": f"Bearer {'API_KEY'}"}
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-        "top_k": top_k,
-        "top_p": top_p
-    }
+    file_text = load_file_text(file_hash)
+    if file_text is None:
+        return "File content: (the uploaded file is no longer available)"
+    if use_profile and len(file_text) >= PROFILE_MIN_CHARS:
+        profile = file_profile(file_hash)
+        if profile:
+            return f"File profile: {profile}"
+    return f"File content: {file_text}"
 
-    start_time = time.time()
-    response = requests.post(url, json=payload, headers=headers)
-    elapsed_time = time.time() - start_time
-
-    response_json = response.json()
-    
-    if response.status_code == 200:
-        if 'choices' in response_json and len(response_json['choices']) > 0:
-            choice = response_json['choices'][0]
-            if 'message' in choice and 'content' in choice['message']:
-                response_content = choice['message']['content']
-                response_tokens = count_tokens(response_content)
-                
-                if response_tokens > max_tokens:
-                    response_content = compress_response(response_content, model, max_tokens)
-                
-                prompt_tokens = count_tokens('\n'.join([msg['content'] for msg in messages]))
-                total_tokens = prompt_tokens + response_tokens
-                
-                return {
-                    "response": response_json,
-                    "elapsed_time": elapsed_time,
-                    "prompt_tokens": prompt_tokens,
-                    "response_tokens": response_tokens,
-                    "total_tokens": total_tokens,
-                    "content": response_content
-                }
-            else:
-                return {
-                    "error": "API response missing 'message' or 'content' key",
-                    "elapsed_time": elapsed_time,
-                    "prompt_tokens": 0,
-                    "response_tokens": 0,
-                    "total_tokens": 0
-                }
-        else:
-            return {
-                "error": "API response missing 'choices' key or empty 'choices'",
-                "elapsed_time": elapsed_time,
-                "prompt_tokens": 0,
-                "response_tokens": 0,
-                "total_tokens": 0
-            }
+def expand_message(message, use_profile=False):
+    """
+    Rebuilds the full text of a message, inlining the uploaded file it refers to.
+
+    Messages about an uploaded file only keep a reference (`file_hash`) to the stored
+    file, so the file body is loaded only when a message is actually sent to a model.
+
+    Args:
+        message (dict): A message with 'role', 'content' and optionally 'file_hash'.
+        use_profile (bool, optional): Whether large data files may be sent as a profile.
+
+    Returns:
+        dict: The message with only 'role' and 'content', ready to be sent to the API.
+    """
+
+    if message.get('file_hash'):
+        return {"role": message['role'], "content": f"{file_prompt(message['file_hash'], use_profile)}\n\n{message['content']}"}
+    return {"role": message['role'], "content": message['content']}
+
+def cache_status(result):
+    """
+    Describes whether a query result was served from the response cache.
+
+    Args:
+        result (dict): The result returned by `query_api` or filled by `stream_api`.
+
+    Returns:
+        str: A short label such as "cache hit (memory)" or "cache miss".
+    """
+
+    if result.get('cache') in ("memory", "database"):
+        return f"cache hit ({result['cache']})"
+    if result.get('cache') == "schema":
+        return "schema cache hit"
+    return "cache miss"
+
+def check_schema(answer, model, temperature, max_tokens, top_k, top_p, use_cache):
+    """
+    Validates the metadata schema of an answer and repairs it with short follow-up prompts if needed.
+
+    Args:
+        answer (str): The streamed model answer.
+        model (str): The model used to generate the answer.
+        temperature (float): Controls randomness of the output.
+        max_tokens (int): Maximum number of tokens in each repair answer.
+        top_k (int): Number of top tokens to consider.
+        top_p (float): Cumulative probability for token sampling.
+        use_cache (bool): Whether repair answers may be served from the response cache.
+
+    Returns:
+        dict: The result of `schema_validation.validate_and_repair`.
+    """
+
+    def complete(prompt):
+        response = query_api(messages=[{"role": "user", "content": prompt}], model=model, temperature=temperature, max_tokens=max_tokens,
+                             top_k=top_k, top_p=top_p, use_cache=use_cache, compress=False)
+        if 'error' in response:
+            return None
+        return response['content']
+
+    with st.spinner("Validating the generated schema..."):
+        validation = validate_and_repair(answer, complete)
+
+    if validation['valid'] and validation['repairs']:
+        st.success(f"✅ The schema was repaired after {validation['repairs']} attempt(s) and is now a valid JSON Schema (Draft 2020-12):")
+        st.json(validation['schema'])
+    elif validation['valid']:
+        st.success("✅ The schema is a valid JSON Schema (Draft 2020-12).")
     else:
-        return {
-            "error": f"Failed with status code {response.status_code}",
-            "elapsed_time": elapsed_time,
-            "prompt_tokens": 0,
-            "response_tokens": 0,
-            "total_tokens": 0
-        }
+        st.warning(f"⚠️ The schema is not a valid JSON Schema (Draft 2020-12):\n\n{format_errors(validation['errors'])}")
+    return validation
 
 def display_response(response_content):
     """
@@ -243,44 +216,83 @@ def display_response(response_content):
     st.subheader("Response from the Model:")
     st.write(response_content)
 
-def compare_models(messages, selected_model):
+def compare_models(messages, selected_models, temperature=0.7, max_tokens=600, top_k=40, top_p=0.9, use_cache=True):
     """
     Fetches and compares responses from different models.
 
+    The same messages are sent to every model concurrently, and each model's column
+    is rendered as soon as its response arrives, so the total wait is that of the
+    slowest model rather than the sum of all of them.
+
     Args:
-        messages (list): List of user input messages.
-        selected_model (str): The model to be compared.
+        messages (list): List of user input messages, optionally referencing an uploaded file by 'file_hash'.
+        selected_models (list or str): The models to be compared.
+        temperature (float, optional): The randomness in the response.
+        max_tokens (int, optional): Maximum number of tokens in the response.
+        top_k (int, optional): Limits the sampling pool to the top-k tokens.
+        top_p (float, optional): Nucleus sampling for choosing from the top tokens.
+        use_cache (bool, optional): Whether to serve and store the responses in the response cache.
+
+    Returns:
+        dict: The query results keyed by model name.
     """
 
+    if isinstance(selected_models, str):
+        selected_models = [selected_models]
+
     results = {}
 
     st.write("### Model Comparison Results")
-    with st.spinner("Fetching responses from models..."):
-        result = query_api(messages=messages, model=selected_model)
-        results[selected_model] = result
-
-    cols = st.columns(1)
-    for idx, model in enumerate([selected_model]):
+    cols = st.columns(len(selected_models))
+    placeholders = {}
+    for idx, model in enumerate(selected_models):
         with cols[idx]:
             st.write(f"**Model: {model}**")
-            if 'error' in results[model]:
-                st.error(results[model]['error'])
-            else:
-                response_content = results[model]['content']
-                elapsed_time = results[model]['elapsed_time']
-                response_tokens = results[model]['response_tokens']
-                # Save response to the database with model details
-                save_message_to_db(
-                    role="assistant", 
-                    content=response_content, 
-                    model_name=model, 
-                    elapsed_time=elapsed_time, 
-                    token_usage=response_tokens
-                )
-                st.write(f"⏱ **Time taken:** {elapsed_time:.2f} seconds")
-                st.write(f"🔢 **Total tokens used (response only):** {response_tokens}")
-                st.subheader("Response from the Model:")
-                write(response_content)
+            placeholders[model] = st.empty()
+            placeholders[model].info("Fetching response...")
+
+    api_messages = [expand_message(msg, use_profile=st.session_state.get('use_file_profile', True)) for msg in messages]
+    with ThreadPoolExecutor(max_workers=min(len(selected_models), COMPARE_MAX_WORKERS)) as executor:
+        futures = {
+            executor.submit(query_api, messages=api_messages, model=model, temperature=temperature, max_tokens=max_tokens, top_k=top_k, top_p=top_p, use_cache=use_cache): model
+            for model in selected_models
+        }
+        for future in as_completed(futures):
+            model = futures[future]
+            try:
+                results[model] = future.result()
+            except httpx.TransportError as e:
+                print(f"Connection error: {e}")
+                results[model] = {"error": "❌ Unable to connect to the model. Please contact admin: amirhossein.bayani@gmail.com"}
+            except Exception as e:
+                # Any other failure (e.g. a non-JSON error page) only affects this model's column
+                print(f"Unexpected error from {model}: {e}")
+                results[model] = {"error": f"❌ An unexpected error occurred ({type(e).__name__}: {e}). Please contact admin: amirhossein.bayani@gmail.com"}
+
+            with placeholders[model].container():
+                if 'error' in results[model]:
+                    st.error(results[model]['error'])
+                else:
+                    response_content = results[model]['content']
+                    elapsed_time = results[model]['elapsed_time']
+                    response_tokens = results[model]['response_tokens']
+                    # Save the prompt and this model's response as their own conversation
+                    conversation_id = str(uuid.uuid4())
+                    save_exchange_to_db(
+                        question=messages[-1]['content'],
+                        response=response_content,
+                        model_name=model,
+                        elapsed_time=elapsed_time,
+                        token_usage=response_tokens,
+                        conversation_id=conversation_id,
+                        file_hash=messages[-1].get('file_hash')
+                    )
+                    st.write(f"⏱ **Time taken:** {elapsed_time:.2f} seconds ({cache_status(results[model])})")
+                    st.write(f"🔢 **Total tokens used (response only):** {response_tokens}")
+                    st.subheader("Response from the Model:")
+                    st.write(response_content)
+
+    return results
 
 def display_conversation_history():
     """
@@ -292,9 +304,10 @@ def display_conversation_history():
         # Alternate colors based on the index
         color = colors[idx % len(colors)]
         role = "User" if msg['role'] == "user" else "Assistant"
+        attachment = f"{describe_file(msg['file_hash'])}<br>" if msg.get('file_hash') else ""
         st.markdown(f"""
             <div style="background-color: {color}; padding: 10px; border-radius: 10px; margin-bottom: 10px;">
-                <strong>{role}:</strong> {msg['content']}
+                <strong>{role}:</strong> {attachment}{msg['content']}
             </div>
             """, unsafe_allow_html=True)
 
@@ -307,7 +320,8 @@ def download_conversation_history():
     history_text = ""
     for msg in st.session_state.messages:
         role = "User" if msg['role'] == "user" else "Assistant"
-        history_text += f"{role}: {msg['content']}\n\n"
+        attachment = f"[{describe_file(msg['file_hash'])}]\n" if msg.get('file_hash') else ""
+        history_text += f"{role}: {attachment}{msg['content']}\n\n"
 
     # Provide a download button
     st.download_button(
@@ -318,12 +332,6 @@ def download_conversation_history():
     )
 
 
-predefined_prompt = (
-    "Create a non-populated metadata schema for a tensile test using the uploaded raw data. "
-    "The metadata schema should follow JSON schema standards, as documented in https://json-schema.org/"
-)
-
-
 def LLM_models():
     """
     Main function for the Streamlit app, handling user input, model selection, 
@@ -332,8 +340,10 @@ def LLM_models():
 
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'file_content' not in st.session_state:
-        st.session_state.file_content = None
+    if 'file_hash' not in st.session_state:
+        st.session_state.file_hash = None
+    if 'context_summaries' not in st.session_state:
+        st.session_state.context_summaries = {}
     if 'warning_shown' not in st.session_state:
         st.session_state.warning_shown = False
 
@@ -348,6 +358,7 @@ def LLM_models():
     top_k = st.sidebar.slider("Top-k", 1, 100, 40)
     # top_k = st.sidebar.number_input("Top-k", min_value=1, max_value=100, value=40)
     top_p = st.sidebar.slider("Top-p", 0.0, 1.0, 0.9)
+    use_cache = st.sidebar.checkbox("Use response cache", value=True, help="Serve identical requests (same model, messages and parameters) from the cache instead of the model.")
     # List of available models
     # models = ['mixtral:latest','nemotron:latest', 'mistral-large:latest', 'llama3.1:latest', 'llama3.1:70b', 'llama3.1:70b-instruct-q8_0']
     models = ['mixtral:latest','nemotron:latest', 'mistral-large:latest', 'llama3.1:latest']
@@ -380,20 +391,28 @@ def LLM_models():
 
         if uploaded_file is not None:
             try:
-                st.session_state.file_content = uploaded_file.read().decode("utf-8")
+                file_bytes = uploaded_file.getvalue()
+                # Store each distinct upload once and reference it from the messages; the file
+                # only counts as uploaded once it is stored
+                if st.session_state.get('uploaded_file_id') != uploaded_file.file_id:
+                    st.session_state.file_hash = None
+                    file_bytes.decode("utf-8")  # Reject files that are not text before storing them
+                    st.session_state.file_hash = store_file(file_bytes, uploaded_file.name, uploaded_file.type)
+                    st.session_state.uploaded_file_id = uploaded_file.file_id
                 st.success("File uploaded successfully. You can now ask questions about this file.")
             except Exception as e:
                 st.error(f"An error occurred while reading the file: {e}")
 
+        use_file_profile = st.checkbox(
+            "Send a compact profile of large data files instead of the raw content",
+            value=True,
+            key="use_file_profile",
+            help="Tabular .dat/.txt files are summarized into their header, column statistics and a few sample rows."
+        )
+
         # Add a checkbox for using the predefined prompt
         use_predefined_prompt = st.checkbox("Use predefined prompt for metadata schema", value=False)
 
-        # Predefined prompt text
-        predefined_prompt = (
-            "Create a non-populated metadata schema for a tensile test using the uploaded row data. "
-            "The metadata schema should follow JSON schema standards, as documented in https://json-schema.org/"
-        )
-
         # Populate the text area based on the checkbox selection
         user_question_file = st.text_area(
             "Ask a question about the uploaded file:", 
@@ -403,8 +422,16 @@ def LLM_models():
 
         language = st.selectbox("Select the language for the answer:", languages, index=languages.index(default_language), key="language_file")
 
+        force_regeneration = False
+        if use_predefined_prompt:
+            force_regeneration = st.checkbox(
+                "Force schema regeneration",
+                value=False,
+                help="Files from the same instrument format reuse the schema generated before. Tick this to ask the model again."
+            )
+
         if st.button("Submit Question about Uploaded File"):
-            if st.session_state.file_content is None:
+            if st.session_state.file_hash is None:
                 st.warning("Please upload a file before asking a question.")
             elif user_question_file.strip() == "":
                 st.warning("Please enter a question.")
@@ -414,11 +441,39 @@ def LLM_models():
                     conversation_id = str(uuid.uuid4())
                     
                     # Append user question to session state
-                    st.session_state.messages.append({"role": "user", "content": f"File content: {st.session_state.file_content}\n\n{user_question_file}\n\nPlease answer in {language}."})
+                    st.session_state.messages.append({"role": "user", "content": f"{user_question_file}\n\nPlease answer in {language}.", "file_hash": st.session_state.file_hash})
                     
                     # Prepare API messages and query the model
-                    api_messages = [{"role": "user", "content": f"File content: {st.session_state.file_content}\n\nQuestion: {user_question_file}\n\nPlease answer in {language}."}]
-                    result = query_api(messages=api_messages, model=selected_model, temperature=temperature, max_tokens=max_tokens, top_k=top_k, top_p=top_p)
+                    api_messages = [expand_message({"role": "user", "content": f"Question: {user_question_file}\n\nPlease answer in {language}.", "file_hash": st.session_state.file_hash}, use_profile=use_file_profile)]
+                    result = {}
+                    st.subheader("Response from the Model:")
+
+                    # Files sharing the layout of an earlier file reuse its schema
+                    fingerprint = None
+                    schema_requested = use_predefined_prompt and user_question_file.strip() == predefined_prompt.strip()
+                    if schema_requested:
+                        fingerprint = file_fingerprint(st.session_state.file_hash)
+                    start_time = time.time()
+                    cached_schema = None if force_regeneration else schema_cache.get(fingerprint, selected_model, language)
+
+                    if cached_schema is not None:
+                        st.write(cached_schema)
+                        elapsed_time = time.time() - start_time
+                        result.update({
+                            "content": cached_schema,
+                            "elapsed_time": elapsed_time,
+                            "time_to_first_token": elapsed_time,
+                            "response_tokens": count_tokens(cached_schema, selected_model),
+                            "cache": "schema"
+                        })
+                    else:
+                        st.write_stream(stream_api(messages=api_messages, model=selected_model, temperature=temperature, max_tokens=max_tokens, top_k=top_k, top_p=top_p, result=result, use_cache=use_cache and not force_regeneration))
+                        if 'error' not in result and schema_requested:
+                            validation = check_schema(result['content'], selected_model, temperature, max_tokens, top_k, top_p, use_cache)
+                            result['content'] = validation['content']
+                            # Only valid schemas are reused for other files
+                            if validation['valid']:
+                                schema_cache.set(fingerprint, selected_model, language, result['content'])
 
                     if 'error' in result:
                         st.error(result['error'])
@@ -428,21 +483,23 @@ def LLM_models():
                         response_tokens = result['response_tokens']
                         
                         # Save both user message and response to the database after success
-                        save_message_to_db("user", f"File content: {st.session_state.file_content}\n\n{user_question_file}\n\nPlease answer in {language}.", conversation_id=conversation_id)
+                        save_exchange_to_db(f"{user_question_file}\n\nPlease answer in {language}.", response, model_name=selected_model, elapsed_time=elapsed_time,
+                                            token_usage=response_tokens, conversation_id=conversation_id, file_hash=st.session_state.file_hash)
                         st.session_state.messages.append({"role": "assistant", "content": response})
-                        save_message_to_db("assistant", response, model_name=selected_model, elapsed_time=elapsed_time, token_usage=response_tokens, conversation_id=conversation_id)
                         
                         # Display response details
-                        st.write(f"⏱ **Time taken:** {elapsed_time:.2f} seconds")
+                        st.write(f"⏱ **Time taken:** {elapsed_time:.2f} seconds ({cache_status(result)})")
+                        if result['time_to_first_token'] is not None:
+                            st.write(f"⚡ **Time to first token:** {result['time_to_first_token']:.2f} seconds")
                         st.write(f"🔢 **Total tokens used (response only):** {response_tokens}")
                         display_conversation_history()
 
-                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                except httpx.TransportError as e:
                     st.markdown("❌ Unable to connect to the model. Please contact admin: amirhossein.bayani@gmail.com", unsafe_allow_html=True)
                     print(f"Connection error: {e}")
 
                 except Exception as e:
-                    st.error("❌ An unexpected error occurred. Please contact admin: amirhossein.bayani@gmail.com")
+                    st.error(f"❌ An unexpected error occurred ({type(e).__name__}: {e}). Please contact admin: amirhossein.bayani@gmail.com")
                     print(f"Unexpected error: {e}")
 
 
@@ -458,9 +515,23 @@ def LLM_models():
                     # Append user question to session state but don't save to DB yet
                     st.session_state.messages.append({"role": "user", "content": f"{direct_question}\n\nPlease answer in {language_direct}."})
                     
+                    # Leave room for the question in the model's context window
+                    answer_max_tokens = answer_tokens(selected_model, max_tokens)
+                    if answer_max_tokens < max_tokens:
+                        st.warning(f"Max Tokens is limited to {answer_max_tokens} so that the question fits the context window of {selected_model}.")
+
                     # Prepare API messages and query the model
-                    api_messages = st.session_state.messages
-                    result = query_api(messages=api_messages, model=selected_model, temperature=temperature, max_tokens=max_tokens, top_k=top_k, top_p=top_p)
+                    api_messages = build_context(
+                        st.session_state.messages,
+                        selected_model,
+                        answer_max_tokens,
+                        expand=lambda msg: expand_message(msg, use_profile=st.session_state.get('use_file_profile', True)),
+                        summarize=lambda text, summary_tokens: compress_response(text, selected_model, summary_tokens),
+                        cache=st.session_state.context_summaries
+                    )
+                    result = {}
+                    st.subheader("Response from the Model:")
+                    st.write_stream(stream_api(messages=api_messages, model=selected_model, temperature=temperature, max_tokens=answer_max_tokens, top_k=top_k, top_p=top_p, result=result, use_cache=use_cache))
 
                     if 'error' in result:
                         st.error(result['error'])
@@ -471,23 +542,45 @@ def LLM_models():
                         response_tokens = result['response_tokens']
                         
                         # Save both user message and response to the database after success
-                        save_message_to_db("user", f"{direct_question}\n\nPlease answer in {language_direct}.", conversation_id=conversation_id)
+                        save_exchange_to_db(f"{direct_question}\n\nPlease answer in {language_direct}.", response, model_name=selected_model, elapsed_time=elapsed_time,
+                                            token_usage=response_tokens, conversation_id=conversation_id)
                         st.session_state.messages.append({"role": "assistant", "content": response})
-                        save_message_to_db("assistant", response, model_name=selected_model, elapsed_time=elapsed_time, token_usage=response_tokens, conversation_id=conversation_id)
                         
                         # Display response details
-                        st.write(f"⏱ **Time taken:** {elapsed_time:.2f} seconds")
+                        st.write(f"⏱ **Time taken:** {elapsed_time:.2f} seconds ({cache_status(result)})")
+                        if result['time_to_first_token'] is not None:
+                            st.write(f"⚡ **Time to first token:** {result['time_to_first_token']:.2f} seconds")
                         st.write(f"🔢 **Total tokens used (response only):** {response_tokens}")
                         display_conversation_history()
 
-                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                except httpx.TransportError as e:
                     st.markdown("❌ Unable to connect to the model. Please contact admin: amirhossein.bayani@gmail.com", unsafe_allow_html=True)
                     print(f"Connection error: {e}")
                     
                 except Exception as e:
-                    st.error("❌ An unexpected error occurred. Please contact admin: amirhossein.bayani@gmail.com")
+                    st.error(f"❌ An unexpected error occurred ({type(e).__name__}: {e}). Please contact admin: amirhossein.bayani@gmail.com")
                     print(f"Unexpected error: {e}")
 
 
+    with st.expander("⚖️ Compare Models"):
+        compare_question = st.text_area("Type the question to send to every model:", key="compare_question", help="The same question is sent to all selected models at the same time.")
+        compare_selected = st.multiselect("Select the models to compare:", models, default=models)
+        include_file = st.checkbox("Include the uploaded file in the question", value=False)
+        language_compare = st.selectbox("Select the language for the answer:", languages, index=languages.index(default_language), key="language_compare")
+        if st.button("Compare Models"):
+            if compare_question.strip() == "":
+                st.warning("Please enter a question.")
+            elif not compare_selected:
+                st.warning("Please select at least one model.")
+            elif include_file and st.session_state.file_hash is None:
+                st.warning("Please upload a file before asking a question.")
+            else:
+                if include_file:
+                    message = {"role": "user", "content": f"Question: {compare_question}\n\nPlease answer in {language_compare}.", "file_hash": st.session_state.file_hash}
+                else:
+                    message = {"role": "user", "content": f"{compare_question}\n\nPlease answer in {language_compare}."}
+                compare_models([message], compare_selected, temperature=temperature, max_tokens=max_tokens, top_k=top_k, top_p=top_p, use_cache=use_cache)
+
+
     download_conversation_history()
 
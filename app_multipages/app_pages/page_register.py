@@ -1,48 +1,16 @@
 import streamlit as st
 # import hashlib  # For hashing passwords
-from argon2 import PasswordHasher
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
-import os
 from email.utils import parseaddr
+from sqlalchemy import select, exists
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from .db import lazy_sessionmaker, User, USERS_DATABASE_URL
+from .auth import hash_password, AuthBusyError
 
 load_dotenv()
 
-# Define the database URL
-DATABASE_URL = os.getenv('POSTGRESQL_Pass_URL') 
-
-# Create a new SQLAlchemy engine (No need for connect_args in PostgreSQL)
-engine = create_engine(DATABASE_URL)
-
-# Create a base class for the models
-Base = declarative_base()
-
-# Define the User model
-class User(Base):
-    """
-    Represents the user model for storing user account information in the database.
-
-    Attributes:
-    - id: An integer primary key that uniquely identifies each user.
-    - username: A unique string representing the username of the user.
-    - password: A string to store the hashed password of the user.
-    - email: A unique string representing the email address of the user.
-    """
-
-    __tablename__ = 'users'
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    username = Column(String, unique=True, nullable=False)
-    password = Column(String, nullable=False)
-    email = Column(String, unique=True, nullable=False)
-
-# Create the users table
-Base.metadata.create_all(engine)
-
-# Create a new session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = lazy_sessionmaker(USERS_DATABASE_URL)
 
 # Dependency for getting a new session
 def get_db():
@@ -61,45 +29,77 @@ def get_db():
     finally:
         db.close()
 
+def find_conflicts(db, username, email):
+    """
+    Checks in one query which of the username and email are already registered.
+
+    Args:
+    - db: The database session.
+    - username: The requested username.
+    - email: The requested email address.
+
+    Returns:
+    - A list with "username" and/or "email" for the fields already taken, empty if both are free.
+    """
+
+    taken = db.execute(select(
+        exists().where(User.username == username).label("username"),
+        exists().where(User.email == email).label("email")
+    )).one()
+    return [field for field in ("username", "email") if taken._mapping[field]]
+
 def register_user(username, password, email):
     """
     Registers a new user in the database by hashing the password and ensuring the uniqueness
     of the username and email.
 
+    A cheap existence check runs first, so duplicate attempts do not cost an Argon2 hash. The
+    account is then created with a single INSERT ... ON CONFLICT DO NOTHING RETURNING; the unique
+    constraints on username and email decide races between concurrent registrations.
+
     Args:
     - username: The username provided by the user.
     - password: The plaintext password provided by the user.
     - email: The email address provided by the user.
 
     Returns:
-    - True if the registration is successful, meaning the username and email are unique.
-    - False if the username or email already exists in the database.
-    """
+    - An empty list if the registration is successful.
+    - Otherwise the fields that are already registered: "username" and/or "email".
 
-    # Initialize PasswordHasher for Argon2id
-    ph = PasswordHasher()
-
-    # Hash the password
-    hashed_password = ph.hash(password)
+    Raises:
+    - AuthBusyError: If too many passwords are being hashed at the same time.
+    """
 
-    # Hash the password
-    # hashed_password = hashlib.sha256(password.encode()).hexdigest()
-    
     # Get a session
     db = next(get_db())
-    
-    # Check if username or email already exists
-    user_exists = db.query(User).filter((User.username == username) | (User.email == email)).first()
-    if user_exists:
-        return False  # Username or email already exists
-
-    # Create a new user
-    new_user = User(username=username, password=hashed_password, email=email)
-    
-    # Add the new user to the session and commit
-    db.add(new_user)
-    db.commit()
-    return True
+    try:
+        conflicts = find_conflicts(db, username, email)
+        if conflicts:
+            return conflicts
+
+        # Hash the password with Argon2id on the shared auth pool
+        hashed_password = hash_password(password)
+
+        values = dict(username=username, password=hashed_password, email=email)
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            created = db.execute(insert(User).values(**values).on_conflict_do_nothing().returning(User.id)).first() is not None
+        else:
+            try:
+                db.execute(User.__table__.insert().values(**values))
+                created = True
+            except IntegrityError:
+                db.rollback()
+                created = False
+        db.commit()
+
+        if not created:
+            # Another registration took the username or email since the check
+            return find_conflicts(db, username, email) or ["username"]
+        return []
+    finally:
+        db.close()
 
 def is_valid_email(email):
     """
@@ -153,9 +153,16 @@ def registration_page():
         elif not is_valid_email(email):
             st.error('Please enter a valid email address.')
         else:
-            if register_user(username, password, email):
-                st.success('Account created successfully!')
-                st.success('Please go to LLM page to continue.')
+            try:
+                conflicts = register_user(username, password, email)
+            except AuthBusyError:
+                st.error('The server is busy. Please try again in a moment.')
             else:
-                st.error('Username or email already exists.')
+                if not conflicts:
+                    st.success('Account created successfully!')
+                    st.success('Please go to LLM page to continue.')
+                if "username" in conflicts:
+                    st.error('This username is already taken.')
+                if "email" in conflicts:
+                    st.error('An account with this email address already exists.')
 
@@ -1,5 +1,4 @@
 import streamlit as st
-import matplotlib.pyplot as plt
 import time
 
 # Function to check if the warning message has been shown
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, select
+from dotenv import load_dotenv
+from .db import lazy_sessionmaker, CachedResponse
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Size limit (in bytes) of the in-process tier and lifetime (in seconds) of cached responses
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 24 * 3600))
+
+# Optional database shared by all Streamlit processes, and the number of rows it may hold
+RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL')
+RESPONSE_CACHE_MAX_ROWS = int(os.getenv('RESPONSE_CACHE_MAX_ROWS', 10000))
+
+# Keys of a query result that are stored in the cache
+CACHED_FIELDS = ("content", "prompt_tokens", "response_tokens", "total_tokens", "elapsed_time")
+
+
+def make_cache_key(model, messages, temperature, max_tokens, top_k, top_p):
+    """
+    Builds the canonical cache key of an LLM request.
+
+    Args:
+        model (str): The model to be used.
+        messages (list): List of message dictionaries.
+        temperature (float): The randomness in the response.
+        max_tokens (int): Maximum number of tokens in the response.
+        top_k (int): Limits the sampling pool to the top-k tokens.
+        top_p (float): Nucleus sampling for choosing from the top tokens.
+
+    Returns:
+        str: The SHA-256 hex digest of the canonical request.
+    """
+
+    canonical = json.dumps(
+        {
+            "model": model,
+            "messages": [{"role": msg['role'], "content": msg['content']} for msg in messages],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_k": top_k,
+            "top_p": top_p
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """
+    A thread-safe in-process LRU cache bounded by the total size of its values.
+
+    Attributes:
+        max_bytes (int): The maximum total size of the stored values.
+        ttl (int): Lifetime of an entry in seconds.
+    """
+
+    def __init__(self, max_bytes, ttl) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None if it is missing or expired.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self._size -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        """
+        Stores `value` under `key`, evicting the least recently used entries to stay within `max_bytes`.
+        """
+
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+
+class ResponseCache:
+    """
+    Two-tier cache of LLM responses: an in-process LRU and an optional database table.
+
+    Attributes:
+        memory (LRUCache): The in-process tier.
+        url (str): Database URL of the persistent tier, or None to disable it.
+    """
+
+    # Expired and excess rows are pruned from the persistent tier every this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, url=None, max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL, max_rows=RESPONSE_CACHE_MAX_ROWS) -> None:
+        self.memory = LRUCache(max_bytes, ttl)
+        self.url = url
+        self.ttl = ttl
+        self.max_rows = max_rows
+        # Creates the table of the persistent tier on first use
+        self._sessions = lazy_sessionmaker(url, CachedResponse)
+        self._writes = 0
+
+    def get(self, key):
+        """
+        Looks up a cached result.
+
+        Args:
+            key (str): The cache key built by `make_cache_key`.
+
+        Returns:
+            tuple: (result, tier) where tier is "memory" or "database", or (None, None) on a miss.
+        """
+
+        value = self.memory.get(key)
+        if value is not None:
+            return json.loads(value), "memory"
+
+        if not self.url:
+            return None, None
+
+        session = self._sessions()
+        try:
+            row = session.get(CachedResponse, key)
+            if row is None or row.expires_at < datetime.now(timezone.utc).replace(tzinfo=None):
+                return None, None
+            self.memory.set(key, row.value, len(row.value.encode('utf-8')))
+            return json.loads(row.value), "database"
+        except Exception as e:
+            session.rollback()
+            print(f"Response cache lookup failed: {e}")
+            return None, None
+        finally:
+            session.close()
+
+    def set(self, key, result):
+        """
+        Stores a successful query result in both tiers.
+
+        Args:
+            key (str): The cache key built by `make_cache_key`.
+            result (dict): The result returned by `query_api`.
+        """
+
+        value = json.dumps({field: result[field] for field in CACHED_FIELDS if field in result})
+        self.memory.set(key, value, len(value.encode('utf-8')))
+
+        if not self.url:
+            return
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        session = self._sessions()
+        try:
+            session.merge(CachedResponse(key=key, value=value, created_at=now, expires_at=now + timedelta(seconds=self.ttl)))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(session, now)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Response cache write failed: {e}")
+        finally:
+            session.close()
+
+    def _prune(self, session, now):
+        """
+        Deletes expired rows and the oldest rows beyond `max_rows` from the persistent tier.
+        """
+
+        session.execute(delete(CachedResponse).where(CachedResponse.expires_at < now))
+        cutoff = session.execute(
+            select(CachedResponse.created_at).order_by(CachedResponse.created_at.desc()).offset(self.max_rows).limit(1)
+        ).scalar()
+        if cutoff is not None:
+            session.execute(delete(CachedResponse).where(CachedResponse.created_at <= cutoff))
+
+
+# Process-wide cache shared by every Streamlit session
+response_cache = ResponseCache(url=RESPONSE_CACHE_URL)
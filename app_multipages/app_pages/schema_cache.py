@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timezone
+from sqlalchemy import update
+from dotenv import load_dotenv
+from .db import lazy_sessionmaker, CachedSchema
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Database holding the generated schemas; defaults to the conversations database
+SCHEMA_CACHE_URL = os.getenv('SCHEMA_CACHE_URL') or os.getenv('POSTGRESQL_URL')
+
+
+class SchemaCache:
+    """
+    Persistent store of generated metadata schemas, keyed by file format fingerprint.
+
+    Attributes:
+        url (str): Database URL of the store, or None to disable it.
+    """
+
+    def __init__(self, url) -> None:
+        self.url = url
+        # Creates the table of the store on first use
+        self._sessions = lazy_sessionmaker(url, CachedSchema)
+
+    def get(self, fingerprint, model_name, language):
+        """
+        Looks up the schema generated for a file format.
+
+        Args:
+            fingerprint (str): The structural fingerprint of the file.
+            model_name (str): The model that should have generated the schema.
+            language (str): The language of the answer.
+
+        Returns:
+            str: The cached answer, or None if there is none.
+        """
+
+        if not self.url or not fingerprint:
+            return None
+
+        session = self._sessions()
+        try:
+            row = session.get(CachedSchema, (fingerprint, model_name, language))
+            if row is None:
+                return None
+            schema = row.schema
+            session.execute(
+                update(CachedSchema)
+                .where(CachedSchema.fingerprint == fingerprint, CachedSchema.model_name == model_name, CachedSchema.language == language)
+                .values(hits=CachedSchema.hits + 1)
+            )
+            session.commit()
+            return schema
+        except Exception as e:
+            session.rollback()
+            print(f"Schema cache lookup failed: {e}")
+            return None
+        finally:
+            session.close()
+
+    def set(self, fingerprint, model_name, language, schema):
+        """
+        Stores (or replaces) the schema generated for a file format.
+
+        Args:
+            fingerprint (str): The structural fingerprint of the file.
+            model_name (str): The model that generated the schema.
+            language (str): The language of the answer.
+            schema (str): The model answer containing the schema.
+        """
+
+        if not self.url or not fingerprint:
+            return
+
+        session = self._sessions()
+        try:
+            session.merge(CachedSchema(
+                fingerprint=fingerprint,
+                model_name=model_name,
+                language=language,
+                schema=schema,
+                created_at=datetime.now(timezone.utc).replace(microsecond=0),
+                hits=0
+            ))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Schema cache write failed: {e}")
+        finally:
+            session.close()
+
+
+# Process-wide store shared by every Streamlit session
+schema_cache = SchemaCache(SCHEMA_CACHE_URL)
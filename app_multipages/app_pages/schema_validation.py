@@ -0,0 +1,150 @@
+import json
+import os
+import re
+from functools import lru_cache
+from dotenv import load_dotenv
+from jsonschema import Draft202012Validator
+from jsonschema.exceptions import best_match
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Maximum number of repair prompts sent for one invalid schema
+SCHEMA_REPAIR_RETRIES = int(os.getenv('SCHEMA_REPAIR_RETRIES', 2))
+
+# Maximum number of validation errors listed in a repair prompt, and length of each message
+MAX_REPORTED_ERRORS = 10
+MAX_ERROR_LENGTH = 200
+
+# Fenced ```json blocks in a model answer
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+REPAIR_PROMPT = (
+    "The following metadata schema is not a valid JSON Schema (Draft 2020-12). "
+    "Fix only these errors and keep everything else unchanged:\n{errors}\n\n"
+    "Return the complete corrected schema in a single ```json block.\n\n```json\n{schema}\n```"
+)
+
+
+def find_json(answer):
+    """
+    Finds the JSON document in a model answer.
+
+    Args:
+        answer (str): The model answer, possibly with prose around a fenced JSON block.
+
+    Returns:
+        tuple: (document, start, end) where answer[start:end] is the parsed JSON text,
+            or (None, None, None) if the answer contains no valid JSON object.
+    """
+
+    candidates = [(match.start(1), match.end(1)) for match in _JSON_FENCE.finditer(answer)]
+    start, end = answer.find('{'), answer.rfind('}')
+    if start != -1 and end > start:
+        candidates.append((start, end + 1))
+    for start, end in candidates:
+        try:
+            return json.loads(answer[start:end]), start, end
+        except json.JSONDecodeError:
+            continue
+    return None, None, None
+
+
+def extract_json(answer):
+    """
+    Extracts the JSON document from a model answer.
+
+    Args:
+        answer (str): The model answer, possibly with prose around a fenced JSON block.
+
+    Returns:
+        dict: The parsed JSON, or None if the answer contains no valid JSON object.
+    """
+
+    return find_json(answer)[0]
+
+
+@lru_cache(maxsize=1)
+def get_validator():
+    """
+    Returns the validator of the Draft 2020-12 meta-schema, built once per process.
+
+    Returns:
+        Draft202012Validator: A validator checking that a document is a valid JSON Schema.
+    """
+
+    Draft202012Validator.check_schema(Draft202012Validator.META_SCHEMA)
+    return Draft202012Validator(Draft202012Validator.META_SCHEMA)
+
+
+def validation_errors(schema):
+    """
+    Validates a generated schema against the Draft 2020-12 meta-schema.
+
+    Args:
+        schema (dict): The generated schema.
+
+    Returns:
+        list: (path, message) tuples, empty if the schema is valid.
+    """
+
+    errors = []
+    for error in sorted(get_validator().iter_errors(schema), key=lambda error: [str(part) for part in error.absolute_path]):
+        path = '/' + '/'.join(str(part) for part in error.absolute_path)
+        # "not valid under any of the given schemas" says little; report the closest alternative instead
+        message = best_match(error.context).message if error.context else error.message
+        if len(message) > MAX_ERROR_LENGTH:
+            message = message[:MAX_ERROR_LENGTH] + "..."
+        errors.append((path, message))
+    return errors
+
+
+def format_errors(errors):
+    """
+    Formats validation errors as a bulleted list for prompts and messages.
+    """
+
+    lines = [f"- {path}: {message}" for path, message in errors[:MAX_REPORTED_ERRORS]]
+    if len(errors) > MAX_REPORTED_ERRORS:
+        lines.append(f"- ... ({len(errors) - MAX_REPORTED_ERRORS} more errors)")
+    return '\n'.join(lines)
+
+
+def validate_and_repair(answer, complete, max_retries=SCHEMA_REPAIR_RETRIES):
+    """
+    Validates the schema in a model answer and asks the model to repair it if needed.
+
+    Only the invalid schema and its error paths are sent back, never the data file, and
+    at most `max_retries` repair prompts are sent. The repaired schema replaces the JSON
+    of the original answer, so the prose around it is kept.
+
+    Args:
+        answer (str): The model answer containing the schema.
+        complete (callable): `complete(prompt)` returning the model answer, or None on error.
+        max_retries (int, optional): Maximum number of repair prompts.
+
+    Returns:
+        dict: 'content' (the answer, repaired if possible), 'schema' (the parsed schema or None),
+            'valid' (bool), 'errors' (remaining (path, message) tuples) and 'repairs' (prompts sent).
+    """
+
+    schema, start, end = find_json(answer)
+    if schema is None:
+        return {"content": answer, "schema": None, "valid": False, "errors": [("/", "No JSON object found in the answer.")], "repairs": 0}
+
+    errors = validation_errors(schema)
+    repairs, repaired_any = 0, False
+    while errors and repairs < max_retries:
+        repairs += 1
+        prompt = REPAIR_PROMPT.format(errors=format_errors(errors), schema=json.dumps(schema, indent=4))
+        repaired = extract_json(complete(prompt) or "")
+        if repaired is None:
+            continue
+        repaired_errors = validation_errors(repaired)
+        if len(repaired_errors) <= len(errors):
+            schema, errors, repaired_any = repaired, repaired_errors, True
+
+    content = answer
+    if repaired_any:
+        content = answer[:start] + json.dumps(schema, indent=4) + answer[end:]
+    return {"content": content, "schema": schema, "valid": not errors, "errors": errors, "repairs": repairs}
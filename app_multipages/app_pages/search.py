@@ -0,0 +1,169 @@
+import html
+import os
+import re
+from sqlalchemy import Table, MetaData, Column, select, exists, func, bindparam, literal_column, text, and_, table, column
+from sqlalchemy.dialects import postgresql
+from dotenv import load_dotenv
+from .db import Conversation
+from .message_codec import encode_content
+
+# Load environment variables from .env file
+load_dotenv()
+
+# PostgreSQL text search configuration; 'simple' does not stem, so it works for every answer language
+SEARCH_TEXT_CONFIG = os.getenv('SEARCH_TEXT_CONFIG', 'simple')
+
+# Characters of each message that are indexed; PostgreSQL rejects tsvectors over 1 MB, which
+# a long uploaded file can reach, so only the start of a very long message is searchable
+SEARCH_MAX_CHARS = int(os.getenv('SEARCH_MAX_CHARS', 100_000))
+
+# Maximum number of search results, and number of characters shown around the first match
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', 20))
+SNIPPET_CHARS = 300
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# The conversations table as seen by PostgreSQL, including the search column added by migration 5
+_pg_conversations = Table(
+    'conversations', MetaData(),
+    *(column._copy() for column in Conversation.__table__.columns),
+    Column('search_vector', postgresql.TSVECTOR)
+)
+
+# The SQLite FTS5 table created by migration 5, keyed by the message id
+_fts = table('conversations_fts', column('rowid'), column('content'))
+
+
+def search_terms(query):
+    """
+    Splits a search query into words.
+
+    Args:
+        query (str): The text typed by the user.
+
+    Returns:
+        list: The lowercase words, without operators or punctuation.
+    """
+
+    return [word.lower() for word in _WORD.findall(query or "")]
+
+
+def insert_conversations(connection, rows):
+    """
+    Inserts conversation rows with one executemany and indexes their text for search.
+
+    Long messages are compressed (see `message_codec.encode_content`); the index is always
+    built from the first SEARCH_MAX_CHARS characters of the plain text. On PostgreSQL the search_vector column is computed in the same
+    INSERT; on SQLite the text is added to the conversations_fts table under the new row ids.
+
+    Args:
+        connection (Connection): An open connection, inside a transaction.
+        rows (list): Column values of each row, as dicts, with the plain text in 'content'.
+    """
+
+    rows = [dict(row, search_text=row['content'][:SEARCH_MAX_CHARS], **encode_content(row['content'])) for row in rows]
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        connection.execute(
+            _pg_conversations.insert().values(search_vector=func.to_tsvector(SEARCH_TEXT_CONFIG, bindparam('search_text'))),
+            rows
+        )
+    elif dialect == "sqlite":
+        table = Conversation.__table__
+        ids = connection.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+        connection.execute(
+            text("INSERT INTO conversations_fts (rowid, content) VALUES (:id, :search_text)"),
+            [{"id": row_id, "search_text": row['search_text']} for row_id, row in zip(ids, rows)]
+        )
+    else:
+        connection.execute(Conversation.__table__.insert(), rows)
+
+
+def search_conversations(session, username, query, models=None, start=None, end=None, limit=SEARCH_RESULTS_LIMIT):
+    """
+    Searches the messages of a user, best matches first.
+
+    All words of the query must occur in a message. Uses the GIN-indexed tsvector column
+    on PostgreSQL and the FTS5 table on SQLite.
+
+    Args:
+        session (Session): The database session.
+        username (str): The owner of the messages.
+        query (str): The text typed by the user.
+        models (list, optional): Only conversations answered by one of these models.
+        start (datetime, optional): Only messages from this time on.
+        end (datetime, optional): Only messages before this time.
+        limit (int, optional): Maximum number of results.
+
+    Returns:
+        list: Rows with the message id, role, conversation_id, model_name, timestamp, content,
+            content_compressed, compression_dictionary_id and rank. The content is as stored;
+            see `message_codec.decode_content`.
+    """
+
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    dialect = session.get_bind().dialect.name
+    columns = [Conversation.id, Conversation.role, Conversation.conversation_id, Conversation.model_name, Conversation.timestamp,
+               Conversation.content, Conversation.content_compressed, Conversation.compression_dictionary_id]
+    if dialect == "postgresql":
+        ts_query = func.plainto_tsquery(SEARCH_TEXT_CONFIG, ' '.join(terms))
+        search_vector = literal_column("conversations.search_vector", type_=postgresql.TSVECTOR)
+        statement = select(*columns, func.ts_rank(search_vector, ts_query).label("rank")).where(search_vector.op('@@')(ts_query))
+    elif dialect == "sqlite":
+        # Each word is quoted so that FTS5 operators typed by the user are matched literally
+        match = ' '.join(f'"{term}"' for term in terms)
+        statement = select(*columns, (-func.bm25(literal_column(_fts.name))).label("rank")).join(
+            _fts, _fts.c.rowid == Conversation.id
+        ).where(literal_column(_fts.name).op('MATCH')(match))
+    else:
+        raise NotImplementedError(f"Full-text search is not available on {dialect}.")
+
+    statement = statement.where(Conversation.username == username)
+    if models:
+        answer = Conversation.__table__.alias("answer")
+        statement = statement.where(exists().where(and_(
+            answer.c.conversation_id == Conversation.conversation_id,
+            answer.c.username == username,
+            answer.c.role == 'assistant',
+            answer.c.model_name.in_(models)
+        )))
+    if start is not None:
+        statement = statement.where(Conversation.timestamp >= start)
+    if end is not None:
+        statement = statement.where(Conversation.timestamp < end)
+
+    return session.execute(statement.order_by(literal_column("rank").desc()).limit(limit)).all()
+
+
+def highlight(content, query, width=SNIPPET_CHARS):
+    """
+    Builds an HTML snippet of a message around its first match, with the matched words marked.
+
+    Args:
+        content (str): The message text.
+        query (str): The search query.
+        width (int, optional): Approximate length of the snippet in characters.
+
+    Returns:
+        str: The escaped snippet with <mark> around every occurrence of a query word.
+    """
+
+    terms = search_terms(query)
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\b', re.IGNORECASE) if terms else None
+    first = pattern.search(content) if pattern else None
+    start = max(0, first.start() - width // 3) if first else 0
+    end = min(len(content), start + width)
+    snippet = content[start:end]
+
+    parts = []
+    position = 0
+    for match in (pattern.finditer(snippet) if pattern else []):
+        parts.append(html.escape(snippet[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        position = match.end()
+    parts.append(html.escape(snippet[position:]))
+
+    return ("…" if start > 0 else "") + ''.join(parts) + ("…" if end < len(content) else "")
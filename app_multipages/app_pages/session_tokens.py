@@ -0,0 +1,178 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import select, update, delete
+from dotenv import load_dotenv
+from .db import lazy_sessionmaker, UserSession, USERS_DATABASE_URL
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Key signing the session tokens. Without it a random key is used, and sessions end when the process restarts.
+SESSION_SECRET = os.getenv('SESSION_SECRET')
+if not SESSION_SECRET:
+    logger.warning("SESSION_SECRET is not set; session tokens will not survive a restart.")
+_key = (SESSION_SECRET or secrets.token_hex(32)).encode("utf-8")
+
+# Lifetime of a session token (seconds, default 7 days)
+SESSION_TTL = int(os.getenv('SESSION_TTL', 7 * 24 * 3600))
+
+# Seconds a revocation check is reused before the user_sessions table is asked again
+SESSION_REVOCATION_CACHE_SECONDS = float(os.getenv('SESSION_REVOCATION_CACHE_SECONDS', 60))
+
+SessionLocal = lazy_sessionmaker(USERS_DATABASE_URL)
+
+# session_id -> (revoked, time of the check, expiry of the token as a Unix timestamp)
+_revocations = {}
+
+
+def _now():
+    """
+    Returns the current UTC time as a naive datetime, as stored in the database.
+    """
+
+    return datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+
+
+def _sign(payload):
+    """
+    Returns the URL-safe HMAC-SHA256 signature of a token payload.
+    """
+
+    digest = hmac.new(_key, payload.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def issue_token(username):
+    """
+    Starts a session for a user who just logged in.
+
+    The token is "<username>.<session id>.<expiry>.<signature>", with the username base64url-encoded,
+    so it can be checked without a database lookup.
+
+    Args:
+        username (str): The authenticated user.
+
+    Returns:
+        str: The signed session token.
+    """
+
+    session_id = secrets.token_hex(16)
+    now = _now()
+    expires_at = now + timedelta(seconds=SESSION_TTL)
+
+    db = SessionLocal()
+    try:
+        # Expired sessions of the user are no longer needed for revocation
+        db.execute(delete(UserSession).where(UserSession.username == username, UserSession.expires_at < now))
+        db.add(UserSession(session_id=session_id, username=username, created_at=now, expires_at=expires_at))
+        db.commit()
+    finally:
+        db.close()
+
+    encoded_username = base64.urlsafe_b64encode(username.encode("utf-8")).rstrip(b"=").decode("ascii")
+    payload = f"{encoded_username}.{session_id}.{int(expires_at.replace(tzinfo=timezone.utc).timestamp())}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def _parse(token):
+    """
+    Checks the signature and expiry of a token.
+
+    Returns:
+        tuple: (username, session_id, expiry as a Unix timestamp), or None if the token is
+            malformed, forged or expired.
+    """
+
+    try:
+        encoded_username, session_id, expires, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(f"{encoded_username}.{session_id}.{expires}")):
+            return None
+        if int(expires) < time.time():
+            return None
+        username = base64.urlsafe_b64decode(encoded_username + "=" * (-len(encoded_username) % 4)).decode("utf-8")
+    except (AttributeError, ValueError):
+        return None
+    return username, session_id, int(expires)
+
+
+def _prune_revocations():
+    """
+    Forgets the revocation checks of expired tokens, which are rejected before the cache is consulted.
+    """
+
+    now = time.time()
+    for session_id in [session_id for session_id, cached in _revocations.items() if cached[2] < now]:
+        _revocations.pop(session_id, None)
+
+
+def is_revoked(session_id, expires):
+    """
+    Checks whether a session was ended, reusing the answer for SESSION_REVOCATION_CACHE_SECONDS.
+
+    Args:
+        session_id (str): The session ID from the token.
+        expires (int): Expiry of the token as a Unix timestamp, after which its check is dropped.
+
+    Returns:
+        bool: True if the session was revoked or is unknown.
+    """
+
+    cached = _revocations.get(session_id)
+    if cached is not None and (cached[0] or time.monotonic() - cached[1] < SESSION_REVOCATION_CACHE_SECONDS):
+        return cached[0]
+
+    db = SessionLocal()
+    try:
+        row = db.execute(select(UserSession.revoked_at).where(UserSession.session_id == session_id)).first()
+    finally:
+        db.close()
+    revoked = row is None or row.revoked_at is not None
+    # Pruned on each database lookup, which already costs far more than the scan
+    _prune_revocations()
+    _revocations[session_id] = (revoked, time.monotonic(), expires)
+    return revoked
+
+
+def validate_token(token):
+    """
+    Returns the user of a valid session token.
+
+    Args:
+        token (str): The token from the browser.
+
+    Returns:
+        str: The username, or None if the token is invalid, expired or revoked.
+    """
+
+    parsed = _parse(token)
+    if parsed is None or is_revoked(parsed[1], parsed[2]):
+        return None
+    return parsed[0]
+
+
+def revoke_token(token):
+    """
+    Ends the session of a token, e.g. on logout. Other processes notice within SESSION_REVOCATION_CACHE_SECONDS.
+
+    Args:
+        token (str): The token of the session to end.
+    """
+
+    parsed = _parse(token)
+    if parsed is None:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(update(UserSession).where(UserSession.session_id == parsed[1]).values(revoked_at=_now()))
+        db.commit()
+    finally:
+        db.close()
+    _revocations[parsed[1]] = (True, time.monotonic(), parsed[2])
@@ -0,0 +1,178 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dotenv import load_dotenv
+from .tokens import count_tokens
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Size of the pieces summarized in parallel, number of parallel calls and overall time budget (seconds)
+SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', 1500))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv('SUMMARY_MAX_CONCURRENCY', 4))
+SUMMARY_DEADLINE = float(os.getenv('SUMMARY_DEADLINE', 120))
+
+# Smallest token budget given to a single partial summary
+MIN_PARTIAL_TOKENS = 64
+
+# Sentence ends and paragraph breaks
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+MAP_PROMPT = (
+    "Summarize part {index} of {total} of a longer text in at most {max_tokens} tokens. "
+    "Keep all technical details, names, numbers and JSON keys:\n\n{text}"
+)
+REDUCE_PROMPT = (
+    "Combine the following partial summaries into one coherent and complete summary "
+    "of at most {max_tokens} tokens, without repeating information:\n\n{text}"
+)
+
+
+def split_sentences(text):
+    """
+    Splits a text into sentences and paragraphs.
+
+    Args:
+        text (str): The input text.
+
+    Returns:
+        list: The non-empty sentences, in order.
+    """
+
+    return [sentence for sentence in _SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def chunk_text(text, chunk_tokens, model=None):
+    """
+    Packs whole sentences into chunks of at most `chunk_tokens` tokens.
+
+    Sentences longer than a chunk are split on line breaks, then on words.
+
+    Args:
+        text (str): The input text.
+        chunk_tokens (int): Maximum number of tokens per chunk.
+        model (str, optional): The model whose tokenizer should be used.
+
+    Returns:
+        list: The chunks, in order.
+    """
+
+    chunks = []
+    current, current_tokens = [], 0
+
+    def pieces(sentence):
+        if count_tokens(sentence, model) <= chunk_tokens:
+            return [sentence]
+        lines = sentence.splitlines()
+        if len(lines) > 1:
+            return [piece for line in lines if line.strip() for piece in pieces(line)]
+        words = sentence.split()
+        if len(words) <= 1:
+            return [sentence]
+        middle = len(words) // 2
+        return pieces(' '.join(words[:middle])) + pieces(' '.join(words[middle:]))
+
+    for sentence in split_sentences(text):
+        for piece in pieces(sentence):
+            piece_tokens = count_tokens(piece, model)
+            if current and current_tokens + piece_tokens > chunk_tokens:
+                chunks.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def _run_parallel(prompts, max_tokens, complete, max_concurrency, deadline):
+    """
+    Runs one completion per prompt concurrently and collects the results before the deadline.
+
+    Args:
+        prompts (list): The prompts to complete.
+        max_tokens (int): Maximum number of tokens per completion.
+        complete (callable): `complete(prompt, max_tokens)` returning the text, or None on error.
+        max_concurrency (int): Maximum number of completions running at once.
+        deadline (float): `time.monotonic()` value after which unfinished completions are abandoned.
+
+    Returns:
+        list: The completion of each prompt, or None where it failed or missed the deadline.
+    """
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(prompts))))
+    try:
+        futures = [executor.submit(complete, prompt, max_tokens) for prompt in prompts]
+        wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        results = []
+        for future in futures:
+            if future.done() and future.exception() is None:
+                results.append(future.result())
+            else:
+                results.append(None)
+        return results
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def map_reduce_summarize(content, complete, target_tokens, model=None, chunk_tokens=SUMMARY_CHUNK_TOKENS,
+                         max_concurrency=SUMMARY_MAX_CONCURRENCY, deadline_seconds=SUMMARY_DEADLINE):
+    """
+    Summarizes a text to about `target_tokens` tokens with a parallel map-reduce.
+
+    The text is chunked on sentence boundaries, every chunk is summarized concurrently
+    (map), and the partial summaries are merged level by level (tree reduce) until they
+    fit the target. A chunk whose summary fails or misses the deadline keeps its original
+    text for the next level, so nothing is dropped while there is time left.
+
+    The result is guaranteed to fit: if the summary is still longer than `target_tokens`
+    when the deadline is reached or the calls fail, None is returned rather than a text
+    that would overflow the caller's budget.
+
+    Args:
+        content (str): The text to summarize.
+        complete (callable): `complete(prompt, max_tokens)` returning the text, or None on error.
+        target_tokens (int): The desired number of tokens.
+        model (str, optional): The model whose tokenizer should be used.
+        chunk_tokens (int, optional): Maximum number of tokens per chunk.
+        max_concurrency (int, optional): Maximum number of completions running at once.
+        deadline_seconds (float, optional): Overall time budget in seconds.
+
+    Returns:
+        str: The summary, of at most `target_tokens` tokens, or None if the text could not be
+            summarized to that size.
+    """
+
+    deadline = time.monotonic() + deadline_seconds
+    if count_tokens(content, model) <= target_tokens:
+        return content
+
+    # Map: summarize every chunk concurrently
+    chunks = chunk_text(content, chunk_tokens, model)
+    partial_tokens = max(target_tokens // len(chunks), MIN_PARTIAL_TOKENS)
+    prompts = [MAP_PROMPT.format(index=i + 1, total=len(chunks), max_tokens=partial_tokens, text=chunk) for i, chunk in enumerate(chunks)]
+    results = _run_parallel(prompts, partial_tokens, complete, max_concurrency, deadline)
+    partials = [result if result else chunk for result, chunk in zip(results, chunks)]
+
+    # Reduce: merge groups of partial summaries until they fit the target
+    while len(partials) > 1 and count_tokens(' '.join(partials), model) > target_tokens and time.monotonic() < deadline:
+        groups = chunk_text('\n\n'.join(partials), chunk_tokens, model)
+        if len(groups) >= len(partials):
+            break  # Partials are too large to be grouped any further
+        group_tokens = max(target_tokens // len(groups), MIN_PARTIAL_TOKENS)
+        prompts = [REDUCE_PROMPT.format(max_tokens=group_tokens, text=group) for group in groups]
+        results = _run_parallel(prompts, group_tokens, complete, max_concurrency, deadline)
+        partials = [result if result else group for result, group in zip(results, groups)]
+
+    summary = '\n\n'.join(partials)
+    if count_tokens(summary, model) > target_tokens and time.monotonic() < deadline:
+        final = _run_parallel([REDUCE_PROMPT.format(max_tokens=target_tokens, text=summary)], target_tokens, complete, 1, deadline)[0]
+        if final:
+            summary = final
+
+    summary = summary.strip()
+    if count_tokens(summary, model) > target_tokens:
+        return None
+    return summary
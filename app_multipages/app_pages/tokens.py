@@ -0,0 +1,215 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import tiktoken
+from tiktoken.load import load_tiktoken_bpe
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Closest tiktoken encoding for each model family served by the backend
+MODEL_FAMILY_ENCODINGS = {
+    "llama3": "cl100k_base",
+    "mixtral": "cl100k_base",
+    "mistral": "cl100k_base",
+    "nemotron": "cl100k_base",
+}
+DEFAULT_ENCODING = "cl100k_base"
+
+# Optional directory of exact per-family tokenizers, stored as `<family>.tiktoken` BPE rank files
+TOKENIZER_DIR = os.getenv('TOKENIZER_DIR')
+
+# Extra tokens the chat template adds around every message
+TOKENS_PER_MESSAGE = 4
+
+# Number of per-message counts kept in memory
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv('TOKEN_COUNT_CACHE_SIZE', 4096))
+
+_count_cache = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+# Seconds before a tokenizer that failed to load is tried again
+TOKENIZER_RETRY_SECONDS = float(os.getenv('TOKENIZER_RETRY_SECONDS', 300))
+
+# Encoders loaded so far, and the time of the last failed load, by family
+_encoders = {}
+_encoder_failures = {}
+_encoders_lock = threading.Lock()
+
+
+def model_family(model):
+    """
+    Maps a model name such as "llama3.1:latest" to its tokenizer family.
+
+    Args:
+        model (str): The model name, or None.
+
+    Returns:
+        str: The family name, or None if the model is unknown.
+    """
+
+    if not model:
+        return None
+    name = model.lower()
+    for family in MODEL_FAMILY_ENCODINGS:
+        if name.startswith(family):
+            return family
+    return None
+
+
+def get_encoder(family):
+    """
+    Returns the tokenizer of a model family, loading it once per process.
+
+    An exact tokenizer from TOKENIZER_DIR is preferred; otherwise the closest tiktoken
+    encoding is used. Only loaded encoders are kept: a failed load is retried after
+    TOKENIZER_RETRY_SECONDS, so a tokenizer that could not be downloaded (e.g. while
+    offline) is picked up once the network is back.
+
+    Args:
+        family (str): The family returned by `model_family`, or None.
+
+    Returns:
+        tiktoken.Encoding: The encoder, or None if no tokenizer could be loaded (e.g. offline).
+    """
+
+    encoder = _encoders.get(family)
+    if encoder is not None:
+        return encoder
+    failed_at = _encoder_failures.get(family)
+    if failed_at is not None and time.monotonic() - failed_at < TOKENIZER_RETRY_SECONDS:
+        return None
+
+    try:
+        encoder = tiktoken.get_encoding(MODEL_FAMILY_ENCODINGS.get(family, DEFAULT_ENCODING))
+    except Exception as e:
+        print(f"Could not load tokenizer for {family or 'default'} models: {e}")
+        _encoder_failures[family] = time.monotonic()
+        return None
+
+    if TOKENIZER_DIR and family:
+        path = os.path.join(TOKENIZER_DIR, f"{family}.tiktoken")
+        if os.path.exists(path):
+            encoder = tiktoken.Encoding(
+                name=family,
+                pat_str=encoder._pat_str,
+                mergeable_ranks=load_tiktoken_bpe(path),
+                special_tokens={}
+            )
+    with _encoders_lock:
+        return _encoders.setdefault(family, encoder)
+
+
+def count_tokens(text, model=None):
+    """
+    Counts the number of tokens in a text with the tokenizer of the given model.
+
+    Args:
+        text (str): The input text.
+        model (str, optional): The model whose tokenizer should be used.
+
+    Returns:
+        int: Number of tokens in the text.
+    """
+
+    if not text:
+        return 0
+    encoder = get_encoder(model_family(model))
+    if encoder is None:
+        # Rough estimate when no tokenizer is available
+        return max(1, len(text) // 4)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, model=None):
+    """
+    Cuts a text to at most `max_tokens` tokens of the given model's tokenizer.
+
+    Args:
+        text (str): The input text.
+        max_tokens (int): Maximum number of tokens to keep.
+        model (str, optional): The model whose tokenizer should be used.
+
+    Returns:
+        str: The start of the text.
+    """
+
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoder = get_encoder(model_family(model))
+    if encoder is None:
+        # Same estimate as count_tokens: about four characters per token
+        return text[:max_tokens * 4]
+    return encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+
+
+def count_message_tokens(content, model=None):
+    """
+    Counts the tokens of one message, memoized by the hash of its content.
+
+    Args:
+        content (str): The message content.
+        model (str, optional): The model whose tokenizer should be used.
+
+    Returns:
+        int: Number of tokens in the message, including the chat template overhead.
+    """
+
+    key = (hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest(), model_family(model))
+    with _count_cache_lock:
+        if key in _count_cache:
+            _count_cache.move_to_end(key)
+            return _count_cache[key]
+
+    count = count_tokens(content, model) + TOKENS_PER_MESSAGE
+
+    with _count_cache_lock:
+        _count_cache[key] = count
+        if len(_count_cache) > TOKEN_COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return count
+
+
+def count_messages_tokens(messages, model=None):
+    """
+    Counts the prompt tokens of a list of messages.
+
+    Each message is counted once and memoized, so a growing conversation only
+    tokenizes its newest messages.
+
+    Args:
+        messages (list): List of message dictionaries.
+        model (str, optional): The model whose tokenizer should be used.
+
+    Returns:
+        int: Number of prompt tokens.
+    """
+
+    return sum(count_message_tokens(msg['content'], model) for msg in messages)
+
+
+def usage_from_response(response_json):
+    """
+    Reads the token usage reported by the backend, if any.
+
+    Both the OpenAI-compatible `usage` object and Ollama's `prompt_eval_count` /
+    `eval_count` fields are understood.
+
+    Args:
+        response_json (dict): A response or final stream chunk from the backend.
+
+    Returns:
+        dict: The 'prompt_tokens' and 'response_tokens' reported, or None if absent.
+    """
+
+    if not isinstance(response_json, dict):
+        return None
+    usage = response_json.get('usage')
+    if isinstance(usage, dict) and usage.get('completion_tokens') is not None:
+        return {"prompt_tokens": usage.get('prompt_tokens'), "response_tokens": usage['completion_tokens']}
+    if response_json.get('eval_count') is not None:
+        return {"prompt_tokens": response_json.get('prompt_eval_count'), "response_tokens": response_json['eval_count']}
+    return None
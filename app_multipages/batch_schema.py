@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app_pages import llm_client
+from app_pages.llm_api import query_api, predefined_prompt
+from app_pages.data_profiler import profile_text, structure_fingerprint, PROFILE_MIN_CHARS
+from app_pages.schema_cache import schema_cache
+from app_pages.schema_validation import validate_and_repair, SCHEMA_REPAIR_RETRIES
+
+
+def parse_args(argv=None):
+    """
+    Parses the command-line arguments of the batch schema generator.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(description="Generate metadata schemas for a directory of machine data files.")
+    parser.add_argument("input_dir", help="Directory containing the machine data files.")
+    parser.add_argument("--output-dir", default="schemas", help="Directory the schemas and the report are written to.")
+    parser.add_argument("--pattern", action="append", default=None, help="File extension to include (repeatable, default: .dat and .txt).")
+    parser.add_argument("--model", default="mixtral:latest", help="The LLM model to use.")
+    parser.add_argument("--language", default="English", help="The language of the answer.")
+    parser.add_argument("--workers", type=int, default=8, help="Number of files processed at the same time.")
+    parser.add_argument("--max-per-backend", type=int, default=llm_client.LLM_MAX_CONCURRENCY_PER_BACKEND, help="Maximum in-flight requests per LLM backend.")
+    parser.add_argument("--max-tokens", type=int, default=4000, help="Maximum number of tokens in each answer.")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--top-k", type=int, default=40)
+    parser.add_argument("--top-p", type=float, default=0.9)
+    parser.add_argument("--no-profile", action="store_true", help="Always send the raw file content instead of a profile.")
+    parser.add_argument("--force", action="store_true", help="Regenerate schemas even when one exists for the same file format.")
+    parser.add_argument("--repair-retries", type=int, default=SCHEMA_REPAIR_RETRIES, help="Maximum number of repair prompts for an invalid schema.")
+    parser.add_argument("--retry-failed", action="store_true", help="Process again the files that failed or got an invalid schema in a previous run.")
+    return parser.parse_args(argv)
+
+
+def find_files(input_dir, extensions):
+    """
+    Lists the data files below a directory, sorted by path.
+
+    Args:
+        input_dir (str): The directory to walk.
+        extensions (list): The file extensions to include, e.g. [".dat", ".txt"].
+
+    Returns:
+        list: The file paths.
+    """
+
+    extensions = tuple(ext.lower() if ext.startswith('.') else f".{ext.lower()}" for ext in extensions)
+    paths = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(extensions):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def load_manifest(path):
+    """
+    Reads the manifest of a previous run.
+
+    Args:
+        path (str): The manifest file (one JSON record per line).
+
+    Returns:
+        dict: The latest record of each processed file, keyed by its relative path.
+    """
+
+    records = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as manifest:
+            for line in manifest:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["file"]] = record
+    return records
+
+
+def generate_schema(path, relative, args):
+    """
+    Generates the metadata schema of one data file and writes it next to the others.
+
+    Args:
+        path (str): The data file.
+        relative (str): The path of the file relative to the input directory.
+        args (argparse.Namespace): The command-line arguments.
+
+    Returns:
+        dict: The manifest record of the file.
+    """
+
+    start_time = time.time()
+    try:
+        with open(path, "rb") as data_file:
+            data = data_file.read()
+    except OSError as e:
+        return {"file": relative, "model": args.model, "elapsed_time": 0.0, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+    record = {"file": relative, "sha256": hashlib.sha256(data).hexdigest(), "model": args.model}
+
+    try:
+        file_text = data.decode("utf-8")
+        fingerprint = structure_fingerprint(file_text)
+        record["fingerprint"] = fingerprint
+        cached_schema = None if args.force else schema_cache.get(fingerprint, args.model, args.language)
+
+        if cached_schema is not None:
+            result = {"content": cached_schema, "prompt_tokens": 0, "response_tokens": 0, "cache": "schema"}
+        else:
+            profile = None
+            if not args.no_profile and len(file_text) >= PROFILE_MIN_CHARS:
+                try:
+                    profile = profile_text(file_text)
+                except Exception as e:
+                    # Send the raw content when the file cannot be profiled
+                    print(f"Could not profile {relative}: {e}")
+            file_part = f"File profile: {profile}" if profile else f"File content: {file_text}"
+            messages = [{"role": "user", "content": f"{file_part}\n\nQuestion: {predefined_prompt}\n\nPlease answer in {args.language}."}]
+
+            result = query_api(messages=messages, model=args.model, temperature=args.temperature, max_tokens=args.max_tokens,
+                               top_k=args.top_k, top_p=args.top_p, use_cache=not args.force, compress=False)
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+
+    record.update({
+        "elapsed_time": round(time.time() - start_time, 3),
+        "prompt_tokens": result.get("prompt_tokens", 0),
+        "response_tokens": result.get("response_tokens", 0),
+        "cache": result.get("cache")
+    })
+    if "error" in result:
+        record.update({"status": "failed", "error": result["error"]})
+        return record
+
+    try:
+        record.update(save_schema(result, record, relative, args))
+    except Exception as e:
+        record.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+    return record
+
+
+def save_schema(result, record, relative, args):
+    """
+    Validates (and if needed repairs) a generated schema and writes it to the output directory.
+
+    Args:
+        result (dict): The successful query result, or the cached schema.
+        record (dict): The manifest record of the file so far.
+        relative (str): The file path relative to the input directory.
+        args (argparse.Namespace): The command-line arguments.
+
+    Returns:
+        dict: The status, output path, repairs and validation errors to add to the record.
+    """
+
+    if result.get("cache") == "schema":
+        validation = validate_and_repair(result["content"], None, max_retries=0)
+    else:
+        def complete(prompt):
+            response = query_api(messages=[{"role": "user", "content": prompt}], model=args.model, temperature=args.temperature, max_tokens=args.max_tokens,
+                                 top_k=args.top_k, top_p=args.top_p, use_cache=not args.force, compress=False)
+            return response.get("content")
+
+        validation = validate_and_repair(result["content"], complete, max_retries=args.repair_retries)
+        # Only valid schemas are reused for other files
+        if validation["valid"]:
+            schema_cache.set(record["fingerprint"], args.model, args.language, validation["content"])
+
+    schema = validation["schema"]
+    output = os.path.join(args.output_dir, f"{relative}.schema.json" if schema is not None else f"{relative}.schema.txt")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        if schema is not None:
+            json.dump(schema, output_file, indent=4)
+        else:
+            output_file.write(result["content"])
+
+    if schema is None:
+        status = "no_json"
+    else:
+        status = "ok" if validation["valid"] else "invalid"
+    saved = {"status": status, "output": os.path.relpath(output, args.output_dir), "repairs": validation["repairs"]}
+    if schema is not None and not validation["valid"]:
+        saved["validation_errors"] = [f"{path}: {message}" for path, message in validation["errors"]]
+    return saved
+
+
+def write_report(records, path, wall_time):
+    """
+    Writes the timing and token report of all processed files.
+
+    Args:
+        records (dict): The manifest records keyed by relative path.
+        path (str): The report file.
+        wall_time (float): Duration of this run in seconds.
+    """
+
+    rows = sorted(records.values(), key=lambda record: record["file"])
+    statuses = {}
+    for row in rows:
+        statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+    report = {
+        "files": len(rows),
+        "statuses": statuses,
+        "wall_time": round(wall_time, 3),
+        "total_elapsed_time": round(sum(row.get("elapsed_time", 0) for row in rows), 3),
+        "total_prompt_tokens": sum(row.get("prompt_tokens") or 0 for row in rows),
+        "total_response_tokens": sum(row.get("response_tokens") or 0 for row in rows),
+        "results": rows
+    }
+    with open(path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=4)
+
+
+def main(argv=None):
+    """
+    Runs the batch schema generation: walks the input directory, skips the files already
+    done according to the manifest, processes the rest with a bounded worker pool and
+    writes one schema per file plus a report.
+    """
+
+    args = parse_args(argv)
+    llm_client.LLM_MAX_CONCURRENCY_PER_BACKEND = args.max_per_backend
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, "manifest.jsonl")
+    records = load_manifest(manifest_path)
+
+    done_statuses = {"ok", "no_json"} if args.retry_failed else {"ok", "no_json", "failed", "invalid"}
+    pending = []
+    for path in find_files(args.input_dir, args.pattern or [".dat", ".txt"]):
+        relative = os.path.relpath(path, args.input_dir)
+        if records.get(relative, {}).get("status") not in done_statuses:
+            pending.append((path, relative))
+
+    print(f"{len(pending)} files to process, {len(records)} already in the manifest.")
+    start_time = time.time()
+    manifest_lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futures = [executor.submit(generate_schema, path, relative, args) for path, relative in pending]
+        with open(manifest_path, "a", encoding="utf-8") as manifest:
+            for done, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                with manifest_lock:
+                    manifest.write(json.dumps(record) + "\n")
+                    manifest.flush()
+                    records[record["file"]] = record
+                print(f"[{done}/{len(pending)}] {record['file']}: {record['status']} ({record['elapsed_time']:.1f}s)")
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print("Interrupted, progress is saved in the manifest. Run again to resume.")
+        return 1
+    finally:
+        write_report(records, os.path.join(args.output_dir, "report.json"), time.time() - start_time)
+
+    executor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import argparse
+import contextlib
+import sys
+from app_pages.auth import calibrate_parameters, ARGON2_TARGET_MS
+
+
+def parse_args(argv=None):
+    """
+    Parses the command-line arguments of the Argon2 calibration.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(description="Calibrate the Argon2 cost parameters on this server and print them as environment variables.")
+    parser.add_argument("--target-ms", type=float, default=ARGON2_TARGET_MS,
+                        help=f"Target duration of one hash in milliseconds (default: {ARGON2_TARGET_MS:g}).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Calibrates the parameters and prints them in .env format, so every process uses the same ones.
+    """
+
+    args = parse_args(argv)
+    # Keep the calibration log out of the .env lines on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        parameters = calibrate_parameters(args.target_ms)
+    print(f"ARGON2_TIME_COST={parameters['time_cost']}")
+    print(f"ARGON2_MEMORY_COST={parameters['memory_cost']}")
+    print(f"ARGON2_PARALLELISM={parameters['parallelism']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import argparse
+import sys
+from app_pages.message_codec import train_dictionary, compress_existing, MESSAGE_COMPRESSION_THRESHOLD
+
+
+def parse_args(argv=None):
+    """
+    Parses the command-line arguments of the message compression backfill.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(description="Compress the stored conversation messages that are not compressed yet.")
+    parser.add_argument("--train", action="store_true", help="Build a new dictionary from the newest answers first.")
+    parser.add_argument("--samples", type=int, default=500, help="Number of answers the dictionary is built from (default: 500).")
+    parser.add_argument("--batch-size", type=int, default=500, help="Messages updated per transaction (default: 500).")
+    parser.add_argument("--threshold", type=int, default=MESSAGE_COMPRESSION_THRESHOLD,
+                        help=f"Minimum message length in characters (default: {MESSAGE_COMPRESSION_THRESHOLD}).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Optionally trains a dictionary, then compresses the existing messages and reports the savings.
+    """
+
+    args = parse_args(argv)
+    if args.train:
+        dictionary_id, size = train_dictionary(args.samples)
+        if dictionary_id is None:
+            print("Not enough answers in common to build a dictionary; compressing without one.")
+        else:
+            print(f"Built dictionary {dictionary_id} ({size} bytes).")
+
+    compressed, before, after = compress_existing(batch_size=args.batch_size, threshold=args.threshold)
+    if compressed:
+        print(f"Compressed {compressed} messages: {before} -> {after} bytes ({after / before:.0%}).")
+    else:
+        print("No messages to compress.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import argparse
+import sys
+from app_pages.migrations import migrate, MIGRATIONS, DATABASE_URLS
+
+
+def parse_args(argv=None):
+    """
+    Parses the command-line arguments of the migration runner.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(description="Apply the pending database migrations.")
+    parser.add_argument("components", nargs="*", help=f"Components to migrate: {', '.join(MIGRATIONS)} (default: all).")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the pending migrations.")
+    args = parser.parse_args(argv)
+    unknown = [component for component in args.components if component not in MIGRATIONS]
+    if unknown:
+        parser.error(f"unknown components: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    """
+    Applies the pending migrations of every requested component and reports them.
+    """
+
+    args = parse_args(argv)
+    for component in args.components or list(MIGRATIONS):
+        if not DATABASE_URLS[component]:
+            print(f"{component}: no database URL configured, skipped.")
+            continue
+        done = migrate(component, dry_run=args.dry_run)
+        verb = "pending" if args.dry_run else "applied"
+        if not done:
+            print(f"{component}: up to date.")
+        for version, description in done:
+            print(f"{component}: {verb} {version:04d} {description}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The app reads its database URLs when its modules are imported, so point them at throwaway
+# SQLite files before any test imports app_pages
+_database_dir = tempfile.mkdtemp(prefix="llm_metadata_tests_")
+os.environ["POSTGRESQL_URL"] = f"sqlite:///{os.path.join(_database_dir, 'conversations.db')}"
+os.environ["POSTGRESQL_Pass_URL"] = f"sqlite:///{os.path.join(_database_dir, 'users.db')}"
+os.environ["SCHEMA_CACHE_URL"] = os.environ["POSTGRESQL_URL"]
+os.environ.setdefault("SESSION_SECRET", "test-secret")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def migrated():
+    """
+    Applies all migrations to the test databases once.
+    """
+
+    from app_pages.migrations import migrate, MIGRATIONS
+
+    for component in MIGRATIONS:
+        migrate(component)
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+from argon2 import PasswordHasher, Type
+
+from app_pages import auth
+from app_pages.auth import AuthBusyError, hash_password, verify_password
+
+# Cheap parameters so the tests do not spend their time hashing
+FAST = dict(time_cost=1, memory_cost=8, parallelism=1)
+
+
+@pytest.fixture(autouse=True)
+def fast_hasher(monkeypatch):
+    monkeypatch.setattr(auth, "_hasher", PasswordHasher(**FAST))
+
+
+def test_hash_and_verify():
+    stored = hash_password("correct horse")
+
+    assert stored.startswith("$argon2id$")
+    assert verify_password(stored, "correct horse") == (True, None)
+    assert verify_password(stored, "wrong") == (False, None)
+
+
+def test_invalid_stored_hash_does_not_verify():
+    assert verify_password("not-a-hash", "correct horse") == (False, None)
+
+
+def test_weaker_hash_is_replaced_on_login(monkeypatch):
+    stored = PasswordHasher(**FAST).hash("correct horse")
+    monkeypatch.setattr(auth, "_hasher", PasswordHasher(**dict(FAST, time_cost=2)))
+
+    valid, new_hash = verify_password(stored, "correct horse")
+
+    assert valid
+    assert new_hash is not None and new_hash != stored
+    assert verify_password(new_hash, "correct horse") == (True, None)
+
+
+def test_stronger_or_differently_parallel_hash_is_kept():
+    stronger = PasswordHasher(**dict(FAST, time_cost=2, memory_cost=16)).hash("correct horse")
+    parallel = PasswordHasher(**dict(FAST, parallelism=2, memory_cost=16)).hash("correct horse")
+
+    assert verify_password(stronger, "correct horse") == (True, None)
+    assert verify_password(parallel, "correct horse") == (True, None)
+
+
+def test_needs_upgrade_compares_each_parameter():
+    hasher = PasswordHasher(time_cost=2, memory_cost=16, parallelism=1)
+
+    assert not auth.needs_upgrade(hasher.hash("pw"), hasher)
+    assert auth.needs_upgrade(PasswordHasher(time_cost=1, memory_cost=16, parallelism=1).hash("pw"), hasher)
+    assert auth.needs_upgrade(PasswordHasher(time_cost=2, memory_cost=8, parallelism=1).hash("pw"), hasher)
+    assert auth.needs_upgrade(PasswordHasher(time_cost=2, memory_cost=16, parallelism=1, salt_len=8).hash("pw"), hasher)
+    assert auth.needs_upgrade(PasswordHasher(time_cost=2, memory_cost=16, parallelism=1, type=Type.I).hash("pw"), hasher)
+    assert auth.needs_upgrade("not-a-hash", hasher)
+
+
+def test_saturated_pool_raises_busy(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(auth, "_slots", slots)
+    slots.acquire()
+
+    with pytest.raises(AuthBusyError):
+        hash_password("correct horse")
+
+    slots.release()
+    assert hash_password("correct horse")
+
+
+def test_slow_check_times_out(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_TIMEOUT", 0.05)
+
+    with pytest.raises(AuthBusyError):
+        auth._run(time.sleep, 0.5)
+
+
+def test_calibration_stops_at_the_minimum_cost(monkeypatch):
+    for name in ("ARGON2_TIME_COST", "ARGON2_MEMORY_COST", "ARGON2_PARALLELISM"):
+        monkeypatch.setattr(auth, name, None)
+
+    parameters = auth.calibrate_parameters(target_ms=0)
+
+    assert parameters["memory_cost"] == auth.MIN_MEMORY_COST
+    assert parameters["time_cost"] == auth.MIN_TIME_COST
+
+
+def test_calibration_keeps_configured_parameters(monkeypatch):
+    monkeypatch.setattr(auth, "ARGON2_TIME_COST", "3")
+    monkeypatch.setattr(auth, "ARGON2_MEMORY_COST", "8")
+    monkeypatch.setattr(auth, "ARGON2_PARALLELISM", "1")
+
+    assert auth.calibrate_parameters(target_ms=0) == {"time_cost": 3, "memory_cost": 8, "parallelism": 1}
+
+
+def test_calibration_script_prints_only_env_lines(monkeypatch, capsys):
+    import calibrate_argon2
+
+    monkeypatch.setattr(calibrate_argon2, "calibrate_parameters", lambda target_ms: print("log line") or {"time_cost": 2, "memory_cost": 19456, "parallelism": 1})
+
+    assert calibrate_argon2.main(["--target-ms", "100"]) == 0
+
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == ["ARGON2_TIME_COST=2", "ARGON2_MEMORY_COST=19456", "ARGON2_PARALLELISM=1"]
+    assert "log line" in captured.err
@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+import batch_schema
+from app_pages.schema_cache import SchemaCache
+
+SCHEMA = {"$schema": "http://json-schema.org/draft-07/schema#", "type": "object", "properties": {"Force": {"type": "number"}}}
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    input_dir = tmp_path / "input"
+    (input_dir / "nested").mkdir(parents=True)
+    (input_dir / "a.dat").write_text("Force\n1\n2\n", encoding="utf-8")
+    (input_dir / "nested" / "b.txt").write_text("Force\n3\n4\n", encoding="utf-8")
+    (input_dir / "ignored.csv").write_text("Force\n5\n", encoding="utf-8")
+    return input_dir
+
+
+class Calls(list):
+    """
+    The prompts sent to the fake backend, plus the file contents it should fail on.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.failing = set()
+
+
+@pytest.fixture
+def calls(monkeypatch, tmp_path):
+    calls = Calls()
+    monkeypatch.setattr(batch_schema, "schema_cache", SchemaCache(f"sqlite:///{tmp_path / 'schemas.db'}"))
+
+    def fake_query_api(messages, model, **kwargs):
+        content = messages[0]["content"]
+        calls.append(content)
+        if any(text in content for text in calls.failing):
+            return {"error": "Failed with status code 502"}
+        return {"content": f"Here is the schema:\n```json\n{json.dumps(SCHEMA)}\n```", "prompt_tokens": 10, "response_tokens": 20}
+
+    monkeypatch.setattr(batch_schema, "query_api", fake_query_api)
+    return calls
+
+
+def run(data_dir, output_dir, *extra):
+    return batch_schema.main([str(data_dir), "--output-dir", str(output_dir), "--workers", "2", "--no-profile", *extra])
+
+
+def read_manifest(output_dir):
+    with open(output_dir / "manifest.jsonl", encoding="utf-8") as manifest:
+        return [json.loads(line) for line in manifest]
+
+
+def test_find_files_filters_extensions_recursively(data_dir):
+    paths = batch_schema.find_files(str(data_dir), [".dat", "TXT"])
+
+    assert [p.replace(str(data_dir), "").replace("\\", "/") for p in paths] == ["/a.dat", "/nested/b.txt"]
+
+
+def test_run_writes_schemas_manifest_and_report(data_dir, tmp_path, calls):
+    output_dir = tmp_path / "schemas"
+
+    assert run(data_dir, output_dir) == 0
+
+    assert len(calls) == 2
+    assert json.loads((output_dir / "a.dat.schema.json").read_text(encoding="utf-8")) == SCHEMA
+    assert (output_dir / "nested" / "b.txt.schema.json").exists()
+    assert {record["file"].replace("\\", "/"): record["status"] for record in read_manifest(output_dir)} == {"a.dat": "ok", "nested/b.txt": "ok"}
+    report = json.loads((output_dir / "report.json").read_text(encoding="utf-8"))
+    assert report["files"] == 2
+    assert report["total_prompt_tokens"] == 20
+    assert report["total_response_tokens"] == 40
+
+
+def test_second_run_resumes_from_the_manifest(data_dir, tmp_path, calls):
+    output_dir = tmp_path / "schemas"
+    run(data_dir, output_dir)
+    (data_dir / "c.dat").write_text("Force\n6\n", encoding="utf-8")
+    calls.clear()
+
+    run(data_dir, output_dir)
+
+    assert len(calls) == 1
+    assert "Force\n6\n" in calls[0]
+    assert len(read_manifest(output_dir)) == 3
+
+
+def test_failed_files_are_retried_only_on_request(data_dir, tmp_path, calls):
+    output_dir = tmp_path / "schemas"
+    calls.failing.add("Force\n1\n2\n")
+    run(data_dir, output_dir)
+    assert {record["file"]: record["status"] for record in read_manifest(output_dir)}["a.dat"] == "failed"
+
+    calls.clear()
+    run(data_dir, output_dir)
+    assert calls == []
+
+    calls.failing.clear()
+    run(data_dir, output_dir, "--retry-failed")
+    assert len(calls) == 1
+    assert read_manifest(output_dir)[-1]["file"] == "a.dat"
+    assert read_manifest(output_dir)[-1]["status"] == "ok"
+    assert json.loads((output_dir / "report.json").read_text(encoding="utf-8"))["statuses"] == {"ok": 2}
+
+
+def test_files_sharing_a_layout_reuse_one_schema(tmp_path, calls):
+    input_dir = tmp_path / "tensile"
+    input_dir.mkdir()
+    for name, offset in (("first.dat", 0), ("second.dat", 100)):
+        rows = "\n".join(f"{v}\t{v / 10:.2f}" for v in range(offset, offset + 20))
+        (input_dir / name).write_text(f"Machine: Zwick Z050\nForce\tElongation\nkN\tmm\n{rows}\n", encoding="utf-8")
+    output_dir = tmp_path / "schemas"
+
+    run(input_dir, output_dir, "--workers", "1")
+
+    assert len(calls) == 1
+    assert {record["file"]: record["cache"] for record in read_manifest(output_dir)} == {"first.dat": None, "second.dat": "schema"}
+    assert json.loads((output_dir / "second.dat.schema.json").read_text(encoding="utf-8")) == SCHEMA
+
+    calls.clear()
+    run(input_dir, tmp_path / "forced", "--force")
+    assert len(calls) == 2
+
+
+def test_errors_after_the_answer_are_recorded_per_file(data_dir, tmp_path, calls):
+    output_dir = tmp_path / "schemas"
+    # The schema of a.dat cannot be written: its output path is taken by a directory
+    (output_dir / "a.dat.schema.json").mkdir(parents=True)
+
+    assert run(data_dir, output_dir) == 0
+
+    records = {record["file"].replace("\\", "/"): record for record in read_manifest(output_dir)}
+    assert records["a.dat"]["status"] == "failed"
+    assert "IsADirectoryError" in records["a.dat"]["error"] or "PermissionError" in records["a.dat"]["error"]
+    assert records["nested/b.txt"]["status"] == "ok"
+
+
+def test_unprofilable_files_are_sent_raw(data_dir, tmp_path, calls, monkeypatch):
+    def broken_profile(text):
+        raise ValueError("no table")
+
+    monkeypatch.setattr(batch_schema, "profile_text", broken_profile)
+    monkeypatch.setattr(batch_schema, "PROFILE_MIN_CHARS", 0)
+
+    batch_schema.main([str(data_dir), "--output-dir", str(tmp_path / "schemas"), "--workers", "1"])
+
+    assert len(calls) == 2
+    assert all(call.startswith("File content: Force") for call in calls)
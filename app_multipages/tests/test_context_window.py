@@ -0,0 +1,106 @@
+from app_pages.context_window import build_context, summarize_older, context_tokens, answer_tokens, SUMMARY_PREFIX, MIN_PROMPT_TOKENS
+from app_pages.tokens import count_messages_tokens, count_message_tokens
+
+MODEL = "nemotron:latest"
+MAX_TOKENS = 600
+
+
+def message(role, words, turn=0):
+    return {"role": role, "content": " ".join(f"{role}{turn}_{i}" for i in range(words))}
+
+
+def conversation(turns, words=400):
+    return [message("user" if turn % 2 == 0 else "assistant", words, turn) for turn in range(turns)]
+
+
+def budget():
+    return context_tokens(MODEL) - MAX_TOKENS
+
+
+def build(messages, summarize, cache=None):
+    return build_context(messages, MODEL, MAX_TOKENS, expand=dict, summarize=summarize, cache={} if cache is None else cache)
+
+
+def test_short_conversation_is_sent_unchanged():
+    messages = conversation(3, words=10)
+
+    assert build(messages, summarize=lambda text, max_tokens: "unused") == messages
+
+
+def test_older_messages_are_replaced_by_a_summary():
+    messages = conversation(20)
+    cache = {}
+
+    context = build(messages, summarize=lambda text, max_tokens: "They discussed tensile tests.", cache=cache)
+
+    assert context[0] == {"role": "system", "content": f"{SUMMARY_PREFIX}They discussed tensile tests."}
+    assert context[-1] == messages[-1]
+    assert count_messages_tokens(context, MODEL) <= budget()
+    assert len(cache) == 1
+
+
+def test_oversized_summary_is_dropped_and_not_cached():
+    messages = conversation(20)
+    cache = {}
+
+    # A summarizer that gives up and returns its whole input
+    context = build(messages, summarize=lambda text, max_tokens: text, cache=cache)
+
+    assert all(msg["role"] != "system" for msg in context)
+    assert count_messages_tokens(context, MODEL) <= budget()
+    assert cache == {}
+
+
+def test_summary_gets_the_budget_minus_the_prefix():
+    seen = []
+
+    def summarize(text, max_tokens):
+        seen.append(max_tokens)
+        return "summary"
+
+    summarize_older(conversation(4), MODEL, 300, summarize, {})
+
+    assert seen == [300 - count_message_tokens(SUMMARY_PREFIX, MODEL)]
+
+
+def test_cached_summary_is_reused_and_extended():
+    older = conversation(6)
+    cache = {}
+    summarize_older(older[:4], MODEL, 300, lambda text, max_tokens: "first four", cache)
+    prompts = []
+
+    def summarize(text, max_tokens):
+        prompts.append(text)
+        return "all six"
+
+    assert summarize_older(older, MODEL, 300, summarize, cache) == "all six"
+    assert prompts[0].startswith(f"{SUMMARY_PREFIX}first four")
+    assert older[0]["content"] not in prompts[0]
+    assert summarize_older(older, MODEL, 300, summarize, cache) == "all six"
+    assert len(prompts) == 1
+
+
+def test_last_message_longer_than_the_window_is_truncated():
+    messages = [message("user", 10), message("user", 10000, turn=1)]
+
+    context = build(messages, summarize=lambda text, max_tokens: None)
+
+    assert len(context) == 1
+    assert messages[-1]["content"].startswith(context[0]["content"])
+    assert count_messages_tokens(context, MODEL) <= budget()
+
+
+def test_max_tokens_above_the_window_leaves_room_for_the_question():
+    question = [{"role": "user", "content": "What is the yield strength of steel?"}]
+
+    for max_tokens in (4094, 4500):
+        context = build_context(question, MODEL, max_tokens, expand=dict, summarize=lambda text, max_tokens: None, cache={})
+        assert context == question
+
+
+def test_answer_tokens_keeps_a_minimum_prompt_budget():
+    window = context_tokens(MODEL)
+
+    assert answer_tokens(MODEL, MAX_TOKENS) == MAX_TOKENS
+    assert answer_tokens(MODEL, 4500) == window - MIN_PROMPT_TOKENS
+    assert answer_tokens("llama3.1:latest", 4500) == 4500
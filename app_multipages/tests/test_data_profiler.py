@@ -0,0 +1,87 @@
+from app_pages.data_profiler import profile_text, structure_fingerprint, detect_delimiter
+
+
+def tensile_file(values=range(1, 51), header="Machine: Zwick Z050\nDate: 2024-01-15\n", columns="Force\tElongation\n"):
+    rows = "\n".join(f"{v}\t{v / 10:.2f}" for v in values)
+    return f"{header}{columns}kN\tmm\n{rows}\n"
+
+
+def test_profile_summarizes_columns_and_keeps_header():
+    profile = profile_text(tensile_file())
+
+    assert "Rows: 50, Columns: 2, Delimiter: tab" in profile
+    assert "Machine: Zwick Z050" in profile
+    assert "- Force, unit: kN, dtype: int64, min: 1, max: 50" in profile
+    assert "- Elongation, unit: mm" in profile
+    assert "First 5 data rows:" in profile
+
+
+def test_profile_reads_units_from_column_names_and_decimal_commas():
+    text = "Force [kN];Elongation [mm]\n" + "\n".join(f"{v};{v},5" for v in range(20))
+
+    profile = profile_text(text)
+
+    assert "Delimiter: semicolon, Decimal separator: ','" in profile
+    assert "- Force, unit: kN" in profile
+    assert "- Elongation, unit: mm, dtype: float64, min: 0.5, max: 19.5" in profile
+
+
+def test_profile_renames_duplicate_columns():
+    text = tensile_file(columns="Force\tForce\n")
+
+    profile = profile_text(text)
+
+    assert "- Force, unit: kN" in profile
+    assert "- Force.1, unit: mm" in profile
+
+
+def test_duplicate_names_after_unit_split_are_renamed():
+    text = "Force [kN]\tForce [N]\n" + "\n".join(f"{v}\t{v * 1000}" for v in range(20))
+
+    profile = profile_text(text)
+
+    assert "- Force, unit: kN" in profile
+    assert "- Force.1, unit: N" in profile
+
+
+def test_profile_without_table_is_none():
+    assert profile_text("Just a short note about the test.\nNothing tabular here.") is None
+
+
+def test_detect_delimiter_finds_first_data_row():
+    head = tensile_file().split("\n")[:20]
+
+    delimiter, start, width = detect_delimiter(head)
+
+    assert (delimiter, start, width) == ("\t", 4, 2)
+
+
+def test_fingerprint_ignores_values_but_not_layout():
+    first = structure_fingerprint(tensile_file(values=range(1, 51)))
+    second = structure_fingerprint(tensile_file(values=range(100, 180), header="Machine: Zwick Z050\nDate: 2024-03-02\n"))
+    other_columns = structure_fingerprint(tensile_file(columns="Force\tStrain\n"))
+
+    assert first == second
+    assert first != other_columns
+
+
+def test_text_columns_keep_their_values():
+    rows = "\n".join(f"{v}\t{v / 10:.2f}\t{'ok' if v % 10 else ''}" for v in range(1, 51))
+    text = f"Force\tElongation\tNote\nkN\tmm\t\n{rows}\n"
+
+    profile = profile_text(text)
+
+    assert "- Note, dtype: " in profile
+    assert "distinct values: 1, nulls: 5" in profile
+    assert "- Force, unit: kN, dtype: int64, min: 1, max: 50" in profile
+    assert "1;0.1;ok" in profile
+
+
+def test_stray_text_in_a_numeric_column_becomes_null():
+    rows = "\n".join(f"{v}\t{v / 10:.2f}" for v in range(1, 51))
+    text = f"Force\tElongation\nkN\tmm\n{rows}\nn/a\t5.10\n"
+
+    profile = profile_text(text)
+
+    assert "- Force, unit: kN, dtype: float64, min: 1, max: 50, mean: 25.5, nulls: 1" in profile
+    assert "- Elongation, unit: mm, dtype: float64, min: 0.1, max: 5.1" in profile
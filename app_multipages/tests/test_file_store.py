@@ -0,0 +1,97 @@
+import hashlib
+import uuid
+
+import pytest
+
+from app_pages import file_store
+from app_pages.file_store import SessionFactory, UploadedFile, describe_file, get_file_info, load_file_text, store_file
+
+pytestmark = pytest.mark.usefixtures("migrated")
+
+
+def unique_bytes(text="Time,Load\n0,1.5\n1,2.5\n"):
+    # Every test stores different content so the cached lookups never see a previous test's file
+    return f"# {uuid.uuid4()}\n{text}".encode("utf-8")
+
+
+def test_store_file_returns_the_content_hash_and_round_trips():
+    data = unique_bytes()
+
+    content_hash = store_file(data, "data.csv", "text/csv")
+
+    assert content_hash == hashlib.sha256(data).hexdigest()
+    assert load_file_text(content_hash) == data.decode("utf-8")
+
+
+def test_store_file_keeps_one_row_per_content():
+    data = unique_bytes()
+
+    first = store_file(data, "first.csv")
+    second = store_file(data, "second.csv")
+
+    session = SessionFactory()
+    try:
+        assert first == second
+        assert session.query(UploadedFile).filter(UploadedFile.content_hash == first).count() == 1
+    finally:
+        session.close()
+    assert get_file_info(first)["filename"] == "first.csv"
+
+
+def test_get_file_info_reports_sizes():
+    data = unique_bytes("x" * 10000)
+
+    info = get_file_info(store_file(data, "big.dat", "application/octet-stream"))
+
+    assert info["size"] == len(data)
+    assert info["compressed_size"] < info["size"]
+    assert info["content_type"] == "application/octet-stream"
+
+
+def test_describe_file_names_the_file_and_its_size():
+    data = unique_bytes("y" * 2048)
+    content_hash = store_file(data, "sample.dat")
+
+    assert describe_file(content_hash) == f"📎 sample.dat ({len(data) / 1024:.1f} KB)"
+
+
+def test_missing_files_are_reported_not_raised():
+    content_hash = hashlib.sha256(unique_bytes()).hexdigest()
+
+    assert load_file_text(content_hash) is None
+    assert get_file_info(content_hash) is None
+    assert describe_file(content_hash) == f"📎 Missing file {content_hash[:12]}"
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    monkeypatch.setattr(file_store, "FILE_CACHE_MAX_CHARS", 200)
+    monkeypatch.setattr(file_store, "_text_cache", file_store.OrderedDict())
+    monkeypatch.setattr(file_store, "_text_cache_size", 0)
+
+
+def test_text_cache_is_bounded_by_total_size(small_cache):
+    hashes = [store_file(unique_bytes("z" * 40)) for _ in range(3)]
+
+    for content_hash in hashes:
+        load_file_text(content_hash)
+
+    assert list(file_store._text_cache) == hashes[1:]
+    assert file_store._text_cache_size <= 200
+
+
+def test_files_larger_than_the_cache_are_not_kept(small_cache):
+    data = unique_bytes("z" * 500)
+
+    assert load_file_text(store_file(data)) == data.decode("utf-8")
+    assert not file_store._text_cache
+
+
+def test_missing_files_are_not_cached(small_cache):
+    data = unique_bytes()
+    content_hash = hashlib.sha256(data).hexdigest()
+    assert load_file_text(content_hash) is None
+
+    store_file(data)
+
+    assert load_file_text(content_hash) == data.decode("utf-8")
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import pytest
+import streamlit as st
+
+from app_pages import history
+from app_pages.db import Conversation
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def add(*messages):
+    session = history.Session()
+    try:
+        session.add_all(messages)
+        session.commit()
+    finally:
+        history.Session.remove()
+
+
+@pytest.fixture
+def user(migrated, monkeypatch):
+    """
+    Logs in a fresh user with 7 conversations, several of which share a timestamp.
+
+    Conversation 3 was never answered and conversation 5 was answered twice.
+    """
+
+    username = f"pager-{datetime.now().timestamp()}"
+    for i in range(7):
+        timestamp = START + timedelta(minutes=i // 2)
+        add(Conversation(role="user", content=f"question {i}", username=username, conversation_id=f"c{i}", timestamp=timestamp))
+        if i != 3:
+            add(Conversation(role="assistant", content=f"answer {i}", username=username, conversation_id=f"c{i}",
+                             model_name="llama3.1:latest", timestamp=timestamp))
+        if i == 5:
+            add(Conversation(role="assistant", content="second answer 5", username=username, conversation_id="c5",
+                             model_name="mixtral:latest", timestamp=timestamp))
+    st.session_state.username = username
+    st.session_state.pop("history", None)
+    monkeypatch.setattr(history, "HISTORY_PAGE_SIZE", 3)
+    return username
+
+
+def questions(rows):
+    return [row.user_preview for row in rows]
+
+
+def test_pages_walk_back_through_ties_without_gaps(user):
+    first = history.get_conversation_history(limit=3)
+    oldest = first[-1]
+    second = history.get_conversation_history(before=(oldest.timestamp, oldest.user_id), limit=3)
+    oldest = second[-1]
+    third = history.get_conversation_history(before=(oldest.timestamp, oldest.user_id), limit=3)
+
+    assert questions(first + second + third) == [f"question {i}" for i in reversed(range(7))]
+
+
+def test_each_question_is_paired_with_its_first_answer(user):
+    rows = {row.conversation_id: row for row in history.get_conversation_history()}
+
+    assert len(rows) == 7
+    assert rows["c0"].assistant_preview == "answer 0"
+    assert rows["c5"].assistant_preview == "answer 5"
+    assert rows["c5"].model_name == "llama3.1:latest"
+    assert rows["c3"].assistant_id is None and rows["c3"].assistant_preview is None
+
+
+def test_after_returns_only_newer_conversations(user):
+    rows = history.get_conversation_history()
+    middle = rows[3]
+
+    assert questions(history.get_conversation_history(after=(middle.timestamp, middle.user_id))) == questions(rows[:3])
+
+
+def test_load_more_marks_the_history_complete(user):
+    history.refresh_history()
+    loaded = st.session_state.history
+    assert len(loaded["rows"]) == 3 and not loaded["complete"]
+
+    history.load_history_page()
+    history.load_history_page()
+
+    assert len(loaded["rows"]) == 7 and loaded["complete"]
+
+
+def test_refresh_only_fetches_new_conversations(user):
+    history.refresh_history()
+    timestamp = START + timedelta(hours=1)
+    add(Conversation(role="user", content="new question", username=user, conversation_id="c7", timestamp=timestamp),
+        Conversation(role="assistant", content="new answer", username=user, conversation_id="c7", timestamp=timestamp))
+
+    history.refresh_history()
+
+    assert questions(st.session_state.history["rows"])[:2] == ["new question", "question 6"]
+    assert len(st.session_state.history["rows"]) == 4
+
+
+def test_long_messages_are_previewed_and_loaded_on_request(user, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_PREVIEW_CHARS", 10)
+    history.refresh_history()
+    long_text = "x" * 25
+    timestamp = START + timedelta(hours=1)
+    add(Conversation(role="user", content="long answer please", username=user, conversation_id="c8", timestamp=timestamp),
+        Conversation(role="assistant", content=long_text, content_length=25, username=user, conversation_id="c8", timestamp=timestamp))
+
+    row = history.get_conversation_history(limit=1)[0]
+
+    # The question was saved without content_length: only its first 11 characters are measured
+    assert (row.user_preview, row.user_length) == ("long answe", 11)
+    assert (row.assistant_preview, row.assistant_length) == ("x" * 10, 25)
+    assert history.get_message_content(row.assistant_id) == long_text
+    assert history.get_message_content(row.user_id) == "long answer please"
+
+
+def test_other_users_messages_are_not_loaded(user):
+    st.session_state.username = "somebody-else"
+
+    assert history.get_conversation_history() == []
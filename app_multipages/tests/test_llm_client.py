@@ -0,0 +1,89 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import pytest
+from app_pages.llm_client import post_json, stream_lines, get_client, TotalTimeout
+
+
+class Backend(BaseHTTPRequestHandler):
+    """
+    Answers /echo with the request body, /stream with server-sent events, and /slow with
+    a body trickled over about a second.
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/stream":
+            events = b"data: one\n\n: keep-alive\n\ndata: two\n\ndata: [DONE]\n\n"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(events)))
+            self.end_headers()
+            self.wfile.write(events)
+            return
+        if self.path == "/slow":
+            self.send_response(200)
+            self.send_header("Content-Length", "10")
+            self.end_headers()
+            for _ in range(10):
+                self.wfile.write(b"x")
+                self.wfile.flush()
+                time.sleep(0.1)
+            return
+        self.send_response(200 if self.path == "/echo" else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def backend():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Backend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_post_json_returns_the_full_response(backend):
+    response = post_json(f"{backend}/echo", {"model": "llama3.1:latest"})
+
+    assert response.status_code == 200
+    assert response.json() == {"model": "llama3.1:latest"}
+
+
+def test_error_status_is_returned_not_raised(backend):
+    assert post_json(f"{backend}/missing", {}).status_code == 404
+
+
+def test_total_deadline_stops_a_trickling_backend(backend):
+    with pytest.raises(TotalTimeout):
+        post_json(f"{backend}/slow", {}, total_timeout=0.3)
+
+
+def test_client_is_shared():
+    assert get_client() is get_client()
+
+
+def test_concurrent_requests_share_the_pool(backend):
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(post_json(f"{backend}/echo", {"i": i}).json()["i"])) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == list(range(8))
+
+
+def test_stream_lines_yields_non_empty_lines(backend):
+    assert list(stream_lines(f"{backend}/stream", {})) == ["data: one", ": keep-alive", "data: two", "data: [DONE]"]
+
+
+def test_stream_lines_raises_on_error_status(backend):
+    with pytest.raises(httpx.HTTPStatusError):
+        list(stream_lines(f"{backend}/missing", {}))
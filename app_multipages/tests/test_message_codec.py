@@ -0,0 +1,89 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import select
+from app_pages import message_codec
+from app_pages.message_codec import build_dictionary, compress_content, decode_content, train_dictionary, compress_existing
+from app_pages.db import get_engine, Conversation, POSTGRESQL_URL
+from app_pages.search import insert_conversations
+
+
+def schema_answer(i):
+    return "\n".join([
+        "```json",
+        "{",
+        '    "$schema": "https://json-schema.org/draft/2020-12/schema",',
+        f'    "title": "Tensile test {i}",',
+        '    "type": "object",',
+        '    "properties": {',
+        '        "force": {"type": "number", "description": "Applied force in kN"},',
+        '        "elongation": {"type": "number", "description": "Elongation in mm"}',
+        "    }",
+        "}",
+        "```",
+    ] * 5)
+
+
+def test_build_dictionary_keeps_lines_shared_by_samples():
+    dictionary = build_dictionary([schema_answer(1), schema_answer(2), "unrelated answer text"])
+
+    assert b'"type": "object",' in dictionary
+    assert b"Tensile test 1" not in dictionary
+    assert b"unrelated" not in dictionary
+
+
+def test_build_dictionary_respects_the_size_limit():
+    samples = [f"line number {i} of a common answer" for i in range(2000)]
+
+    assert len(build_dictionary([("\n".join(samples))] * 2, size=1024)) <= 1024
+
+
+def test_build_dictionary_without_common_lines_is_empty():
+    assert build_dictionary(["only once in here"]) == b""
+
+
+@pytest.mark.parametrize("dictionary", [b"", build_dictionary([schema_answer(1), schema_answer(2)])])
+def test_round_trip(monkeypatch, dictionary):
+    dictionary_id = 7 if dictionary else 0
+    monkeypatch.setattr(message_codec, "current_dictionary", lambda: (dictionary_id, dictionary))
+    monkeypatch.setattr(message_codec, "load_dictionary", lambda requested: dictionary if requested == dictionary_id else None)
+    text = schema_answer(3)
+
+    values = compress_content(text)
+
+    assert values["content"] == "" and values["compression_dictionary_id"] == dictionary_id
+    assert len(values["content_compressed"]) < len(text.encode("utf-8"))
+    assert values["preview"] == text[:message_codec.MESSAGE_PREVIEW_CHARS]
+    assert values["content_length"] == len(text)
+    assert decode_content(values["content"], values["content_compressed"], values["compression_dictionary_id"]) == text
+
+
+def test_incompressible_text_is_stored_as_is(monkeypatch):
+    monkeypatch.setattr(message_codec, "current_dictionary", lambda: (0, b""))
+
+    assert compress_content("short") == {
+        "content": "short", "content_compressed": None, "compression_dictionary_id": None, "preview": None, "content_length": 5
+    }
+    assert decode_content("short") == "short"
+
+
+def test_train_and_compress_existing(migrated, monkeypatch):
+    rows = [
+        dict(role="assistant", content=schema_answer(i), model_name="llama3.1:latest", elapsed_time=1.0, token_usage=10,
+             username="codec", conversation_id=f"codec-{i}", file_hash=None, timestamp=datetime(2024, 1, 1))
+        for i in range(5)
+    ]
+    with get_engine(POSTGRESQL_URL).begin() as connection:
+        insert_conversations(connection, rows)
+
+    dictionary_id, size = train_dictionary(samples=5)
+    compressed, before, after = compress_existing(threshold=100)
+
+    assert dictionary_id is not None and size > 0
+    assert compressed >= 5 and after < before
+    with get_engine(POSTGRESQL_URL).connect() as connection:
+        stored = connection.execute(
+            select(Conversation.content, Conversation.content_compressed, Conversation.compression_dictionary_id)
+            .where(Conversation.username == "codec").order_by(Conversation.id)
+        ).all()
+    assert all(row.content == "" and row.compression_dictionary_id == dictionary_id for row in stored)
+    assert [decode_content(*row) for row in stored] == [row["content"] for row in rows]
@@ -0,0 +1,162 @@
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, func, select
+
+from app_pages.message_store import MessageWriter
+
+metadata = MetaData()
+messages = Table("messages", metadata, Column("id", Integer, primary_key=True), Column("content", String, nullable=False))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'messages.db'}")
+    metadata.create_all(engine)
+    return engine
+
+
+def insert_messages(connection, rows):
+    connection.execute(messages.insert(), rows)
+
+
+def stored(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(messages)).scalar()
+
+
+def pair(i):
+    return [{"content": f"question {i}"}, {"content": f"answer {i}"}]
+
+
+def counting(writer):
+    # Records the size of every executemany the writer issues
+    inserts = []
+    insert = writer._insert
+    writer._insert = lambda rows: inserts.append(len(rows)) or insert(rows)
+    return inserts
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_synchronous_writes_are_stored_immediately(engine):
+    writer = MessageWriter(engine, insert_messages, write_behind=False)
+
+    writer.write(pair(0))
+
+    assert stored(engine) == 2
+
+
+def test_write_behind_batches_groups_into_one_insert(engine):
+    writer = MessageWriter(engine, insert_messages, write_behind=True, flush_rows=6, flush_interval=2)
+    inserts = counting(writer)
+
+    writer.write(pair(0))
+    writer.write(pair(1))
+    time.sleep(0.1)
+    assert stored(engine) == 0
+
+    writer.write(pair(2))
+    wait_for(lambda: stored(engine) == 6)
+    assert inserts == [6]
+    writer.close()
+
+
+def test_write_behind_flushes_after_the_interval(engine):
+    writer = MessageWriter(engine, insert_messages, write_behind=True, flush_rows=100, flush_interval=0.1)
+
+    writer.write(pair(0))
+
+    wait_for(lambda: stored(engine) == 2)
+    writer.close()
+
+
+def test_full_queue_falls_back_to_synchronous_writes(engine, monkeypatch):
+    writer = MessageWriter(engine, insert_messages, write_behind=True, queue_size=1)
+    # No background writer, so the queue stays full
+    monkeypatch.setattr(writer, "_start", lambda: None)
+
+    writer.write(pair(0))
+    writer.write(pair(1))
+
+    assert stored(engine) == 2
+    assert writer.flush() == 2
+    assert stored(engine) == 4
+
+
+def test_close_writes_the_queued_rows(engine):
+    writer = MessageWriter(engine, insert_messages, write_behind=True, flush_rows=100, flush_interval=2)
+    writer.write(pair(0))
+
+    writer.close()
+
+    assert stored(engine) == 2
+
+
+def test_failed_flush_keeps_the_rows_for_a_retry(engine, monkeypatch):
+    writer = MessageWriter(engine, insert_messages, write_behind=True)
+    monkeypatch.setattr(writer, "_start", lambda: None)
+    insert = writer._insert
+
+    def failing(rows):
+        raise RuntimeError("database is down")
+
+    writer._insert = failing
+    writer.write(pair(0))
+    assert writer.flush() == 0
+
+    writer._insert = insert
+    assert writer.flush() == 2
+    assert stored(engine) == 2
+
+
+def fail_inserts(writer):
+    def failing(rows):
+        raise RuntimeError("database is down")
+
+    insert = writer._insert
+    writer._insert = failing
+    return insert
+
+
+def test_rows_kept_during_an_outage_are_capped(engine, monkeypatch):
+    writer = MessageWriter(engine, insert_messages, write_behind=True, pending_max_rows=3)
+    monkeypatch.setattr(writer, "_start", lambda: None)
+    insert = fail_inserts(writer)
+    writer.write(pair(0))
+    writer.write(pair(1))
+    writer.write(pair(2))
+
+    assert writer.flush() == 0
+    assert len(writer._pending) == 3
+    assert writer._queue.qsize() == 1
+
+    writer._insert = insert
+    writer.close()
+    assert stored(engine) == 5
+
+
+def test_writes_go_synchronous_and_fail_loudly_once_the_queue_is_full(engine, monkeypatch):
+    writer = MessageWriter(engine, insert_messages, write_behind=True, queue_size=1, pending_max_rows=2)
+    monkeypatch.setattr(writer, "_start", lambda: None)
+    fail_inserts(writer)
+    writer.write(pair(0))
+
+    with pytest.raises(RuntimeError):
+        writer.write(pair(1))
+
+
+def test_close_flushes_until_the_queue_is_empty(engine, monkeypatch):
+    writer = MessageWriter(engine, insert_messages, write_behind=True, pending_max_rows=2)
+    monkeypatch.setattr(writer, "_start", lambda: None)
+    for i in range(3):
+        writer.write(pair(i))
+
+    writer.close()
+
+    assert stored(engine) == 6
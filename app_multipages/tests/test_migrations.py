@@ -0,0 +1,64 @@
+import base64
+import zlib
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app_pages.migrations import migrate, MIGRATIONS
+
+
+@pytest.mark.parametrize("component", list(MIGRATIONS))
+def test_migrations_on_a_new_database(tmp_path, component):
+    url = f"sqlite:///{tmp_path / 'new.db'}"
+
+    assert [version for version, _ in migrate(component, url=url, dry_run=True)] == [version for version, _, _ in MIGRATIONS[component]]
+    assert len(migrate(component, url=url)) == len(MIGRATIONS[component])
+    assert migrate(component, url=url) == []
+
+
+def test_dry_run_changes_nothing(tmp_path):
+    url = f"sqlite:///{tmp_path / 'new.db'}"
+
+    migrate("conversations", url=url, dry_run=True)
+
+    assert not inspect(create_engine(url)).has_table("conversations")
+
+
+def test_database_created_before_migrations_is_upgraded(tmp_path):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE conversations (id INTEGER PRIMARY KEY, role VARCHAR NOT NULL, content TEXT NOT NULL, "
+            "model_name VARCHAR, token_usage INTEGER, elapsed_time FLOAT, timestamp DATETIME, "
+            "username VARCHAR NOT NULL, conversation_id VARCHAR NOT NULL)"
+        ))
+        connection.execute(text("INSERT INTO conversations (role, content, username, conversation_id) VALUES ('user', 'Hi', 'u', 'c1')"))
+
+    migrate("conversations", url=url)
+
+    inspector = inspect(engine)
+    assert "file_hash" in {column["name"] for column in inspector.get_columns("conversations")}
+    assert "ix_conversations_username_timestamp" in {index["name"] for index in inspector.get_indexes("conversations")}
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT content, content_length FROM conversations")).one() == ("Hi", 2)
+
+
+def test_base85_compressed_messages_are_moved_to_the_binary_column(tmp_path):
+    url = f"sqlite:///{tmp_path / 'codec.db'}"
+    migrate("conversations", url=url)
+    engine = create_engine(url)
+    text_message = "tensile test " * 50
+    data = zlib.compress(text_message.encode("utf-8"), 9)
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM schema_migrations WHERE component = 'conversations' AND version = 8"))
+        connection.execute(
+            text("INSERT INTO conversations (role, content, username, conversation_id, content_length) VALUES ('assistant', :content, 'u', 'c1', :length)"),
+            {"content": "\x1bz0:" + base64.b85encode(data).decode("ascii"), "length": len(text_message)}
+        )
+
+    assert [version for version, _ in migrate("conversations", url=url)] == [8]
+
+    with engine.connect() as connection:
+        row = connection.execute(text("SELECT content, content_compressed, compression_dictionary_id FROM conversations")).one()
+    assert row == ("", data, 0)
@@ -0,0 +1,72 @@
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from app_pages import page_register
+from app_pages.db import User
+from app_pages.page_register import register_user
+
+
+@pytest.fixture(autouse=True)
+def users_database(migrated, monkeypatch):
+    # Registration logic is under test here, not Argon2
+    monkeypatch.setattr(page_register, "hash_password", lambda password: f"hashed:{password}")
+
+
+@pytest.fixture
+def existing():
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    assert register_user(name, "secret", f"{name}@example.com") == []
+    return name
+
+
+def count_users(**filters):
+    db = page_register.SessionLocal()
+    try:
+        return db.execute(select(func.count()).select_from(User).filter_by(**filters)).scalar()
+    finally:
+        db.close()
+
+
+def test_new_user_is_stored_with_the_hashed_password(existing):
+    db = page_register.SessionLocal()
+    try:
+        user = db.execute(select(User).where(User.username == existing)).scalar_one()
+    finally:
+        db.close()
+
+    assert user.password == "hashed:secret"
+    assert user.email == f"{existing}@example.com"
+
+
+def test_conflicting_fields_are_reported(existing):
+    assert register_user(existing, "other", "fresh@example.org") == ["username"]
+    assert register_user("fresh-name", "other", f"{existing}@example.com") == ["email"]
+    assert register_user(existing, "other", f"{existing}@example.com") == ["username", "email"]
+    assert count_users(username=existing) == 1
+
+
+def test_duplicates_are_rejected_before_hashing(existing, monkeypatch):
+    def hash_password(password):
+        raise AssertionError("no hash expected")
+
+    monkeypatch.setattr(page_register, "hash_password", hash_password)
+
+    assert register_user(existing, "other", "fresh@example.org") == ["username"]
+
+
+def test_registration_racing_past_the_check_is_rejected_by_the_insert(existing, monkeypatch):
+    find_conflicts = page_register.find_conflicts
+    calls = []
+
+    def racing_find_conflicts(db, username, email):
+        # The first check runs before the competing registration commits
+        calls.append(username)
+        return [] if len(calls) == 1 else find_conflicts(db, username, email)
+
+    monkeypatch.setattr(page_register, "find_conflicts", racing_find_conflicts)
+
+    assert register_user(existing, "other", "fresh@example.org") == ["username"]
+    assert len(calls) == 2
+    assert count_users(username=existing) == 1
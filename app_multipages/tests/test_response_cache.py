@@ -0,0 +1,92 @@
+from app_pages import response_cache as cache_module
+from app_pages.response_cache import LRUCache, ResponseCache, make_cache_key
+
+MESSAGES = [{"role": "user", "content": "What is the yield strength of steel?"}]
+RESULT = {"content": "About 250 MPa.", "prompt_tokens": 9, "response_tokens": 5, "total_tokens": 14, "elapsed_time": 1.5}
+
+
+def test_cache_key_is_stable_and_ignores_extra_message_fields():
+    key = make_cache_key("llama3.1:8b", MESSAGES, 0.7, 200, 40, 0.9)
+    annotated = [dict(MESSAGES[0], timestamp="2024-01-01T00:00:00")]
+
+    assert key == make_cache_key("llama3.1:8b", annotated, 0.7, 200, 40, 0.9)
+    assert len(key) == 64
+
+
+def test_cache_key_changes_with_any_parameter():
+    base = ("llama3.1:8b", MESSAGES, 0.7, 200, 40, 0.9)
+    keys = {
+        make_cache_key(*base),
+        make_cache_key("mistral:7b", *base[1:]),
+        make_cache_key(base[0], [{"role": "user", "content": "Other question"}], *base[2:]),
+        make_cache_key(*base[:2], 0.5, *base[3:]),
+        make_cache_key(*base[:3], 300, *base[4:]),
+        make_cache_key(*base[:4], 20, base[5]),
+        make_cache_key(*base[:5], 0.5),
+    }
+
+    assert len(keys) == 7
+
+
+def test_lru_evicts_least_recently_used_entries_by_size():
+    cache = LRUCache(max_bytes=10, ttl=60)
+    cache.set("a", "A", 4)
+    cache.set("b", "B", 4)
+    assert cache.get("a") == "A"
+
+    cache.set("c", "C", 4)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_lru_skips_values_larger_than_the_cache():
+    cache = LRUCache(max_bytes=10, ttl=60)
+    cache.set("a", "A", 4)
+    cache.set("big", "B", 11)
+
+    assert cache.get("big") is None
+    assert cache.get("a") == "A"
+
+
+def test_lru_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_bytes=10, ttl=60)
+    cache.set("a", "A", 4)
+
+    now[0] += 59
+    assert cache.get("a") == "A"
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache._size == 0
+
+
+def test_response_cache_without_database_uses_memory_only():
+    cache = ResponseCache(url=None)
+    key = make_cache_key("llama3.1:8b", MESSAGES, 0.7, 200, 40, 0.9)
+
+    assert cache.get(key) == (None, None)
+    cache.set(key, dict(RESULT, raw_response={"not": "cached"}))
+
+    assert cache.get(key) == (RESULT, "memory")
+
+
+def test_response_cache_falls_back_to_the_database_tier(tmp_path):
+    url = f"sqlite:///{tmp_path / 'cache.db'}"
+    key = make_cache_key("llama3.1:8b", MESSAGES, 0.7, 200, 40, 0.9)
+    ResponseCache(url=url).set(key, RESULT)
+
+    # A fresh process starts with an empty memory tier but shares the database
+    other = ResponseCache(url=url)
+    assert other.get(key) == (RESULT, "database")
+    assert other.get(key) == (RESULT, "memory")
+
+
+def test_response_cache_ignores_expired_database_rows(tmp_path):
+    url = f"sqlite:///{tmp_path / 'cache.db'}"
+    key = make_cache_key("llama3.1:8b", MESSAGES, 0.7, 200, 40, 0.9)
+    ResponseCache(url=url, ttl=-1).set(key, RESULT)
+
+    assert ResponseCache(url=url).get(key) == (None, None)
@@ -0,0 +1,56 @@
+import pytest
+
+from app_pages.schema_cache import CachedSchema, SchemaCache
+
+FINGERPRINT = "f" * 64
+ANSWER = '```json\n{"type": "object"}\n```'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SchemaCache(f"sqlite:///{tmp_path / 'schemas.db'}")
+
+
+def hits(cache):
+    session = cache._sessions()
+    try:
+        return session.get(CachedSchema, (FINGERPRINT, "mixtral:latest", "English")).hits
+    finally:
+        session.close()
+
+
+def test_schema_round_trips_and_counts_hits(cache):
+    assert cache.get(FINGERPRINT, "mixtral:latest", "English") is None
+
+    cache.set(FINGERPRINT, "mixtral:latest", "English", ANSWER)
+
+    assert cache.get(FINGERPRINT, "mixtral:latest", "English") == ANSWER
+    assert cache.get(FINGERPRINT, "mixtral:latest", "English") == ANSWER
+    assert hits(cache) == 2
+
+
+def test_schemas_are_kept_per_model_and_language(cache):
+    cache.set(FINGERPRINT, "mixtral:latest", "English", ANSWER)
+
+    assert cache.get(FINGERPRINT, "llama3.1:latest", "English") is None
+    assert cache.get(FINGERPRINT, "mixtral:latest", "German") is None
+
+
+def test_set_replaces_the_schema_and_resets_hits(cache):
+    cache.set(FINGERPRINT, "mixtral:latest", "English", ANSWER)
+    cache.get(FINGERPRINT, "mixtral:latest", "English")
+
+    cache.set(FINGERPRINT, "mixtral:latest", "English", "new answer")
+
+    assert hits(cache) == 0
+    assert cache.get(FINGERPRINT, "mixtral:latest", "English") == "new answer"
+
+
+def test_files_without_a_fingerprint_or_store_are_not_cached(tmp_path):
+    cache = SchemaCache(f"sqlite:///{tmp_path / 'schemas.db'}")
+    cache.set(None, "mixtral:latest", "English", ANSWER)
+    disabled = SchemaCache(None)
+    disabled.set(FINGERPRINT, "mixtral:latest", "English", ANSWER)
+
+    assert cache.get(None, "mixtral:latest", "English") is None
+    assert disabled.get(FINGERPRINT, "mixtral:latest", "English") is None
@@ -0,0 +1,78 @@
+import json
+from app_pages.schema_validation import extract_json, find_json, validation_errors, format_errors, validate_and_repair
+
+VALID_SCHEMA = {"$schema": "https://json-schema.org/draft/2020-12/schema", "type": "object", "properties": {"force": {"type": "number"}}}
+INVALID_SCHEMA = {"type": "object", "properties": {"force": {"type": "numeric"}}, "required": "force"}
+
+
+def answer_with(schema):
+    return f"Here is the schema:\n```json\n{json.dumps(schema, indent=4)}\n```\nLet me know if you need changes."
+
+
+def test_extract_json_prefers_the_fenced_block():
+    assert extract_json(answer_with(VALID_SCHEMA)) == VALID_SCHEMA
+
+
+def test_extract_json_falls_back_to_the_outer_braces():
+    assert extract_json('The schema is {"type": "object"} as requested.') == {"type": "object"}
+
+
+def test_find_json_without_json():
+    assert find_json("No schema today.") == (None, None, None)
+    assert find_json("Broken {json") == (None, None, None)
+
+
+def test_validation_errors_point_to_the_invalid_parts():
+    paths = [path for path, message in validation_errors(INVALID_SCHEMA)]
+
+    assert paths == ["/properties/force/type", "/required"]
+    assert validation_errors(VALID_SCHEMA) == []
+
+
+def test_format_errors_limits_the_list():
+    errors = [(f"/{i}", "bad") for i in range(12)]
+
+    lines = format_errors(errors).split("\n")
+
+    assert lines[0] == "- /0: bad"
+    assert lines[-1] == "- ... (2 more errors)"
+
+
+def test_valid_schema_needs_no_repair():
+    def complete(prompt):
+        raise AssertionError("no repair expected")
+
+    result = validate_and_repair(answer_with(VALID_SCHEMA), complete)
+
+    assert result["valid"] and result["repairs"] == 0
+    assert result["content"] == answer_with(VALID_SCHEMA)
+
+
+def test_repair_replaces_only_the_schema_and_sends_no_data():
+    prompts = []
+
+    def complete(prompt):
+        prompts.append(prompt)
+        return answer_with(VALID_SCHEMA)
+
+    result = validate_and_repair(answer_with(INVALID_SCHEMA), complete, max_retries=2)
+
+    assert result["valid"] and result["repairs"] == 1
+    assert result["schema"] == VALID_SCHEMA
+    assert result["content"].startswith("Here is the schema:")
+    assert result["content"].endswith("Let me know if you need changes.")
+    assert "/properties/force/type" in prompts[0]
+
+
+def test_repair_gives_up_after_max_retries():
+    result = validate_and_repair(answer_with(INVALID_SCHEMA), lambda prompt: None, max_retries=2)
+
+    assert not result["valid"]
+    assert result["repairs"] == 2
+    assert result["content"] == answer_with(INVALID_SCHEMA)
+
+
+def test_answer_without_json():
+    result = validate_and_repair("I cannot help with that.", lambda prompt: None)
+
+    assert result["schema"] is None and not result["valid"]
@@ -0,0 +1,98 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from app_pages import search
+from app_pages.search import search_terms, insert_conversations, search_conversations, highlight
+from app_pages.db import get_engine, POSTGRESQL_URL
+
+
+def exchange(username, conversation_id, question, answer, model="llama3.1:latest", timestamp=datetime(2024, 1, 1)):
+    common = dict(username=username, conversation_id=conversation_id, file_hash=None, timestamp=timestamp)
+    return [
+        dict(role="user", content=question, model_name=None, elapsed_time=None, token_usage=None, **common),
+        dict(role="assistant", content=answer, model_name=model, elapsed_time=1.0, token_usage=10, **common),
+    ]
+
+
+@pytest.fixture(scope="module")
+def engine(migrated):
+    engine = get_engine(POSTGRESQL_URL)
+    with engine.begin() as connection:
+        insert_conversations(connection, [
+            *exchange("searcher", "s1", "What is the yield strength of steel?", "Steel has a yield strength of about 250 MPa."),
+            *exchange("searcher", "s2", "Describe a tensile test.", "A tensile test stretches a specimen until it breaks.",
+                      model="mixtral:latest", timestamp=datetime(2024, 6, 1)),
+            *exchange("someone_else", "s3", "Steel question", "Steel answer"),
+        ])
+    return engine
+
+
+def search_for(engine, query, username="searcher", **filters):
+    with Session(engine) as session:
+        return search_conversations(session, username, query, **filters)
+
+
+def test_search_index_is_created(engine):
+    assert inspect(engine).has_table("conversations_fts")
+
+
+def test_search_terms():
+    assert search_terms('yield "strength" OR steel*') == ["yield", "strength", "or", "steel"]
+
+
+def test_all_words_must_match(engine):
+    contents = [row.content for row in search_for(engine, "yield steel")]
+
+    assert len(contents) == 2
+    assert all("yield" in content.lower() and "steel" in content.lower() for content in contents)
+    assert search_for(engine, "yield tensile") == []
+
+
+def test_search_only_sees_the_users_messages(engine):
+    assert {row.conversation_id for row in search_for(engine, "steel")} == {"s1"}
+
+
+def test_fts_operators_are_matched_literally(engine):
+    assert search_for(engine, "steel OR tensile") == []
+    assert search_for(engine, "") == []
+
+
+def test_model_and_date_filters(engine):
+    assert {row.conversation_id for row in search_for(engine, "tensile", models=["mixtral:latest"])} == {"s2"}
+    assert search_for(engine, "tensile", models=["llama3.1:latest"]) == []
+    assert search_for(engine, "tensile", start=datetime(2024, 1, 2)) != []
+    assert search_for(engine, "tensile", end=datetime(2024, 1, 2)) == []
+
+
+def test_model_filter_ignores_other_users_answers(engine):
+    with engine.begin() as connection:
+        insert_conversations(connection, [
+            dict(role="assistant", content="Unrelated", model_name="mistral-large:latest", elapsed_time=1.0, token_usage=10,
+                 username="someone_else", conversation_id="s1", file_hash=None, timestamp=datetime(2024, 1, 1))
+        ])
+
+    assert search_for(engine, "yield", models=["mistral-large:latest"]) == []
+    assert search_for(engine, "yield", models=["llama3.1:latest"]) != []
+def test_highlight_marks_and_escapes():
+    snippet = highlight("Use <b>steel</b> or Steel alloys.", "steel")
+
+    assert snippet == "Use &lt;b&gt;<mark>steel</mark>&lt;/b&gt; or <mark>Steel</mark> alloys."
+
+
+def test_highlight_centers_on_the_first_match():
+    content = "x" * 500 + " steel " + "y" * 500
+
+    snippet = highlight(content, "steel", width=100)
+
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "<mark>steel</mark>" in snippet
+
+
+def test_only_the_start_of_long_messages_is_indexed(engine, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_MAX_CHARS", 100)
+    with engine.begin() as connection:
+        insert_conversations(connection, exchange("long", "s4", "Long file", "beginning " + "filler " * 100 + "hiddenword"))
+
+    assert search_for(engine, "beginning", username="long") != []
+    assert search_for(engine, "hiddenword", username="long") == []
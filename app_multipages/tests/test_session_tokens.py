@@ -0,0 +1,74 @@
+import pytest
+from app_pages import session_tokens
+from app_pages.session_tokens import issue_token, validate_token, revoke_token
+
+
+@pytest.fixture(autouse=True)
+def users_database(migrated):
+    session_tokens._revocations.clear()
+
+
+def test_issued_token_is_valid():
+    token = issue_token("alice")
+
+    assert validate_token(token) == "alice"
+
+
+def test_username_with_dots_and_unicode():
+    token = issue_token("jürgen.müller")
+
+    assert validate_token(token) == "jürgen.müller"
+
+
+@pytest.mark.parametrize("tamper", [
+    lambda token: token[:-2] + ("AA" if not token.endswith("AA") else "BB"),
+    lambda token: "Ym9i" + token[token.index("."):],
+    lambda token: token.rsplit(".", 1)[0],
+    lambda token: "not a token",
+])
+def test_tampered_token_is_rejected(tamper):
+    assert validate_token(tamper(issue_token("alice"))) is None
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    monkeypatch.setattr(session_tokens, "SESSION_TTL", -1)
+
+    assert validate_token(issue_token("alice")) is None
+
+
+def test_revoked_token_is_rejected():
+    token = issue_token("alice")
+    other = issue_token("alice")
+
+    revoke_token(token)
+
+    assert validate_token(token) is None
+    assert validate_token(other) == "alice"
+
+
+def test_revocation_by_another_process_is_noticed_after_the_cache_expires(monkeypatch):
+    token = issue_token("alice")
+    assert validate_token(token) == "alice"
+
+    # Revoke as another process would, without touching this process's cache
+    revocations = dict(session_tokens._revocations)
+    revoke_token(token)
+    session_tokens._revocations.clear()
+    session_tokens._revocations.update(revocations)
+
+    assert validate_token(token) == "alice"
+    monkeypatch.setattr(session_tokens, "SESSION_REVOCATION_CACHE_SECONDS", 0)
+    assert validate_token(token) is None
+
+
+def test_revocation_checks_of_expired_tokens_are_pruned(monkeypatch):
+    monkeypatch.setattr(session_tokens, "SESSION_TTL", 1)
+    expiring = issue_token("alice")
+    assert validate_token(expiring) == "alice"
+    monkeypatch.setattr(session_tokens, "SESSION_TTL", 3600)
+    lasting = issue_token("alice")
+
+    monkeypatch.setattr(session_tokens.time, "time", lambda: session_tokens._revocations[expiring.split(".")[1]][2] + 1)
+    assert validate_token(lasting) == "alice"
+
+    assert set(session_tokens._revocations) == {lasting.split(".")[1]}
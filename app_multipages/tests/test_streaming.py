@@ -0,0 +1,68 @@
+import json
+import httpx
+import pytest
+from app_pages import llm_api
+from app_pages.llm_api import parse_stream_line, stream_api
+
+
+def sse(content):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": content}}]})
+
+
+def test_parse_openai_server_sent_events():
+    assert parse_stream_line(sse("Hel")) == ("Hel", False, None)
+    assert parse_stream_line('data: {"choices": [{"delta": {}}]}') == ("", False, None)
+    assert parse_stream_line("data: [DONE]") == ("", True, None)
+
+
+def test_parse_keep_alive_and_usage_only_chunks():
+    assert parse_stream_line(": ping") == ("", False, None)
+    usage = parse_stream_line('data: {"choices": [], "usage": {"prompt_tokens": 7, "completion_tokens": 3}}')
+    assert usage == ("", False, {"prompt_tokens": 7, "response_tokens": 3})
+
+
+def test_parse_ollama_chunks():
+    assert parse_stream_line('{"message": {"role": "assistant", "content": "Hi"}, "done": false}') == ("Hi", False, None)
+    final = '{"message": {"role": "assistant", "content": ""}, "done": true, "prompt_eval_count": 7, "eval_count": 3}'
+    assert parse_stream_line(final) == ("", True, {"prompt_tokens": 7, "response_tokens": 3})
+
+
+def test_parse_rejects_malformed_lines():
+    with pytest.raises(ValueError):
+        parse_stream_line("data: <html>")
+
+
+def test_stream_api_yields_pieces_and_fills_the_result(monkeypatch):
+    lines = [": ping", sse("Steel "), sse("yields."), "data: [DONE]", sse("ignored")]
+    monkeypatch.setattr(llm_api, "stream_lines", lambda url, payload, headers=None: iter(lines))
+    result = {}
+
+    pieces = list(stream_api([{"role": "user", "content": "Hi"}], "llama3.1:latest", result=result, use_cache=False))
+
+    assert pieces == ["Steel ", "yields."]
+    assert result["content"] == "Steel yields."
+    assert result["time_to_first_token"] is not None
+    assert result["elapsed_time"] >= result["time_to_first_token"]
+
+
+def test_stream_api_reports_an_error_status(monkeypatch):
+    def failing(url, payload, headers=None):
+        request = httpx.Request("POST", "http://backend")
+        raise httpx.HTTPStatusError("bad gateway", request=request, response=httpx.Response(502, request=request))
+        yield
+
+    monkeypatch.setattr(llm_api, "stream_lines", failing)
+    result = {}
+
+    assert list(stream_api([{"role": "user", "content": "Hi"}], "llama3.1:latest", result=result, use_cache=False)) == []
+    assert result["error"] == "Failed with status code 502"
+
+
+def test_stream_api_prefers_the_usage_reported_by_the_backend(monkeypatch):
+    lines = [sse("Steel yields."), 'data: {"choices": [], "usage": {"prompt_tokens": 11, "completion_tokens": 4}}', "data: [DONE]"]
+    monkeypatch.setattr(llm_api, "stream_lines", lambda url, payload, headers=None: iter(lines))
+    result = {}
+
+    list(stream_api([{"role": "user", "content": "Hi"}], "llama3.1:latest", result=result, use_cache=False))
+
+    assert (result["prompt_tokens"], result["response_tokens"], result["total_tokens"]) == (11, 4, 15)
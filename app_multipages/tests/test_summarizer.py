@@ -0,0 +1,36 @@
+from app_pages.summarizer import map_reduce_summarize, chunk_text
+from app_pages.tokens import count_tokens
+
+
+def long_text(sentences=400):
+    return " ".join(f"Sentence number {i} describes the tensile test in some detail." for i in range(sentences))
+
+
+def test_short_text_is_returned_unchanged():
+    calls = []
+
+    summary = map_reduce_summarize("A short answer.", lambda prompt, max_tokens: calls.append(prompt), 100)
+
+    assert summary == "A short answer."
+    assert calls == []
+
+
+def test_summary_fits_the_target():
+    summary = map_reduce_summarize(long_text(), lambda prompt, max_tokens: "Short summary.", 200, chunk_tokens=500)
+
+    assert summary is not None
+    assert count_tokens(summary) <= 200
+
+
+def test_failed_calls_return_none_instead_of_the_original():
+    summary = map_reduce_summarize(long_text(), lambda prompt, max_tokens: None, 200, chunk_tokens=500)
+
+    assert summary is None
+
+
+def test_chunks_respect_the_token_limit():
+    chunks = chunk_text(long_text(), 100)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == long_text().split()
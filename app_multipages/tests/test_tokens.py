@@ -0,0 +1,88 @@
+from app_pages import tokens
+from app_pages.tokens import count_message_tokens, count_messages_tokens, count_tokens, model_family, usage_from_response
+
+
+def test_model_family_matches_name_prefixes():
+    assert model_family("llama3.1:latest") == "llama3"
+    assert model_family("Mixtral:8x7b") == "mixtral"
+    assert model_family("nemotron:latest") == "nemotron"
+    assert model_family("gemma:2b") is None
+    assert model_family(None) is None
+
+
+def test_count_tokens_estimates_without_a_tokenizer(monkeypatch):
+    monkeypatch.setattr(tokens, "get_encoder", lambda family: None)
+
+    assert count_tokens("", "llama3.1:latest") == 0
+    assert count_tokens("abc", "llama3.1:latest") == 1
+    assert count_tokens("x" * 400, "llama3.1:latest") == 100
+
+
+def test_count_tokens_uses_the_model_encoder(monkeypatch):
+    class Encoder:
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    families = []
+    monkeypatch.setattr(tokens, "get_encoder", lambda family: families.append(family) or Encoder())
+
+    assert count_tokens("the yield strength of steel", "mistral:7b") == 5
+    assert families == ["mistral"]
+
+
+def test_message_counts_are_memoized_per_content_and_family(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tokens, "count_tokens", lambda text, model=None: calls.append((text, model)) or 10)
+    monkeypatch.setattr(tokens, "_count_cache", tokens.OrderedDict())
+
+    assert count_message_tokens("Hello", "llama3.1:latest") == 10 + tokens.TOKENS_PER_MESSAGE
+    assert count_message_tokens("Hello", "llama3.1:8b") == 10 + tokens.TOKENS_PER_MESSAGE
+    assert count_message_tokens("Hello", "mistral:7b") == 10 + tokens.TOKENS_PER_MESSAGE
+
+    assert calls == [("Hello", "llama3.1:latest"), ("Hello", "mistral:7b")]
+
+
+def test_message_count_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(tokens, "count_tokens", lambda text, model=None: 1)
+    monkeypatch.setattr(tokens, "_count_cache", tokens.OrderedDict())
+    monkeypatch.setattr(tokens, "TOKEN_COUNT_CACHE_SIZE", 3)
+
+    count_messages_tokens([{"role": "user", "content": str(i)} for i in range(5)])
+
+    assert len(tokens._count_cache) == 3
+
+
+def test_usage_from_response_reads_both_backends():
+    openai = {"usage": {"prompt_tokens": 12, "completion_tokens": 30, "total_tokens": 42}}
+    ollama = {"done": True, "prompt_eval_count": 12, "eval_count": 30}
+
+    assert usage_from_response(openai) == {"prompt_tokens": 12, "response_tokens": 30}
+    assert usage_from_response(ollama) == {"prompt_tokens": 12, "response_tokens": 30}
+    assert usage_from_response({"choices": []}) is None
+    assert usage_from_response("not json") is None
+
+
+def test_failed_tokenizer_loads_are_retried_after_a_delay(monkeypatch):
+    attempts = []
+    encoder = object()
+
+    def get_encoding(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise ConnectionError("offline")
+        return encoder
+
+    now = [1000.0]
+    monkeypatch.setattr(tokens.tiktoken, "get_encoding", get_encoding)
+    monkeypatch.setattr(tokens.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(tokens, "_encoders", {})
+    monkeypatch.setattr(tokens, "_encoder_failures", {})
+
+    assert tokens.get_encoder("llama3") is None
+    assert tokens.get_encoder("llama3") is None
+    assert attempts == ["cl100k_base"]
+
+    now[0] += tokens.TOKENIZER_RETRY_SECONDS
+    assert tokens.get_encoder("llama3") is encoder
+    assert tokens.get_encoder("llama3") is encoder
+    assert len(attempts) == 2